@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+import pandas as pd
+import pytest
+
+# Keep test runs away from the real cache, store and dataset (item/alias pickles included);
+# set before any sales_* module reads these at import time
+os.environ['SALES_CACHE_DIR'] = tempfile.mkdtemp(prefix='sales_cache_test_')
+os.environ['SALES_STORE'] = os.path.join(os.environ['SALES_CACHE_DIR'], 'sales_store.sqlite')
+os.environ['SALES_DATASET'] = os.path.join(os.environ['SALES_CACHE_DIR'], 'dataset')
+
+# Columns of an ERP sales export, in file order
+EXPORT_COLUMNS = ['일자', '거래처명', '품목명[규격]', '금액', '수량', '거래처그룹1명', '비고']
+
+
+@pytest.fixture
+def export_row():
+    # export_row(day, customer, item, amount, qty=1, date=None): one ledger line, dated
+    # 2024-01-<day> unless `date` gives the raw 일자 text
+    def row(day, customer, item, amount, qty=1, date=None):
+        return [date or f'2024-01-{day:02d}', customer, item, amount, qty, 'Domestic', '']
+    return row
+
+
+@pytest.fixture
+def export_rows(export_row):
+    # export_rows(start, n): n distinct lines, the i-th with 금액 1000 * (i + 1)
+    def rows(start, n):
+        return [export_row(i % 28 + 1, f'고객{i % 3}', f'품목{i % 4}', 1000 * (i + 1)) for i in range(start, start + n)]
+    return rows
+
+
+@pytest.fixture
+def export_frame():
+    def frame(rows):
+        return pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+    return frame
+
+
+@pytest.fixture
+def write_export(tmp_path):
+    # write_export(name, rows, encoding='utf-8', bom=b'', append=False) -> path of the CSV
+    # under tmp_path; append adds the lines without a header (or BOM)
+    def write(name, rows, encoding='utf-8', bom=b'', append=False):
+        path = tmp_path / name
+        lines = [] if append else [EXPORT_COLUMNS]
+        text = ''.join(','.join(map(str, line)) + '\n' for line in lines + list(rows))
+        with open(path, 'ab' if append else 'wb') as f:
+            f.write((b'' if append else bom) + text.encode(encoding))
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def cube_totals():
+    # (금액, ledger rows) of a cube with a Rows column
+    def totals(cube):
+        return int(cube['금액'].sum()), int(cube['Rows'].sum())
+    return totals
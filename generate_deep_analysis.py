@@ -1,10 +1,16 @@
 
-import pandas as pd
-import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import argparse
 from datetime import datetime
-import matplotlib
+
+from sales_cache import HAS_PARQUET, load_sales_files
+from sales_cube import CUBE_DIMENSIONS, CUBE_MEASURES, build_cube, cube_slice, load_incremental_cube, rollup
+from sales_stream import CHUNK_ROWS, stream_aggregate
+from sales_clean import clean_ledger, memory_mb, print_cube_memory, print_memory_report, report_unparsed_dates, rules_version
+from sales_insights import entity_insights, load_thresholds, trend_marks
+from sales_markdown import write_markdown
+from sales_periods import PeriodIndex
+from sales_profile import PROFILER, add_profile_arguments, profiled_run
+from sales_tables import fmt_int, fmt_pct, growth, markdown_table, share
 
 # Configuration
 FILES = [
@@ -12,246 +18,214 @@ FILES = [
     r'd:\(주)에바스코스메틱 Dropbox\JI SEULKI\claude\@ongoing_SALES\2025.csv'
 ]
 OUTPUT_FILE = r'C:\Users\passe\@PROJECT\oms-admin\sales_deep_analysis_report.md'
-IMAGE_DIR = r'C:\Users\passe\@PROJECT\oms-admin\report_images'
 
-# Ensure image directory exists
-os.makedirs(IMAGE_DIR, exist_ok=True)
+# Columns the report actually reads; everything else from the ERP export is dropped
+REPORT_COLUMNS = ['Year', 'Month', '거래처명', '품목명', '거래처그룹', '금액', '수량', 'Brand', 'Market', 'IsDummy']
 
-# Set Korean Font
-matplotlib.rcParams['font.family'] = 'Malgun Gothic'
-matplotlib.rcParams['axes.unicode_minus'] = False
+def load_and_clean_data(files, memory_report=False):
+    with PROFILER.stage('load_data') as st:
+        full_df = load_sales_files(files, warn_missing=False)
+        st.rows_out = len(full_df)
+    if memory_report:
+        raw_mb, raw_cols = memory_mb(full_df), len(full_df.columns)
+    with PROFILER.stage('clean_data', rows_in=len(full_df)) as st:
+        clean_df = clean_data(full_df)
+        st.rows_out = len(clean_df)
+    if memory_report:
+        print_memory_report(raw_mb, raw_cols, clean_df)
+    report_unparsed_dates(clean_df)
+    return clean_df
 
-def load_and_clean_data(files):
-    dfs = []
-    for f in files:
-        if not os.path.exists(f): continue
-        try: df = pd.read_csv(f, encoding='cp949')
-        except UnicodeDecodeError: df = pd.read_csv(f, encoding='utf-8')
-        dfs.append(df)
-    
-    full_df = pd.concat(dfs, ignore_index=True)
-    
-    # Date & Basic Columns
-    full_df['Date'] = pd.to_datetime(full_df['일자'], format='%Y/%m/%d', errors='coerce')
-    if full_df['Date'].isnull().all():
-        full_df['Date'] = pd.to_datetime(full_df['일자'], format='%Y%m%d', errors='coerce')
-    
-    full_df['Year'] = full_df['Date'].dt.year
-    full_df['Month'] = full_df['Date'].dt.month
-    full_df['거래처명'] = full_df['거래처명'].fillna('Unknown')
-    full_df['품목명'] = full_df['품목명[규격]'].fillna('Unknown')
-    full_df['금액'] = pd.to_numeric(full_df['금액'], errors='coerce').fillna(0)
-    full_df['수량'] = pd.to_numeric(full_df['수량'], errors='coerce').fillna(0)
-    
-    # Russia Consolidation
-    russia_aliases = ['직수출', '스티물 주식회사', '스티물글로벌 주식회사', '스티물', '스티물글로벌']
-    def normalize_cust(n):
-        for a in russia_aliases:
-            if a in n: return '직수출(러시아)'
-        return n
-    full_df['거래처명'] = full_df['거래처명'].apply(normalize_cust)
-    
-    # Brand Extraction
-    full_df['Brand'] = full_df['품목명'].apply(lambda x: x.split(' ')[0])
-    
-    # Categorize Market: Export vs Domestic
-    # Assumption: '직수출' or '수출' in Customer Group or Customer Name seems to be Export
-    # We will refine based on user guide: "Export performance is accurate", "Domestic is summarized"
-    # Let's trust '거래처그룹' if available, otherwise '거래처명'
-    full_df['거래처그룹'] = full_df['거래처그룹1명'].fillna('')
-    
-    def classify_market(row):
-        grp = str(row['거래처그룹'])
-        cust = str(row['거래처명'])
-        if '수출' in grp or '수출' in cust: return 'Export'
-        return 'Domestic'
-    
-    full_df['Market'] = full_df.apply(classify_market, axis=1)
-    
-    # Flag Dummy Items for Domestic (월마감)
-    # User said: "월마감 items are for revenue dummy only, exclude from Item analysis"
-    full_df['IsDummy'] = full_df['품목명'].apply(lambda x: '월마감' in x or '배송비' in x)
-    
-    return full_df
+def clean_data(full_df, date_format=None):
+    # Shared cleaning rules, see sales_clean.clean_ledger
+    return clean_ledger(full_df, date_format, REPORT_COLUMNS)
 
 def format_currency(val):
     return f"{int(val):,}"
 
-def generate_report(df):
-    lines = []
-    lines.append("# 심층 영업 분석 보고서 (2024-2025)")
-    lines.append(f"작성일: {datetime.now().strftime('%Y-%m-%d')}")
-    lines.append("본 보고서는 24/25년 실적을 상세 비교하며, 특히 내수/수출 시장의 특성을 반영하여 이원화된 분석을 수행하였습니다.")
-    lines.append("- **수출:** 매출액(Revenue) 기준 정밀 분석")
-    lines.append("- **내수:** '월마감' 더미 데이터 제외 후 판매수량(Qty) 기준 실질 품목 분석\n")
-    
-    df_25 = df[df['Year'] == 2025]
-    df_24 = df[df['Year'] == 2024]
+def generate_report(cube):
+    # Yields the report line by line; write it out with sales_markdown.write_markdown
+    yield "# 심층 영업 분석 보고서 (2024-2025)"
+    yield f"작성일: {datetime.now().strftime('%Y-%m-%d')}"
+    yield "본 보고서는 24/25년 실적을 상세 비교하며, 특히 내수/수출 시장의 특성을 반영하여 이원화된 분석을 수행하였습니다."
+    yield "- **수출:** 매출액(Revenue) 기준 정밀 분석"
+    yield "- **내수:** '월마감' 더미 데이터 제외 후 판매수량(Qty) 기준 실질 품목 분석\n"
+    
+    # Every section below reads rollups of the pre-aggregated cube
+    PROFILER.section("deep: rollups")
+    cube_25 = cube[cube['Year'] == 2025]
+    
+    # Growth, export share and insight tags for every brand/customer (see sales_insights.py)
+    thresholds = load_thresholds()
+    brand_ins = entity_insights(cube, 'Brand', 2025, 2024, thresholds)
+    ex_25 = cube_25[cube_25['Market'] == 'Export']
+    ex_cust_25 = rollup(ex_25, ['Brand', '거래처명'])['금액']
+    ex_items_25 = rollup(ex_25, ['Brand', '품목명'])
+    dom_25 = cube_25[(cube_25['Market'] == 'Domestic') & ~cube_25['IsDummy']]
+    dom_items_25 = rollup(dom_25, ['Brand', '품목명'])['수량']
+    dom_items_yoy = PeriodIndex(cube[cube['Market'] == 'Domestic'], ['Brand', '품목명'], ['수량']).compare(2025, 2024, '수량')
+    
+    cust_ins = entity_insights(cube, '거래처명', 2025, 2024, thresholds)
+    cust_brands_25 = rollup(cube_25, ['거래처명', 'Brand'])['금액']
+    cust_items_25 = rollup(cube_25, ['거래처명', '품목명'])
     
     # 1. Market Overview
-    lines.append("## 1. 시장별 개요 (Market Overview)")
+    PROFILER.section("deep: 1. 시장별 개요")
+    yield "## 1. 시장별 개요 (Market Overview)"
     
-    mkt_perf = df.groupby(['Year', 'Market'])['금액'].sum().unstack()
-    lines.append("| 구분 (매출) | 2024년 | 2025년 | 증감율 | 비중(2025) |")
-    lines.append("|---|---|---|---|---|")
+    total_25 = cube_25['금액'].sum()
     
-    total_25 = df_25['금액'].sum()
+    mkts = ['Export', 'Domestic']
+    mkt_yoy = PeriodIndex(cube, ['Market']).compare(2025, 2024).reindex(mkts, fill_value=0)
+    v24 = mkt_yoy['prior'].to_numpy()
+    v25 = mkt_yoy['current'].to_numpy()
+    yield markdown_table(["구분 (매출)", "2024년", "2025년", "증감율", "비중(2025)"], [
+        mkts, fmt_int(v24), fmt_int(v25),
+        fmt_pct(growth(v25, v24, valid=v24 != 0), signed=True), fmt_pct(share(v25, total_25)),
+    ])
     
-    for mkt in ['Export', 'Domestic']:
-        v24 = mkt_perf.loc[2024, mkt]
-        v25 = mkt_perf.loc[2025, mkt]
-        growth = ((v25 - v24)/v24*100) if v24 else 0
-        share = (v25 / total_25)*100
-        lines.append(f"| {mkt} | {format_currency(v24)} | {format_currency(v25)} | {growth:+.1f}% | {share:.1f}% |")
-    
-    lines.append("\n")
+    yield "\n"
     
     
     # 2. Deep Dive: Top Brands with Automated Insights
-    lines.append("## 2. 브랜드 심층 분석 (Brand Deep-Dive)")
+    PROFILER.section("deep: 2. 브랜드 심층 분석")
+    yield "## 2. 브랜드 심층 분석 (Brand Deep-Dive)"
     
-    top_brands = df_25.groupby('Brand')['금액'].sum().sort_values(ascending=False).head(5).index.tolist()
+    top_brands = rollup(cube_25, ['Brand'])['금액'].sort_values(ascending=False).head(5).index.tolist()
     
     for brand in top_brands:
-        lines.append(f"### 2.{top_brands.index(brand)+1} [{brand}]")
-        b_df = df[df['Brand'] == brand]
-        b_25 = b_df[b_df['Year'] == 2025]
-        b_24 = b_df[b_df['Year'] == 2024]
-        
-        # Total Rev
-        rev_25 = b_25['금액'].sum()
-        rev_24 = b_24['금액'].sum()
-        growth = ((rev_25-rev_24)/rev_24*100) if rev_24 else 0
-        
-        # Export vs Domestic Ratio (Rev)
-        ex_rev = b_25[b_25['Market']=='Export']['금액'].sum()
-        dom_rev = b_25[b_25['Market']=='Domestic']['금액'].sum()
-        total_rev = ex_rev + dom_rev
-        ex_ratio = (ex_rev/total_rev*100) if total_rev else 0
+        yield f"### 2.{top_brands.index(brand)+1} [{brand}]"
         
-        # Automated Insight Generation
-        insight_tags = []
-        if growth > 10: insight_tags.append("🚀 고성장(Star)")
-        elif growth < -10: insight_tags.append("📉 쇠퇴주의(Decline)")
-        elif growth < 0: insight_tags.append("⚠️ 역성장")
+        # Total Rev, Export vs Domestic Ratio (Rev) and the automated insight tags
+        ins = brand_ins.loc[brand]
+        rev_25, yoy, ex_ratio = ins['current'], ins['growth'], ins['export_share']
+        ex_rev, dom_rev = ins['export'], ins['current'] - ins['export']
         
-        if ex_ratio > 60: insight_tags.append("🌏 수출주도형")
-        elif ex_ratio < 20: insight_tags.append("🏠 내수집중형")
-        
-        if rev_25 > 3_000_000_000: insight_tags.append("💰 캐시카우")
-        
-        lines.append(f"**Insight Tags:** {' '.join(insight_tags)}")
+        yield f"**Insight Tags:** {ins['tags']}"
         
         # Qualitative Summary Construction
-        summary = f"**[{brand}]**는 전년 대비 **{growth:+.1f}%** 성장/하락하였습니다. "
-        if ex_ratio > 50:
+        summary = f"**[{brand}]**는 전년 대비 **{yoy:+.1f}%** 성장/하락하였습니다. "
+        if ex_ratio > thresholds['export_heavy']:
             summary += f"특히 **수출 비중이 {ex_ratio:.1f}%**로 해외 시장 의존도가 높으며, "
         else:
             summary += f"**내수 시장 중심({100-ex_ratio:.1f}%)**으로 운영되고 있으며, "
             
-        lines.append(f"> 💡 **Insight:** {summary}전략적 대응이 필요합니다.")
-        lines.append(f"\n- **총 매출:** {format_currency(rev_25)} 원")
-        lines.append(f"- **시장 구성:** 수출 {format_currency(ex_rev)} / 내수 {format_currency(dom_rev)}")
+        yield f"> 💡 **Insight:** {summary}전략적 대응이 필요합니다."
+        yield f"\n- **총 매출:** {format_currency(rev_25)} 원"
+        yield f"- **시장 구성:** 수출 {format_currency(ex_rev)} / 내수 {format_currency(dom_rev)}"
         
         # A. Export Analysis (Revenue Based)
-        lines.append("\n#### A. 수출 성과 (매출 기준)")
-        ex_df = b_25[b_25['Market'] == 'Export']
-        if ex_df.empty:
-            lines.append("- 수출 실적 없음")
+        yield "\n#### A. 수출 성과 (매출 기준)"
+        ex_items = cube_slice(ex_items_25, brand)
+        if ex_items.empty:
+            yield "- 수출 실적 없음"
         else:
             # Top Customers
-            top_ex_cust = ex_df.groupby('거래처명')['금액'].sum().sort_values(ascending=False).head(3)
-            lines.append("**주요 수출 거래처:**")
+            top_ex_cust = cube_slice(ex_cust_25, brand).sort_values(ascending=False).head(3)
+            yield "**주요 수출 거래처:**"
             for c, v in top_ex_cust.items():
-                lines.append(f"- {c}: {format_currency(v)} 원")
+                yield f"- {c}: {format_currency(v)} 원"
             
             # Top Items
-            top_ex_items = ex_df.groupby('품목명')['금액'].sum().sort_values(ascending=False).head(5)
-            lines.append("\n**주요 수출 품목 (매출 Top 5):**")
-            lines.append("| 품목명 | 매출 | 수량 |")
-            lines.append("|---|---|---|")
-            for i, v in top_ex_items.items():
-                q = ex_df[ex_df['품목명']==i]['수량'].sum()
-                lines.append(f"| {i} | {format_currency(v)} | {int(q):,} |")
+            top_ex_items = ex_items['금액'].sort_values(ascending=False).head(5)
+            yield "\n**주요 수출 품목 (매출 Top 5):**"
+            yield markdown_table(["품목명", "매출", "수량"], [
+                top_ex_items.index, fmt_int(top_ex_items), fmt_int(ex_items.loc[top_ex_items.index, '수량']),
+            ])
                 
         # B. Domestic Analysis (Quantity Based, Exclude Dummy)
-        lines.append("\n#### B. 내수 성과 (수량 기준, 실품목)")
-        dom_df = b_25[(b_25['Market'] == 'Domestic') & (~b_25['IsDummy'])]
+        yield "\n#### B. 내수 성과 (수량 기준, 실품목)"
+        dom_items = cube_slice(dom_items_25, brand)
         
-        if dom_df.empty:
-             lines.append("- 내수 실품목 실적 미미 (월마감 위주 가능성)")
+        if dom_items.empty:
+             yield "- 내수 실품목 실적 미미 (월마감 위주 가능성)"
         else:
              # Top Items by Qty
-             top_dom_items = dom_df.groupby('품목명')['수량'].sum().sort_values(ascending=False).head(5)
-             lines.append("\n**주요 내수 품목 (판매수량 Top 5):**")
-             lines.append("| 품목명 | 수량 | 트렌드(YoY) |")
-             lines.append("|---|---|---|")
-             
-             for i, q in top_dom_items.items():
-                 # Calc YoY Qty
-                 q24 = b_24[(b_24['Market'] == 'Domestic') & (b_24['품목명'] == i)]['수량'].sum()
-                 q_growth = ((q - q24)/q24*100) if q24 else 0
-                 # Add specific insight if growth is extreme
-                 trend_mark = ""
-                 if q_growth > 50: trend_mark = "🔥"
-                 elif q_growth < -20: trend_mark = "📉"
-                 
-                 lines.append(f"| {i} | {int(q):,} | {q_growth:+.1f}% {trend_mark} |")
+             top_dom_items = dom_items.sort_values(ascending=False).head(5)
+             yield "\n**주요 내수 품목 (판매수량 Top 5):**"
+             # Calc YoY Qty
+             q = top_dom_items.to_numpy()
+             q24 = cube_slice(dom_items_yoy['prior'], brand).reindex(top_dom_items.index, fill_value=0).to_numpy()
+             q_growth = growth(q, q24, valid=q24 != 0)
+             # Add specific insight if growth is extreme
+             trend_mark = trend_marks(q_growth, thresholds)
+             yield markdown_table(["품목명", "수량", "트렌드(YoY)"], [
+                 top_dom_items.index, fmt_int(q),
+                 [f"{g} {m}" for g, m in zip(fmt_pct(q_growth, signed=True), trend_mark)],
+             ])
                  
-        lines.append("\n---\n")
+        yield "\n---\n"
 
     # 3. Customer Deep Dive with Insights
-    lines.append("## 3. 핵심 거래처 영업 보고서 (Customer Reports)")
+    PROFILER.section("deep: 3. 핵심 거래처 영업 보고서")
+    yield "## 3. 핵심 거래처 영업 보고서 (Customer Reports)"
     
-    top_custs = df_25.groupby('거래처명')['금액'].sum().sort_values(ascending=False).head(5).index.tolist()
+    top_custs = rollup(cube_25, ['거래처명'])['금액'].sort_values(ascending=False).head(5).index.tolist()
     
     for cust in top_custs:
-        lines.append(f"### 거래처: {cust}")
-        c_df = df[df['거래처명'] == cust]
-        c_25 = c_df[c_df['Year'] == 2025]
-        c_24 = c_df[c_df['Year'] == 2024]
+        yield f"### 거래처: {cust}"
         
-        rev_25 = c_25['금액'].sum()
-        rev_24 = c_24['금액'].sum()
-        growth = ((rev_25 - rev_24)/rev_24*100) if rev_24 else 0
+        rev_25, yoy = cust_ins.at[cust, 'current'], cust_ins.at[cust, 'growth']
         
         # Customer Insight
-        c_insight = ""
-        if growth > 20: c_insight = "전략적 파트너로서 거래 규모가 급성장 중입니다."
-        elif growth < -10: c_insight = "거래 규모가 축소되고 있어 원인 파악 및 Relationship 관리가 시급합니다."
-        else: c_insight = "안정적인 거래 규모를 유지하고 있습니다."
-        
-        lines.append(f"> 💡 **Account Insight:** {c_insight}")
-        lines.append(f"- **2025 매출:** {format_currency(rev_25)} 원 (YoY {growth:+.1f}%)")
+        yield f"> 💡 **Account Insight:** {cust_ins.at[cust, 'account']}"
+        yield f"- **2025 매출:** {format_currency(rev_25)} 원 (YoY {yoy:+.1f}%)"
         
         # Brand Mix
-        b_mix = c_25.groupby('Brand')['금액'].sum().sort_values(ascending=False).head(3)
-        lines.append("**Top 3 구매 브랜드:**")
+        b_mix = cube_slice(cust_brands_25, cust).sort_values(ascending=False).head(3)
+        yield "**Top 3 구매 브랜드:**"
         brand_names = []
         for b, v in b_mix.items():
-            lines.append(f"- {b}: {format_currency(v)} ({v/rev_25*100:.1f}%)")
+            yield f"- {b}: {format_currency(v)} ({v/rev_25*100:.1f}%)"
             brand_names.append(b)
             
         # Top Items (Revenue)
-        top_i = c_25.groupby('품목명')['금액'].sum().sort_values(ascending=False).head(5)
-        lines.append("\n**Top 5 구매 품목:**")
-        lines.append("| 품목명 | 매출 | 수량 |")
-        lines.append("|---|---|---|")
-        for i, v in top_i.items():
-            q = c_25[c_25['품목명']==i]['수량'].sum()
-            lines.append(f"| {i} | {format_currency(v)} | {int(q):,} |")
-        lines.append("\n")
-
-    return "\n".join(lines)
+        c_items = cube_slice(cust_items_25, cust)
+        top_i = c_items['금액'].sort_values(ascending=False).head(5)
+        yield "\n**Top 5 구매 품목:**"
+        yield markdown_table(["품목명", "매출", "수량"], [
+            top_i.index, fmt_int(top_i), fmt_int(c_items.loc[top_i.index, '수량']),
+        ])
+        yield "\n"
+    PROFILER.end_section()
 
 def main():
-    print("Processing Deep Analysis...")
-    df = load_and_clean_data(FILES)
-    report = generate_report(df)
-    
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(report)
-    print(f"Report Generated: {OUTPUT_FILE}")
+    parser = argparse.ArgumentParser(description="심층 영업 분석 보고서")
+    parser.add_argument('--memory-report', action='store_true', help="print frame memory before/after cleaning")
+    parser.add_argument('--incremental', action='store_true',
+                        help="merge rows appended since the last run into the persisted cube instead of re-cleaning history")
+    parser.add_argument('--stream', action='store_true', help="aggregate the CSVs chunk by chunk instead of loading them whole")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="rows per chunk in --stream mode")
+    parser.add_argument('--workers', type=int, default=1, help="aggregate files/shards in N processes (implies --stream)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled_run('generate_deep_analysis', args) as prof:
+        print("Processing Deep Analysis...")
+        if args.stream or args.workers > 1:
+            with prof.stage('stream_aggregate') as st:
+                cube = stream_aggregate(FILES, clean_data, CUBE_DIMENSIONS, CUBE_MEASURES, args.chunksize, args.workers)
+                st.rows_out = len(cube)
+            report_unparsed_dates(cube)
+            if args.memory_report:
+                print_cube_memory(cube)
+        elif args.incremental and HAS_PARQUET:
+            with prof.stage('load_incremental_cube') as st:
+                cube = load_incremental_cube(FILES, clean_data, rules=rules_version())
+                st.rows_out = len(cube)
+            if args.memory_report:
+                print_cube_memory(cube)
+        else:
+            if args.incremental:
+                print("Warning: pyarrow not installed, running a full rebuild")
+            df = load_and_clean_data(FILES, memory_report=args.memory_report)
+            # One aggregation pass over the ledger
+            with prof.stage('build_cube', rows_in=len(df)) as st:
+                cube = build_cube(df)
+                st.rows_out = len(cube)
+        with prof.stage('render', rows_in=len(cube)):
+            write_markdown(OUTPUT_FILE, generate_report(cube))
+        print(f"Report Generated: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,14 @@
 
-import pandas as pd
-import os
+import argparse
 from datetime import datetime
 
+from sales_cache import load_sales_files
+from sales_stream import CHUNK_ROWS, stream_aggregate
+from sales_clean import clean_ledger, memory_mb, print_cube_memory, print_memory_report, report_unparsed_dates
+from sales_markdown import write_markdown
+from sales_profile import PROFILER, add_profile_arguments, profiled_run
+from sales_tables import fmt_int, fmt_pct, markdown_table, share
+
 # Configuration
 FILES = [
     r'd:\(주)에바스코스메틱 Dropbox\JI SEULKI\claude\@ongoing_SALES\2024.csv',
@@ -10,166 +16,149 @@ FILES = [
 ]
 OUTPUT_FILE = r'C:\Users\passe\@PROJECT\oms-admin\sales_analysis_report.md'
 
-def load_data(files):
-    dfs = []
-    for f in files:
-        if not os.path.exists(f):
-            print(f"Warning: File not found: {f}")
-            continue
-        try:
-            # Try cp949 first (common for Korean CSVs)
-            df = pd.read_csv(f, encoding='cp949')
-        except UnicodeDecodeError:
-            df = pd.read_csv(f, encoding='utf-8')
-        dfs.append(df)
-    
-    if not dfs:
-        raise ValueError("No data loaded")
-    
-    full_df = pd.concat(dfs, ignore_index=True)
-    return full_df
+# Columns the report actually reads; everything else from the ERP export is dropped
+REPORT_COLUMNS = ['YearMonth', '거래처명', '품목명', '거래처그룹', '금액', 'Brand']
 
-def clean_data(df):
-    # Standardize columns if needed (assuming they match based on inspection)
-    # Expected: 일자, 거래처명, 품목명[규격], 금액, 거래처그룹1명
-    
-    # Date conversion
-    df['Date'] = pd.to_datetime(df['일자'], format='%Y/%m/%d', errors='coerce')
-    # If standard format fails, try integer format if that was seen (e.g. 20240101)
-    if df['Date'].isnull().all():
-         df['Date'] = pd.to_datetime(df['일자'], format='%Y%m%d', errors='coerce')
+def load_data(files):
+    # Parsed CSVs are cached as Parquet, see sales_cache.py
+    return load_sales_files(files)
 
-    df['YearMonth'] = df['Date'].dt.to_period('M')
-    
-    # Fill NA
-    df['거래처명'] = df['거래처명'].fillna('Unknown')
-    df['품목명'] = df['품목명[규격]'].fillna('Unknown')
-    df['거래처그룹'] = df['거래처그룹1명'].fillna('Unknown')
-    df['금액'] = pd.to_numeric(df['금액'], errors='coerce').fillna(0)
-    
-    # Extract Brand (First word of Item Name)
-    df['Brand'] = df['품목명'].apply(lambda x: x.split(' ')[0] if isinstance(x, str) else 'Unknown')
-    
-    return df
+def clean_data(df, date_format=None):
+    # Shared cleaning rules, see sales_clean.clean_ledger
+    return clean_ledger(df, date_format, REPORT_COLUMNS)
 
 def format_currency(val):
     return f"{int(val):,}"
 
 def generate_markdown(df):
-    lines = []
-    lines.append("# Sales Performance Analysis Report (2024-2025)")
-    lines.append(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    # Yields the report line by line; write it out with sales_markdown.write_markdown
+    yield "# Sales Performance Analysis Report (2024-2025)"
+    yield f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
     
     total_revenue = df['금액'].sum()
-    lines.append(f"**Total Revenue:** {format_currency(total_revenue)} KRW\n")
-    lines.append(f"**Total Records:** {len(df):,}\n")
+    yield f"**Total Revenue:** {format_currency(total_revenue)} KRW\n"
+    # A streamed (pre-aggregated) frame carries the ledger row count per group
+    total_records = int(df['Rows'].sum()) if 'Rows' in df.columns else len(df)
+    yield f"**Total Records:** {total_records:,}\n"
     
     # 1. Monthly Trend
-    lines.append("## 1. Monthly Sales Trend")
-    monthly = df.groupby('YearMonth')['금액'].sum().reset_index()
-    lines.append("| Month | Revenue |")
-    lines.append("|---|---|")
-    for _, row in monthly.iterrows():
-        lines.append(f"| {row['YearMonth']} | {format_currency(row['금액'])} |")
-    lines.append("\n")
+    PROFILER.section("en: 1. Monthly Sales Trend")
+    yield "## 1. Monthly Sales Trend"
+    monthly = df.groupby('YearMonth')['금액'].sum()
+    yield markdown_table(["Month", "Revenue"], [monthly.index, fmt_int(monthly)])
+    yield "\n"
 
     # 2. Top Customers
-    lines.append("## 2. Top 10 Customers")
-    cust_sales = df.groupby('거래처명')['금액'].sum().sort_values(ascending=False).head(10).reset_index()
-    lines.append("| Customer | Revenue | Share |")
-    lines.append("|---|---|---|")
-    for _, row in cust_sales.iterrows():
-        share = (row['금액'] / total_revenue) * 100
-        lines.append(f"| {row['거래처명']} | {format_currency(row['금액'])} | {share:.1f}% |")
-    lines.append("\n")
+    PROFILER.section("en: 2. Top 10 Customers")
+    yield "## 2. Top 10 Customers"
+    cust_sales = df.groupby('거래처명', observed=True)['금액'].sum().sort_values(ascending=False).head(10).reset_index()
+    yield markdown_table(["Customer", "Revenue", "Share"], [
+        cust_sales['거래처명'], fmt_int(cust_sales['금액']), fmt_pct(share(cust_sales['금액'], total_revenue)),
+    ])
+    yield "\n"
 
     # 3. Top Brands
-    lines.append("## 3. Brand Performance")
-    brand_sales = df.groupby('Brand')['금액'].sum().sort_values(ascending=False).reset_index()
-    lines.append("| Brand | Revenue | Share |")
-    lines.append("|---|---|---|")
-    for _, row in brand_sales.iterrows():
-        share = (row['금액'] / total_revenue) * 100
-        lines.append(f"| {row['Brand']} | {format_currency(row['금액'])} | {share:.1f}% |")
-    lines.append("\n")
+    PROFILER.section("en: 3. Brand Performance")
+    yield "## 3. Brand Performance"
+    brand_sales = df.groupby('Brand', observed=True)['금액'].sum().sort_values(ascending=False).reset_index()
+    yield markdown_table(["Brand", "Revenue", "Share"], [
+        brand_sales['Brand'], fmt_int(brand_sales['금액']), fmt_pct(share(brand_sales['금액'], total_revenue)),
+    ])
+    yield "\n"
 
     # 4. Customer Group Analysis
-    lines.append("## 4. Customer Group Analysis")
-    group_sales = df.groupby('거래처그룹')['금액'].sum().sort_values(ascending=False).reset_index()
-    lines.append("| Group | Revenue | Share |")
-    lines.append("|---|---|---|")
-    for _, row in group_sales.iterrows():
-        share = (row['금액'] / total_revenue) * 100
-        lines.append(f"| {row['거래처그룹']} | {format_currency(row['금액'])} | {share:.1f}% |")
-    lines.append("\n")
+    PROFILER.section("en: 4. Customer Group Analysis")
+    yield "## 4. Customer Group Analysis"
+    group_sales = df.groupby('거래처그룹', observed=True)['금액'].sum().sort_values(ascending=False).reset_index()
+    yield markdown_table(["Group", "Revenue", "Share"], [
+        group_sales['거래처그룹'], fmt_int(group_sales['금액']), fmt_pct(share(group_sales['금액'], total_revenue)),
+    ])
+    yield "\n"
     
     # 5. Detail Analysis: Top 5 Brands Breakdown
-    lines.append("## 5. Detailed Brand Analysis (Top 5)")
+    PROFILER.section("en: 5. Detailed Brand Analysis")
+    yield "## 5. Detailed Brand Analysis (Top 5)"
     top_5_brands = brand_sales.head(5)['Brand'].tolist()
     
     for brand in top_5_brands:
-        lines.append(f"### Brand: {brand}")
+        yield f"### Brand: {brand}"
         
         # Monthly trend for brand
         b_df = df[df['Brand'] == brand]
         
         # Top items for brand
-        b_items = b_df.groupby('품목명')['금액'].sum().sort_values(ascending=False).head(5)
+        b_items = b_df.groupby('품목명', observed=True)['금액'].sum().sort_values(ascending=False).head(5)
         
-        lines.append(f"**Total Revenue:** {format_currency(b_df['금액'].sum())}")
-        lines.append("\n**Top 5 Items:**")
-        lines.append("| Item | Revenue |")
-        lines.append("|---|---|")
-        for item, rev in b_items.items():
-            lines.append(f"| {item} | {format_currency(rev)} |")
-        lines.append("\n")
+        yield f"**Total Revenue:** {format_currency(b_df['금액'].sum())}"
+        yield "\n**Top 5 Items:**"
+        yield markdown_table(["Item", "Revenue"], [b_items.index, fmt_int(b_items)])
+        yield "\n"
 
     # 6. Detail Analysis: Top 5 Customers Breakdown
-    lines.append("## 6. Detailed Customer Analysis (Top 5)")
+    PROFILER.section("en: 6. Detailed Customer Analysis")
+    yield "## 6. Detailed Customer Analysis (Top 5)"
     top_5_cust = cust_sales.head(5)['거래처명'].tolist()
 
     for cust in top_5_cust:
-        lines.append(f"### Customer: {cust}")
+        yield f"### Customer: {cust}"
         
         c_df = df[df['거래처명'] == cust]
         
         # Top Brands for this customer
-        c_brands = c_df.groupby('Brand')['금액'].sum().sort_values(ascending=False).head(5)
+        c_brands = c_df.groupby('Brand', observed=True)['금액'].sum().sort_values(ascending=False).head(5)
         
-        lines.append(f"**Total Revenue:** {format_currency(c_df['금액'].sum())}")
+        yield f"**Total Revenue:** {format_currency(c_df['금액'].sum())}"
         
-        lines.append("\n**Top 5 Brands:**")
-        lines.append("| Brand | Revenue |")
-        lines.append("|---|---|")
-        for brand, rev in c_brands.items():
-            lines.append(f"| {brand} | {format_currency(rev)} |")
+        yield "\n**Top 5 Brands:**"
+        yield markdown_table(["Brand", "Revenue"], [c_brands.index, fmt_int(c_brands)])
         
-        lines.append("\n**Top 5 Items:**")
-        c_items = c_df.groupby('품목명')['금액'].sum().sort_values(ascending=False).head(5)
-        lines.append("| Item | Revenue |")
-        lines.append("|---|---|")
-        for item, rev in c_items.items():
-            lines.append(f"| {item} | {format_currency(rev)} |")
-        lines.append("\n")
-
-
-    return "\n".join(lines)
+        yield "\n**Top 5 Items:**"
+        c_items = c_df.groupby('품목명', observed=True)['금액'].sum().sort_values(ascending=False).head(5)
+        yield markdown_table(["Item", "Revenue"], [c_items.index, fmt_int(c_items)])
+        yield "\n"
+    PROFILER.end_section()
 
 def main():
-    print("Loading data...")
-    raw_df = load_data(FILES)
-    print(f"Loaded {len(raw_df)} rows.")
-    
-    print("Cleaning data...")
-    df = clean_data(raw_df)
-    
-    print("Generating report...")
-    report_content = generate_markdown(df)
-    
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(report_content)
-    
-    print(f"Report saved to: {OUTPUT_FILE}")
+    parser = argparse.ArgumentParser(description="Sales performance report (English)")
+    parser.add_argument('--memory-report', action='store_true', help="print frame memory before/after cleaning")
+    parser.add_argument('--stream', action='store_true', help="aggregate the CSVs chunk by chunk instead of loading them whole")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="rows per chunk in --stream mode")
+    parser.add_argument('--workers', type=int, default=1, help="aggregate files/shards in N processes (implies --stream)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled_run('generate_sales_report', args) as prof:
+        if args.stream or args.workers > 1:
+            print("Streaming data...")
+            dims = [c for c in REPORT_COLUMNS if c != '금액']
+            with prof.stage('stream_aggregate') as st:
+                df = stream_aggregate(FILES, clean_data, dims, ['금액'], args.chunksize, args.workers)
+                st.rows_in, st.rows_out = int(df['Rows'].sum()), len(df)
+            if args.memory_report:
+                print_cube_memory(df)
+            print(f"Aggregated {int(df['Rows'].sum())} rows into {len(df)} groups.")
+        else:
+            print("Loading data...")
+            with prof.stage('load_data') as st:
+                raw_df = load_data(FILES)
+                st.rows_out = len(raw_df)
+            print(f"Loaded {len(raw_df)} rows.")
+            if args.memory_report:
+                raw_mb, raw_cols = memory_mb(raw_df), len(raw_df.columns)
+            
+            print("Cleaning data...")
+            with prof.stage('clean_data', rows_in=len(raw_df)) as st:
+                df = clean_data(raw_df)
+                st.rows_out = len(df)
+            if args.memory_report:
+                print_memory_report(raw_mb, raw_cols, df)
+        report_unparsed_dates(df)
+        
+        print("Generating report...")
+        with prof.stage('render', rows_in=len(df)):
+            write_markdown(OUTPUT_FILE, generate_markdown(df))
+        
+        print(f"Report saved to: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,15 @@
 
-import pandas as pd
+import argparse
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime
-import matplotlib
+
+from sales_cache import load_sales_files
+from sales_charts import ChartQueue, draw_monthly_trend, draw_top_brands
+from sales_stream import CHUNK_ROWS, stream_aggregate
+from sales_clean import clean_ledger, memory_mb, print_cube_memory, print_memory_report, report_unparsed_dates
+from sales_markdown import write_markdown
+from sales_profile import PROFILER, add_profile_arguments, profiled_run
+from sales_tables import fmt_int, fmt_pct, growth, markdown_table, share
 
 # Configuration
 FILES = [
@@ -14,103 +19,52 @@ FILES = [
 OUTPUT_FILE = r'C:\Users\passe\@PROJECT\oms-admin\sales_analysis_report_ko.md'
 IMAGE_DIR = r'C:\Users\passe\@PROJECT\oms-admin\report_images'
 
-# Ensure image directory exists
-os.makedirs(IMAGE_DIR, exist_ok=True)
-
-# Set Korean Font
-matplotlib.rcParams['font.family'] = 'Malgun Gothic'
-matplotlib.rcParams['axes.unicode_minus'] = False
+# Columns the report actually reads; everything else from the ERP export is dropped
+REPORT_COLUMNS = ['Year', 'Month', '거래처명', '품목명', '거래처그룹', '금액', 'Brand']
 
 def load_data(files):
-    dfs = []
-    for f in files:
-        if not os.path.exists(f):
-            print(f"Warning: File not found: {f}")
-            continue
-        try:
-            df = pd.read_csv(f, encoding='cp949')
-        except UnicodeDecodeError:
-            df = pd.read_csv(f, encoding='utf-8')
-        dfs.append(df)
-    
-    if not dfs:
-        raise ValueError("No data loaded")
-    
-    full_df = pd.concat(dfs, ignore_index=True)
-    return full_df
-
-def clean_data(df):
-    # Date conversion
-    df['Date'] = pd.to_datetime(df['일자'], format='%Y/%m/%d', errors='coerce')
-    if df['Date'].isnull().all():
-         df['Date'] = pd.to_datetime(df['일자'], format='%Y%m%d', errors='coerce')
-
-    df['Year'] = df['Date'].dt.year
-    df['Month'] = df['Date'].dt.month
-    
-    # Fill NA
-    df['거래처명'] = df['거래처명'].fillna('Unknown')
-    df['품목명'] = df['품목명[규격]'].fillna('Unknown')
-    df['거래처그룹'] = df['거래처그룹1명'].fillna('Unknown')
-    df['금액'] = pd.to_numeric(df['금액'], errors='coerce').fillna(0)
-    
-    # Customer Normalization (Russia Consolidation)
-    russia_aliases = ['직수출', '스티물 주식회사', '스티물글로벌 주식회사', '스티물', '스티물글로벌']
-    # If the customer name contains any of these aliases, rename it to '직수출(러시아)'
-    # Using a more robust exact match or startswith might be safer if names vary slightly
-    # But based on prev output: '직수출(러시아)', '스티물 주식회사', '스티물글로벌 주식회사'
-    
-    def normalize_customer(name):
-        if pd.isna(name): return 'Unknown'
-        # Check specific known names
-        for alias in russia_aliases:
-            if alias in name: # '직수출' might be too broad if there are other countries, but user said '직수출' is for Russia here
-                return '직수출(러시아)'
-        return name
-
-    df['거래처명'] = df['거래처명'].apply(normalize_customer)
-
-    # Extract Brand (First word of Item Name)
-    df['Brand'] = df['품목명'].apply(lambda x: x.split(' ')[0] if isinstance(x, str) else 'Unknown')
-    
-    return df
+    return load_sales_files(files)
+
+def clean_data(df, date_format=None):
+    # Shared cleaning rules, see sales_clean.clean_ledger
+    return clean_ledger(df, date_format, REPORT_COLUMNS)
 
 def format_currency(val):
     return f"{int(val):,}"
 
-def plot_monthly_trend(df_24, df_25):
+def plot_monthly_trend(df_24, df_25, charts):
     monthly_24 = df_24.groupby('Month')['금액'].sum()
     monthly_25 = df_25.groupby('Month')['금액'].sum()
     
-    plt.figure(figsize=(12, 6))
-    plt.plot(monthly_24.index, monthly_24.values, marker='o', label='2024년')
-    plt.plot(monthly_25.index, monthly_25.values, marker='o', label='2025년')
-    
-    plt.title('월별 매출 추이 비교 (2024 vs 2025)')
-    plt.xlabel('월')
-    plt.ylabel('매출액 (원)')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(os.path.join(IMAGE_DIR, 'monthly_trend.png'))
-    plt.close()
+    data = {
+        'title': '월별 매출 추이 비교 (2024 vs 2025)',
+        'series': {
+            '2024년': [monthly_24.index.tolist(), monthly_24.tolist()],
+            '2025년': [monthly_25.index.tolist(), monthly_25.tolist()],
+        },
+    }
+    charts.submit(draw_monthly_trend, data, os.path.join(IMAGE_DIR, 'monthly_trend.png'))
 
-def plot_top_brands(brand_sales_25, top_n=10):
+def plot_top_brands(brand_sales_25, charts, top_n=10):
     top_brands = brand_sales_25.head(top_n)
     
-    plt.figure(figsize=(12, 6))
-    sns.barplot(x='금액', y='Brand', data=top_brands)
-    plt.title(f'2025년 상위 {top_n} 브랜드 매출')
-    plt.xlabel('매출액 (원)')
-    plt.ylabel('브랜드')
-    plt.grid(axis='x')
-    plt.tight_layout()
-    plt.savefig(os.path.join(IMAGE_DIR, 'top_brands_2025.png'))
-    plt.close()
-
-def generate_markdown(df):
-    lines = []
-    lines.append("# 2024-2025년 매출 실적 상세 분석 보고서")
-    lines.append(f"작성일: {datetime.now().strftime('%Y-%m-%d')}\n")
+    data = {
+        'title': f'2025년 상위 {top_n} 브랜드 매출',
+        # Plain strings so seaborn doesn't draw every category of the Brand column
+        'labels': top_brands['Brand'].astype(str).tolist(),
+        'values': top_brands['금액'].tolist(),
+    }
+    charts.submit(draw_top_brands, data, os.path.join(IMAGE_DIR, 'top_brands_2025.png'))
+
+def generate_markdown(df, charts=None, text_only=False):
+    # Yields the report line by line; write it out with sales_markdown.write_markdown
+    # Charts are queued while the tables are built and rendered together at the end,
+    # unless the caller passes its own queue and flushes it. text_only leaves them out.
+    own_charts = charts is None and not text_only
+    if own_charts:
+        charts = ChartQueue()
+    yield "# 2024-2025년 매출 실적 상세 분석 보고서"
+    yield f"작성일: {datetime.now().strftime('%Y-%m-%d')}\n"
     
     df_24 = df[df['Year'] == 2024]
     df_25 = df[df['Year'] == 2025]
@@ -119,79 +73,74 @@ def generate_markdown(df):
     total_25 = df_25['금액'].sum()
     yoy_growth = ((total_25 - total_24) / total_24 * 100) if total_24 > 0 else 0
     
-    lines.append("## 1. 종합 실적 요약 (Executive Summary)")
-    lines.append(f"- **2024년 총 매출:** {format_currency(total_24)} 원")
-    lines.append(f"- **2025년 총 매출:** {format_currency(total_25)} 원")
-    lines.append(f"- **성장률 (YoY):** {yoy_growth:+.2f}%")
+    PROFILER.section("ko: 1. 종합 실적 요약")
+    yield "## 1. 종합 실적 요약 (Executive Summary)"
+    yield f"- **2024년 총 매출:** {format_currency(total_24)} 원"
+    yield f"- **2025년 총 매출:** {format_currency(total_25)} 원"
+    yield f"- **성장률 (YoY):** {yoy_growth:+.2f}%"
     
     # Monthly Trend Plot
-    plot_monthly_trend(df_24, df_25)
-    lines.append("\n### 1.1 월별 매출 추이 비교")
-    lines.append("![월별 매출 추이](report_images/monthly_trend.png)\n")
-    
-    lines.append("| 월 | 2024년 매출 | 2025년 매출 | 증감율 |")
-    lines.append("|---|---|---|---|")
-    
-    monthly_24 = df_24.groupby('Month')['금액'].sum()
-    monthly_25 = df_25.groupby('Month')['금액'].sum()
-    
-    for m in range(1, 13):
-        rev_24 = monthly_24.get(m, 0)
-        rev_25 = monthly_25.get(m, 0)
-        growth = ((rev_25 - rev_24) / rev_24 * 100) if rev_24 > 0 else 0
-        lines.append(f"| {m}월 | {format_currency(rev_24)} | {format_currency(rev_25)} | {growth:+.1f}% |")
-    
-    lines.append("\n## 2. 2025년 브랜드별 성과 분석 (Top 10)")
-    
-    brand_sales_24 = df_24.groupby('Brand')['금액'].sum()
-    brand_sales_25 = df_25.groupby('Brand')['금액'].sum().sort_values(ascending=False).reset_index()
-    
-    plot_top_brands(brand_sales_25, 10)
-    lines.append("![2025년 상위 브랜드](report_images/top_brands_2025.png)\n")
-    
-    lines.append("| 순위 | 브랜드 | 2025년 매출 | 2024년 매출 | 성장률 (YoY) | 비중(2025) |")
-    lines.append("|---|---|---|---|---|---|")
-    
-    for idx, row in brand_sales_25.head(10).iterrows():
-        brand = row['Brand']
-        rev_25 = row['금액']
-        rev_24 = brand_sales_24.get(brand, 0)
-        growth = ((rev_25 - rev_24) / rev_24 * 100) if rev_24 > 0 else 0
-        share = (rev_25 / total_25) * 100
-        lines.append(f"| {idx+1} | {brand} | {format_currency(rev_25)} | {format_currency(rev_24)} | {growth:+.1f}% | {share:.1f}% |")
-    
-    lines.append("\n## 3. 2025년 거래처별 상세 분석 (Top 10)")
-    cust_sales_25 = df_25.groupby('거래처명')['금액'].sum().sort_values(ascending=False).head(10).reset_index()
-    
-    lines.append("| 순위 | 거래처명 | 2025년 매출 | 비중 | 주요 구매 브랜드 (Top 1) |")
-    lines.append("|---|---|---|---|---|")
-    
-    for idx, row in cust_sales_25.iterrows():
-        cust = row['거래처명']
-        rev = row['금액']
-        share = (rev / total_25) * 100
-        
-        # Top brand for this customer
-        cust_df = df_25[df_25['거래처명'] == cust]
-        top_brand = cust_df.groupby('Brand')['금액'].sum().idxmax()
-        
-        lines.append(f"| {idx+1} | {cust} | {format_currency(rev)} | {share:.1f}% | {top_brand} |")
-
-    lines.append("\n## 4. 2025년 거래처 그룹별 분석")
-    group_sales_25 = df_25.groupby('거래처그룹')['금액'].sum().sort_values(ascending=False).reset_index()
-    
-    lines.append("| 그룹명 | 매출액 | 비중 |")
-    lines.append("|---|---|---|")
-    for _, row in group_sales_25.iterrows():
-         share = (row['금액'] / total_25) * 100
-         lines.append(f"| {row['거래처그룹']} | {format_currency(row['금액'])} | {share:.1f}% |")
-
-
-    lines.append("\n## 5. 핵심 브랜드 상세 분석 (Top 3 - 2025년 기준)")
+    yield "\n### 1.1 월별 매출 추이 비교"
+    if not text_only:
+        plot_monthly_trend(df_24, df_25, charts)
+        yield "![월별 매출 추이](report_images/monthly_trend.png)\n"
+    
+    months = range(1, 13)
+    monthly_24 = df_24.groupby('Month')['금액'].sum().reindex(months, fill_value=0)
+    monthly_25 = df_25.groupby('Month')['금액'].sum().reindex(months, fill_value=0)
+    
+    yield markdown_table(["월", "2024년 매출", "2025년 매출", "증감율"], [
+        [f"{m}월" for m in months], fmt_int(monthly_24), fmt_int(monthly_25),
+        fmt_pct(growth(monthly_25, monthly_24), signed=True),
+    ])
+    
+    PROFILER.section("ko: 2. 2025년 브랜드별 성과 분석")
+    yield "\n## 2. 2025년 브랜드별 성과 분석 (Top 10)"
+    
+    brand_sales_24 = df_24.groupby('Brand', observed=True)['금액'].sum()
+    brand_sales_25 = df_25.groupby('Brand', observed=True)['금액'].sum().sort_values(ascending=False).reset_index()
+    
+    if not text_only:
+        plot_top_brands(brand_sales_25, charts, 10)
+        yield "![2025년 상위 브랜드](report_images/top_brands_2025.png)\n"
+    
+    top_10 = brand_sales_25.head(10)
+    rev_25 = top_10['금액'].to_numpy()
+    rev_24 = brand_sales_24.reindex(top_10['Brand'], fill_value=0).to_numpy()
+    yield markdown_table(["순위", "브랜드", "2025년 매출", "2024년 매출", "성장률 (YoY)", "비중(2025)"], [
+        range(1, len(top_10) + 1), top_10['Brand'], fmt_int(rev_25), fmt_int(rev_24),
+        fmt_pct(growth(rev_25, rev_24), signed=True), fmt_pct(share(rev_25, total_25)),
+    ])
+    
+    PROFILER.section("ko: 3. 2025년 거래처별 상세 분석")
+    yield "\n## 3. 2025년 거래처별 상세 분석 (Top 10)"
+    cust_sales_25 = df_25.groupby('거래처명', observed=True)['금액'].sum().sort_values(ascending=False).head(10).reset_index()
+    
+    # Top brand of each listed customer, from one groupby over their rows
+    top_cust_df = df_25[df_25['거래처명'].isin(cust_sales_25['거래처명'])]
+    cust_brand = top_cust_df.groupby(['거래처명', 'Brand'], observed=True)['금액'].sum()
+    top_brand = cust_brand.groupby(level=0, observed=True).idxmax().str[1]
+    
+    yield markdown_table(["순위", "거래처명", "2025년 매출", "비중", "주요 구매 브랜드 (Top 1)"], [
+        range(1, len(cust_sales_25) + 1), cust_sales_25['거래처명'], fmt_int(cust_sales_25['금액']),
+        fmt_pct(share(cust_sales_25['금액'], total_25)), top_brand.reindex(cust_sales_25['거래처명']),
+    ])
+
+    PROFILER.section("ko: 4. 2025년 거래처 그룹별 분석")
+    yield "\n## 4. 2025년 거래처 그룹별 분석"
+    group_sales_25 = df_25.groupby('거래처그룹', observed=True)['금액'].sum().sort_values(ascending=False).reset_index()
+    
+    yield markdown_table(["그룹명", "매출액", "비중"], [
+        group_sales_25['거래처그룹'], fmt_int(group_sales_25['금액']), fmt_pct(share(group_sales_25['금액'], total_25)),
+    ])
+
+
+    PROFILER.section("ko: 5. 핵심 브랜드 상세 분석")
+    yield "\n## 5. 핵심 브랜드 상세 분석 (Top 3 - 2025년 기준)"
     top_3_brands = brand_sales_25.head(3)['Brand'].tolist()
     
     for brand in top_3_brands:
-        lines.append(f"\n### [{brand}] 상세 분석")
+        yield f"\n### [{brand}] 상세 분석"
         b_df_25 = df_25[df_25['Brand'] == brand]
         b_df_24 = df_24[df_24['Brand'] == brand]
         
@@ -199,31 +148,66 @@ def generate_markdown(df):
         b_total_24 = b_df_24['금액'].sum()
         b_growth = ((b_total_25 - b_total_24) / b_total_24 * 100) if b_total_24 > 0 else 0
         
-        lines.append(f"- **매출:** {format_currency(b_total_25)} 원 (YoY {b_growth:+.1f}%)")
+        yield f"- **매출:** {format_currency(b_total_25)} 원 (YoY {b_growth:+.1f}%)"
         
         # Best Items
-        best_items = b_df_25.groupby('품목명')['금액'].sum().sort_values(ascending=False).head(5)
-        lines.append(f"\n**Best 5 품목 (2025):**")
-        lines.append("| 품목명 | 매출액 |")
-        lines.append("|---|---|")
-        for item, val in best_items.items():
-            lines.append(f"| {item} | {format_currency(val)} |")
+        best_items = b_df_25.groupby('품목명', observed=True)['금액'].sum().sort_values(ascending=False).head(5)
+        yield f"\n**Best 5 품목 (2025):**"
+        yield markdown_table(["품목명", "매출액"], [best_items.index, fmt_int(best_items)])
+    PROFILER.end_section()
 
-    return "\n".join(lines)
+    if own_charts:
+        rendered, reused = charts.flush()
+        print(f"차트: {rendered}개 생성, {reused}개 캐시 재사용")
 
 def main():
-    print("데이터 로딩 중...")
-    raw_df = load_data(FILES)
-    print("데이터 정제 중...")
-    df = clean_data(raw_df)
-    
-    print("보고서 및 차트 생성 중...")
-    report_content = generate_markdown(df)
-    
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(report_content)
-    
-    print(f"완료! 보고서 저장됨: {OUTPUT_FILE}")
+    parser = argparse.ArgumentParser(description="매출 실적 상세 분석 보고서")
+    parser.add_argument('--memory-report', action='store_true', help="정제 전/후 메모리 사용량 출력")
+    parser.add_argument('--stream', action='store_true', help="CSV를 통째로 읽지 않고 청크 단위로 집계")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="--stream 모드의 청크당 행 수")
+    parser.add_argument('--workers', type=int, default=1, help="N개 프로세스로 파일/샤드 병렬 집계 (--stream 포함)")
+    parser.add_argument('--no-charts', action='store_true', help="차트 없이 텍스트 보고서만 생성 (matplotlib 미사용)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled_run('generate_sales_report_ko', args) as prof:
+        if args.stream or args.workers > 1:
+            print("데이터 스트리밍 집계 중...")
+            dims = [c for c in REPORT_COLUMNS if c != '금액']
+            with prof.stage('stream_aggregate') as st:
+                df = stream_aggregate(FILES, clean_data, dims, ['금액'], args.chunksize, args.workers)
+                st.rows_in, st.rows_out = int(df['Rows'].sum()), len(df)
+            if args.memory_report:
+                print_cube_memory(df)
+        else:
+            print("데이터 로딩 중...")
+            with prof.stage('load_data') as st:
+                raw_df = load_data(FILES)
+                st.rows_out = len(raw_df)
+            if args.memory_report:
+                raw_mb, raw_cols = memory_mb(raw_df), len(raw_df.columns)
+            print("데이터 정제 중...")
+            with prof.stage('clean_data', rows_in=len(raw_df)) as st:
+                df = clean_data(raw_df)
+                st.rows_out = len(df)
+            if args.memory_report:
+                print_memory_report(raw_mb, raw_cols, df)
+        report_unparsed_dates(df)
+        
+        if args.no_charts:
+            print("보고서 생성 중 (차트 제외)...")
+            with prof.stage('render', rows_in=len(df)):
+                write_markdown(OUTPUT_FILE, generate_markdown(df, text_only=True))
+        else:
+            print("보고서 및 차트 생성 중...")
+            charts = ChartQueue()
+            with prof.stage('render', rows_in=len(df)):
+                write_markdown(OUTPUT_FILE, generate_markdown(df, charts))
+            with prof.stage('charts'):
+                rendered, reused = charts.flush()
+            print(f"차트: {rendered}개 생성, {reused}개 캐시 재사용")
+        
+        print(f"완료! 보고서 저장됨: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,5 @@
 
-import pandas as pd
+from sales_cache import detect_encoding, parse_csv
 
 files = [
     r'd:\(주)에바스코스메틱 Dropbox\JI SEULKI\claude\@ongoing_SALES\2024.csv',
@@ -9,13 +9,10 @@ files = [
 for file_path in files:
     print(f"\n--- Inspecting {file_path} ---")
     try:
-        # Try reading first few rows to detect structure
-        # Using 'euc-kr' or 'cp949' as it's common for Korean CSVs, falling back to 'utf-8' if needed
-        try:
-            df = pd.read_csv(file_path, nrows=5, encoding='cp949')
-        except UnicodeDecodeError:
-            print("cp949 failed, trying utf-8...")
-            df = pd.read_csv(file_path, nrows=5, encoding='utf-8')
+        # Encoding is detected from the BOM / a sampled prefix, so the file is read once
+        encoding = detect_encoding(file_path)
+        print(f"Encoding: {encoding}")
+        df, _ = parse_csv(file_path, encoding, nrows=5)
             
         print("Columns:")
         print(df.columns.tolist())
@@ -0,0 +1,106 @@
+import csv
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+# Customer alias rules.
+# A rule table maps alias strings to a canonical customer name. 'exact' rules match
+# the whole name; 'contains' rules match anywhere in it and are compiled into one
+# trie-shaped regex, so a name is scanned once however many rules there are. Rules
+# are applied to unique customer names only (see sales_clean.map_unique).
+#
+# CSV:   alias,canonical,match        (match is optional, default 'contains')
+# YAML:  either the same rows as a list of mappings, or canonical: [alias, ...]
+ALIAS_RULES_FILE = os.environ.get(
+    'SALES_ALIAS_RULES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'customer_aliases.csv'),
+)
+MATCH_KINDS = ('contains', 'exact')
+
+
+def _rule(alias, canonical, match='contains'):
+    alias, canonical = str(alias).strip(), str(canonical).strip()
+    match = (match or 'contains').strip().lower()
+    if not alias or not canonical:
+        raise ValueError(f"Alias rule needs both alias and canonical: {alias!r} -> {canonical!r}")
+    if match not in MATCH_KINDS:
+        raise ValueError(f"Unknown match kind {match!r} for alias {alias!r}")
+    return alias, canonical, match
+
+
+def _read_csv_rules(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [_rule(r['alias'], r['canonical'], r.get('match')) for r in csv.DictReader(f)]
+
+
+def _read_yaml_rules(path):
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError(f"PyYAML is needed to read {path}; install it or use a CSV rule file")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or []
+    if isinstance(data, dict):
+        return [_rule(alias, canonical) for canonical, aliases in data.items() for alias in aliases]
+    return [_rule(r['alias'], r['canonical'], r.get('match')) for r in data]
+
+
+def read_alias_rules(path):
+    if path.lower().endswith(('.yaml', '.yml')):
+        return _read_yaml_rules(path)
+    return _read_csv_rules(path)
+
+
+def trie_regex(words):
+    # One regex for all words with shared prefixes merged, e.g. ['스티물', '스티물글로벌']
+    # -> '스티물(?:글로벌)?'. At any position the longest alias is preferred.
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    return _node_regex(trie)
+
+
+def _node_regex(node):
+    alts = [re.escape(ch) + _node_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not alts:
+        return ''
+    group = '(?:' + '|'.join(alts) + ')'
+    if '' in node:
+        return group + '?'
+    return alts[0] if len(alts) == 1 else group
+
+
+class AliasMatcher:
+    def __init__(self, rules):
+        self.exact = {}
+        self.contains = {}
+        for alias, canonical, match in rules:
+            # The first rule for an alias wins
+            getattr(self, match).setdefault(alias, canonical)
+        self.pattern = re.compile(trie_regex(self.contains)) if self.contains else None
+        payload = '\n'.join(f"{m}\t{a}\t{c}" for a, c, m in rules)
+        self.digest = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:8]
+
+    def normalize(self, name):
+        # A name containing aliases of different customers goes to the leftmost one
+        if name in self.exact:
+            return self.exact[name]
+        m = self.pattern.search(name) if self.pattern else None
+        return self.contains[m.group()] if m else name
+
+
+@lru_cache(maxsize=8)
+def _load_matcher(path, mtime_ns):
+    return AliasMatcher(read_alias_rules(path))
+
+
+def load_alias_matcher(path=ALIAS_RULES_FILE, fallback=()):
+    # Matcher for the rule file at `path` (reloaded when the file changes), or for
+    # the `fallback` rules if there is no such file
+    if not os.path.exists(path):
+        return AliasMatcher([_rule(*r) for r in fallback])
+    return _load_matcher(path, os.stat(path).st_mtime_ns)
@@ -0,0 +1,248 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import load_sales_files
+from sales_charts import ChartQueue
+from sales_cube import build_cube
+from sales_markdown import write_markdown
+
+# Benchmark harness for the report scripts.
+# Synthetic ERP ledgers with the real export columns are generated at the requested
+# sizes, then every script is timed stage by stage on them: load (cold CSV parse and
+# warm Parquet cache), clean, aggregate, render and charts. Results go to a JSON
+# file; --baseline compares against an earlier run and fails on slowdowns.
+#
+#   python sales_bench.py --rows 10000 1000000 --output bench.json
+#   python sales_bench.py --rows 1000000 --baseline bench.json --tolerance 0.25
+#   python sales_bench.py --generate-only --rows 50000000 --data-dir D:\bench
+
+LEDGER_HEADER = ['일자', '거래처명', '품목명[규격]', '금액', '수량', '거래처그룹1명']
+GEN_CHUNK_ROWS = 1_000_000
+YEARS = [2024, 2025]
+SCRIPTS = {
+    'en': 'generate_sales_report',
+    'ko': 'generate_sales_report_ko',
+    'deep': 'generate_deep_analysis',
+}
+CUSTOMER_COUNT = 2000
+CUSTOMER_GROUPS = ['온라인', '오프라인', '수출', '해외수출', '도매', '특판', '']
+SPECS = ['50ml', '100ml', '200ml', '300ml', '500ml', '1L', '30g', '1+1']
+FALLBACK_ITEMS = ['ROSEMINE 핸드크림 퍼퓸드', 'MIMI 수플레바디', 'FRAIJOUR 콜라겐 립오일', 'PEDISON 아로마틱 토너']
+DUMMY_ITEMS = ['월마감', '배송비']
+STAGES = ['clean', 'aggregate', 'render', 'charts']
+
+
+def _item_names(rng):
+    # Real brand/category names from the item master, with a size spec appended
+    from sales_items import ITEM_MASTER_FILE
+    try:
+        master = pd.read_csv(ITEM_MASTER_FILE, dtype=str, encoding='utf-8-sig').dropna(subset=['brand'])
+        bases = (master['brand'] + ' ' + master['item_category'].fillna('')).str.strip().unique().tolist()
+        brands = sorted(master['brand'].unique())
+    except (OSError, KeyError, ValueError):
+        bases = FALLBACK_ITEMS
+        brands = sorted({b.split(' ')[0] for b in bases})
+    items = [f"{b} {s}" for b in bases for s in rng.choice(SPECS, size=3, replace=False)]
+    items += [f"{b} {d}" for b in brands for d in DUMMY_ITEMS]
+    return np.array(items, dtype=object)
+
+
+def _customers(rng):
+    names = [f"거래처{i:04d}" for i in range(CUSTOMER_COUNT)]
+    # A few export and alias names so the consolidation rules have work to do
+    names += ['직수출', '스티물 주식회사', '스티물글로벌 주식회사', '수출상사A', '수출상사B']
+    groups = rng.choice(CUSTOMER_GROUPS, size=len(names))
+    return np.array(names, dtype=object), np.array(groups, dtype=object)
+
+
+def generate_ledger(path, rows, year, encoding='utf-8', date_format='%Y/%m/%d', seed=0,
+                    chunk_rows=GEN_CHUNK_ROWS):
+    # Write a synthetic ERP export for one year; memory stays at one chunk of rows
+    rng = np.random.default_rng(seed + year)
+    items = _item_names(rng)
+    customers, groups = _customers(rng)
+    # Zipf-like popularity so a few customers and items dominate, as in real ledgers
+    cust_p = 1.0 / np.arange(1, len(customers) + 1)
+    cust_p /= cust_p.sum()
+    item_p = 1.0 / np.arange(1, len(items) + 1) ** 0.8
+    item_p /= item_p.sum()
+    first = date(year, 1, 1)
+    days = np.array([(first + timedelta(d)).strftime(date_format)
+                     for d in range((date(year + 1, 1, 1) - first).days)], dtype=object)
+
+    with open(path, 'w', encoding=encoding, errors='replace', newline='') as f:
+        written = 0
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            cust = rng.choice(len(customers), size=n, p=cust_p)
+            qty = rng.integers(1, 200, size=n)
+            # About 2% returns with negative amounts
+            sign = np.where(rng.random(n) < 0.02, -1, 1)
+            chunk = pd.DataFrame({
+                '일자': days[np.sort(rng.integers(0, len(days), size=n))],
+                '거래처명': customers[cust],
+                '품목명[규격]': items[rng.choice(len(items), size=n, p=item_p)],
+                '금액': sign * qty * rng.integers(1, 50, size=n) * 1000,
+                '수량': sign * qty,
+                '거래처그룹1명': groups[cust],
+            }, columns=LEDGER_HEADER)
+            chunk.to_csv(f, header=written == 0, index=False, lineterminator='\n')
+            written += n
+    return path
+
+
+def generate_dataset(data_dir, rows, encoding='utf-8', seed=0):
+    # One file per year, rows split evenly; existing files of the same shape are reused
+    os.makedirs(data_dir, exist_ok=True)
+    files = []
+    for year in YEARS:
+        path = os.path.join(data_dir, f"ledger_{rows}_{encoding}_{year}.csv")
+        if not os.path.exists(path):
+            generate_ledger(path, rows // len(YEARS), year, encoding, seed=seed)
+        files.append(path)
+    return files
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def bench_script(name, raw, work_dir):
+    # Stage timings for one report script over an already loaded raw frame
+    module = importlib.import_module(SCRIPTS[name])
+    out = os.path.join(work_dir, f"{name}.md")
+    timings = {}
+
+    df, timings['clean'] = _timed(module.clean_data, raw.copy())
+    charts = None
+    if name == 'deep':
+        cube, timings['aggregate'] = _timed(build_cube, df)
+        lines = module.generate_report(cube)
+    else:
+        dims = [c for c in module.REPORT_COLUMNS if c != '금액']
+        cube, timings['aggregate'] = _timed(build_cube, df, dims, ['금액'], True)
+        if hasattr(module, 'IMAGE_DIR'):
+            module.IMAGE_DIR = os.path.join(work_dir, 'report_images')
+            # Fresh chart cache so every run really draws
+            charts = ChartQueue(cache_dir=os.path.join(work_dir, 'chart_cache'))
+            lines = module.generate_markdown(cube, charts)
+        else:
+            lines = module.generate_markdown(cube)
+    _, timings['render'] = _timed(write_markdown, out, lines)
+    if charts is not None:
+        _, timings['charts'] = _timed(charts.flush)
+
+    timings['total'] = sum(timings.values())
+    return {k: round(v, 4) for k, v in timings.items()}
+
+
+def run_benchmark(rows, encoding, scripts, data_dir, repeat=1):
+    files = generate_dataset(data_dir, rows, encoding)
+    result = {'rows': rows, 'encoding': encoding, 'bytes': sum(os.path.getsize(f) for f in files), 'runs': []}
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='sales_bench_')
+        try:
+            cache_dir = os.path.join(work_dir, 'cache')
+            run = {}
+            raw, cold = _timed(load_sales_files, files, cache_dir)
+            _, warm = _timed(load_sales_files, files, cache_dir)
+            run['load'] = {'cold': round(cold, 4), 'warm': round(warm, 4)}
+            for name in scripts:
+                run[name] = bench_script(name, raw, work_dir)
+            result['runs'].append(run)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    # Best of the repeats per stage, the usual way to damp noise
+    result['best'] = {
+        key: {stage: min(r[key][stage] for r in result['runs']) for stage in result['runs'][0][key]}
+        for key in result['runs'][0]
+    }
+    return result
+
+
+def compare(results, baseline, tolerance):
+    # Stages that got slower than baseline * (1 + tolerance); tiny stages are ignored
+    old = {(r['rows'], r['encoding']): r['best'] for r in baseline['results']}
+    slower = []
+    for r in results:
+        base = old.get((r['rows'], r['encoding']))
+        if not base:
+            continue
+        for key, stages in r['best'].items():
+            for stage, seconds in stages.items():
+                before = base.get(key, {}).get(stage)
+                if before and before > 0.05 and seconds > before * (1 + tolerance):
+                    slower.append(f"{r['rows']:,} rows {r['encoding']} {key}.{stage}: {before:.3f}s -> {seconds:.3f}s")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sales report pipeline on synthetic ledgers")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help="ledger sizes (total over both years)")
+    parser.add_argument('--encodings', nargs='+', default=['cp949'], choices=['cp949', 'utf-8'])
+    parser.add_argument('--scripts', nargs='+', default=list(SCRIPTS), choices=list(SCRIPTS))
+    parser.add_argument('--repeat', type=int, default=1, help="runs per size; the best time per stage is reported")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'sales_bench_data'),
+                        help="where generated ledgers are kept between runs")
+    parser.add_argument('--output', help="write results JSON here (default: bench_<timestamp>.json)")
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    parser.add_argument('--generate-only', action='store_true', help="only write the synthetic ledgers")
+    args = parser.parse_args()
+
+    if args.generate_only:
+        for rows in args.rows:
+            for enc in args.encodings:
+                for f in generate_dataset(args.data_dir, rows, enc):
+                    print(f"{f} ({os.path.getsize(f) / 1024 / 1024:.1f} MB)")
+        return
+
+    results = []
+    for rows in args.rows:
+        for enc in args.encodings:
+            print(f"Benchmarking {rows:,} rows ({enc})...")
+            r = run_benchmark(rows, enc, args.scripts, args.data_dir, args.repeat)
+            results.append(r)
+            best = r['best']
+            print(f"  load: cold {best['load']['cold']:.3f}s, warm {best['load']['warm']:.3f}s")
+            for name in args.scripts:
+                stages = ', '.join(f"{s} {best[name][s]:.3f}s" for s in STAGES if s in best[name])
+                print(f"  {name}: {stages} (total {best[name]['total']:.3f}s)")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    output = args.output or f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results saved to: {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for line in slower:
+            print(f"SLOWER: {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
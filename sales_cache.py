@@ -0,0 +1,300 @@
+import codecs
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+from sales_dedup import Deduper
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+# Columnar cache for the ERP sales CSV exports.
+# Each CSV is parsed once and stored as Parquet parts; the manifest records the
+# source size, mtime and a hash of the ingested bytes. When the CSV only grew
+# (new rows appended at the end) just the new bytes are parsed and stored as an
+# extra part. Any other change rebuilds the file's cache and bumps its generation.
+CACHE_DIR = os.environ.get(
+    'SALES_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sales_cache'),
+)
+MANIFEST_NAME = 'manifest.json'
+MAX_PARTS = 32
+HASH_BLOCK = 1 << 20
+SAMPLE_BYTES = 64 * 1024
+
+
+def path_id(path):
+    return hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+
+
+def load_manifest(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def detect_encoding(path, sample_bytes=SAMPLE_BYTES):
+    # Decide between the encodings ERP exports come in from a BOM or a sampled prefix,
+    # so the file is parsed once instead of failing deep into a cp949 attempt.
+    with open(path, 'rb') as f:
+        head = f.read(4)
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+        f.seek(0)
+        # Pure ASCII says nothing; keep sampling until a non-ASCII byte shows up
+        while True:
+            sample = f.read(sample_bytes)
+            if not sample:
+                return 'cp949'
+            if not sample.isascii():
+                break
+        # Extend to the end of the line so a multibyte character isn't cut in half
+        sample += f.readline()
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp949'
+
+
+def byte_lines(encoding):
+    # Whether lines end in a single b'\n' byte, so raw bytes can be split or appended
+    # at line boundaries. UTF-16 files are read whole instead.
+    return not codecs.lookup(encoding).name.startswith(('utf-16', 'utf-32'))
+
+
+def fallback_encoding(encoding):
+    return 'utf-8' if encoding == 'cp949' else 'cp949'
+
+
+def file_encoding(path, cache_dir=CACHE_DIR):
+    # Encoding recorded in the manifest for `path`, else detected from a sample
+    entry = load_manifest(cache_dir).get(os.path.abspath(path))
+    if entry and entry.get('encoding'):
+        return entry['encoding']
+    return detect_encoding(path)
+
+
+def parse_csv(path, encoding=None, **kwargs):
+    encoding = encoding or detect_encoding(path)
+    try:
+        return pd.read_csv(path, encoding=encoding, **kwargs), encoding
+    except UnicodeDecodeError:
+        # Only reachable if the sample was misleading
+        fallback = fallback_encoding(encoding)
+        print(f"Warning: {path} is not {encoding}, re-reading as {fallback}")
+        return pd.read_csv(path, encoding=fallback, **kwargs), fallback
+
+
+def _normalize_types(df):
+    # Object columns may hold mixed str/float(NaN) values which Parquet can't store.
+    # Use the nullable string dtype so the cached and fresh frames look the same.
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def _hash_bytes(f, size, h=None):
+    h = h or hashlib.sha1()
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(HASH_BLOCK, remaining))
+        if not chunk:
+            break
+        h.update(chunk)
+        remaining -= len(chunk)
+    return h
+
+
+def _ends_with_newline(path, size):
+    if size == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+def _write_part(df, entry, cache_dir):
+    entry['seq'] = entry.get('seq', 0) + 1
+    name = f"{path_id(entry['path'])}.{entry['generation']}.{entry['seq']}.parquet"
+    df.to_parquet(os.path.join(cache_dir, name), index=False)
+    entry['parts'].append({'file': name, 'rows': len(df)})
+
+
+def _remove_parts(entry, cache_dir):
+    for part in entry.get('parts', []):
+        p = os.path.join(cache_dir, part['file'])
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def _rebuild(path, st, old_entry, cache_dir):
+    # The file changed, so its encoding may have too (e.g. re-exported as UTF-8);
+    # the manifest's encoding is only trusted for appended bytes
+    df, encoding = parse_csv(path)
+    df = _normalize_types(df)
+    if old_entry:
+        _remove_parts(old_entry, cache_dir)
+    with open(path, 'rb') as f:
+        digest = _hash_bytes(f, st.st_size).hexdigest()
+    entry = {
+        'path': os.path.abspath(path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'encoding': encoding,
+        'sha1': digest,
+        'ends_newline': _ends_with_newline(path, st.st_size),
+        'columns': list(df.columns),
+        'dtypes': {c: str(t) for c, t in df.dtypes.items()},
+        'generation': (old_entry or {}).get('generation', 0) + 1,
+        'rows': len(df),
+        'parts': [],
+    }
+    _write_part(df, entry, cache_dir)
+    return entry, df
+
+
+def _try_append(path, st, entry, cache_dir):
+    # Returns the parsed new rows, or None if the old bytes changed and a rebuild is needed
+    old_size = entry['size']
+    if st.st_size <= old_size or not entry.get('ends_newline') or not byte_lines(entry['encoding']):
+        return None
+    with open(path, 'rb') as f:
+        h = _hash_bytes(f, old_size)
+        if h.hexdigest() != entry['sha1']:
+            return None
+        tail = f.read(st.st_size - old_size)
+    h.update(tail)
+
+    try:
+        text = tail.decode(entry['encoding'])
+        new_rows = pd.read_csv(io.StringIO(text), header=None, names=entry['columns'])
+        new_rows = _normalize_types(new_rows)
+        for col, dtype in entry['dtypes'].items():
+            if str(new_rows[col].dtype) != dtype:
+                new_rows[col] = new_rows[col].astype(dtype)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        print(f"Warning: appended rows of {path} don't match the cached schema ({e}), rebuilding")
+        return None
+
+    entry.update({
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha1': h.hexdigest(),
+        'ends_newline': tail.endswith(b'\n'),
+        'rows': entry['rows'] + len(new_rows),
+    })
+    _write_part(new_rows, entry, cache_dir)
+    return new_rows
+
+
+def _compact(entry, cache_dir):
+    # Fold many small daily parts back into one file
+    df = read_parts(entry, cache_dir)
+    old_parts = {'parts': entry['parts']}
+    entry['parts'] = []
+    _write_part(df, entry, cache_dir)
+    _remove_parts(old_parts, cache_dir)
+
+
+def sync_sales_csv(path, cache_dir=CACHE_DIR):
+    # Bring the cache for `path` up to date. Returns (status, entry, new_rows):
+    # status is 'unchanged', 'appended' or 'rebuilt', new_rows the rows parsed by this call.
+    st = os.stat(path)
+    manifest = load_manifest(cache_dir)
+    key = os.path.abspath(path)
+    entry = manifest.get(key)
+    parts_ok = entry and all(
+        os.path.exists(os.path.join(cache_dir, p['file'])) for p in entry.get('parts', [])
+    )
+
+    if parts_ok and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+        return 'unchanged', entry, None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    new_rows = _try_append(path, st, entry, cache_dir) if parts_ok else None
+    if new_rows is not None:
+        status = 'appended'
+        if len(entry['parts']) > MAX_PARTS:
+            _compact(entry, cache_dir)
+    else:
+        status = 'rebuilt'
+        entry, new_rows = _rebuild(path, st, entry, cache_dir)
+
+    manifest[key] = entry
+    save_manifest(manifest, cache_dir)
+    return status, entry, new_rows
+
+
+def read_parts(entry, cache_dir=CACHE_DIR, start=0):
+    # Cached rows of one file from row `start` on, reading only the parts that hold them
+    frames = []
+    offset = 0
+    for part in entry['parts']:
+        end = offset + part['rows']
+        if end > start:
+            df = pd.read_parquet(os.path.join(cache_dir, part['file']))
+            frames.append(df.iloc[max(start - offset, 0):])
+        offset = end
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in entry['dtypes'].items()})
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_sales_csv(path, cache_dir=CACHE_DIR, use_cache=True):
+    if not use_cache or not HAS_PARQUET:
+        return _normalize_types(parse_csv(path)[0])
+
+    status, entry, new_rows = sync_sales_csv(path, cache_dir)
+    if status == 'rebuilt':
+        return new_rows
+    return read_parts(entry, cache_dir)
+
+
+def load_sales_files(files, cache_dir=CACHE_DIR, use_cache=True, warn_missing=True, dedup=True):
+    # With dedup, lines an earlier file already had (overlapping exports) are dropped;
+    # see sales_dedup.py
+    deduper = Deduper() if dedup else None
+    dfs = []
+    for f in files:
+        if not os.path.exists(f):
+            if warn_missing:
+                print(f"Warning: File not found: {f}")
+            continue
+        df = read_sales_csv(f, cache_dir=cache_dir, use_cache=use_cache)
+        if deduper:
+            deduper.start_source(f)
+            df = deduper.filter(df)
+        dfs.append(df)
+
+    if not dfs:
+        raise ValueError("No data loaded")
+    if deduper:
+        deduper.print_report(quiet=True)
+
+    return pd.concat(dfs, ignore_index=True)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import lru_cache
+
+from sales_cache import CACHE_DIR
+from sales_profile import PROFILER
+
+# Chart render queue.
+# Report code submits (draw function, plotted data, target path). Each chart is keyed
+# by a hash of the function and its data; charts already in the PNG cache are copied
+# instead of redrawn, and the rest are rendered with the Agg backend, in a process
+# pool when there is more than one. matplotlib is only imported once a chart is
+# actually drawn, so text-only runs never pay for it.
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, 'charts')
+CHART_WORKERS = int(os.environ.get('SALES_CHART_WORKERS', os.cpu_count() or 1))
+# Bump when the drawing code or styling changes so cached PNGs are redrawn
+CHART_STYLE_VERSION = 1
+KOREAN_FONT = 'Malgun Gothic'
+# Tried in order when the Windows font isn't installed
+FALLBACK_FONTS = ['AppleGothic', 'NanumGothic', 'Noto Sans CJK KR', 'Noto Sans KR']
+
+
+@lru_cache(maxsize=1)
+def setup_matplotlib():
+    # Once per process: Agg backend and the first installed Korean font
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import font_manager
+
+    installed = {f.name for f in font_manager.fontManager.ttflist}
+    font = next((f for f in [KOREAN_FONT] + FALLBACK_FONTS if f in installed), None)
+    if font:
+        matplotlib.rcParams['font.family'] = font
+    else:
+        # Asking for a missing family makes every text element retry the lookup
+        print(f"Warning: no Korean font found ({KOREAN_FONT}, {', '.join(FALLBACK_FONTS)}); "
+              f"chart labels may not render")
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    return font
+
+
+def draw_monthly_trend(path, data):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    for label, (months, values) in data['series'].items():
+        plt.plot(months, values, marker='o', label=label)
+
+    plt.title(data['title'])
+    plt.xlabel('월')
+    plt.ylabel('매출액 (원)')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(path)
+    plt.close()
+
+
+def draw_top_brands(path, data):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.figure(figsize=(12, 6))
+    sns.barplot(x=data['values'], y=data['labels'], orient='h')
+    plt.title(data['title'])
+    plt.xlabel('매출액 (원)')
+    plt.ylabel('브랜드')
+    plt.grid(axis='x')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def _render(task):
+    # Runs in a worker process (or inline for a single chart); returns its wall and CPU time
+    draw_fn, data, path = task
+    wall, cpu = time.perf_counter(), time.process_time()
+    setup_matplotlib()
+    tmp = path + '.tmp.png'
+    draw_fn(tmp, data)
+    os.replace(tmp, path)
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def chart_key(draw_fn, data):
+    payload = json.dumps(
+        [draw_fn.__module__, draw_fn.__qualname__, CHART_STYLE_VERSION, data],
+        ensure_ascii=False, sort_keys=True, default=float,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class ChartQueue:
+    def __init__(self, cache_dir=CHART_CACHE_DIR, workers=None):
+        self.cache_dir = cache_dir
+        self.workers = workers or CHART_WORKERS
+        self.pending = []
+
+    def submit(self, draw_fn, data, target):
+        # data must be JSON-serialisable plain values (lists, dicts, numbers, strings)
+        self.pending.append((draw_fn, data, target))
+
+    def flush(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        todo = {}
+        for draw_fn, data, target in self.pending:
+            cached = os.path.join(self.cache_dir, chart_key(draw_fn, data) + '.png')
+            if not os.path.exists(cached):
+                todo[cached] = (draw_fn, data, cached)
+
+        tasks = list(todo.values())
+        if len(tasks) > 1 and self.workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                timings = list(pool.map(_render, tasks))
+        else:
+            timings = [_render(task) for task in tasks]
+        for (draw_fn, _, _), (wall, cpu) in zip(tasks, timings):
+            PROFILER.record(f"chart: {draw_fn.__name__}", wall, cpu)
+
+        for draw_fn, data, target in self.pending:
+            cached = os.path.join(self.cache_dir, chart_key(draw_fn, data) + '.png')
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            shutil.copyfile(cached, target)
+
+        rendered, reused = len(tasks), len(self.pending) - len(tasks)
+        self.pending = []
+        return rendered, reused
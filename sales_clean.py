@@ -0,0 +1,259 @@
+import re
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from sales_aliases import ALIAS_RULES_FILE, load_alias_matcher
+from sales_items import load_item_master, resolve_items
+
+# Vectorized cleaning rules shared by the report scripts.
+# ERP ledgers have millions of rows but only a few thousand distinct customer and
+# item names, so every rule is evaluated once per unique value and broadcast back.
+
+# Built-in customer rules, used when there is no alias rule file (see sales_aliases.py)
+RUSSIA_ALIASES = ['직수출', '스티물 주식회사', '스티물글로벌 주식회사', '스티물', '스티물글로벌']
+RUSSIA_CUSTOMER = '직수출(러시아)'
+DUMMY_ITEM_KEYWORDS = ['월마감', '배송비']
+EXPORT_KEYWORD = '수출'
+# 일자 formats seen in ERP exports (and the app database), most common first
+DATE_FORMATS = ['%Y/%m/%d', '%Y%m%d', '%Y-%m-%d', '%Y.%m.%d']
+# Distinct 일자 strings checked when picking the format for a batch
+DATE_SAMPLE = 200
+# Parsed 일자 strings kept across calls (chunks, files); a ledger has a few hundred
+DATE_CACHE_MAX = 100_000
+_date_cache = {}
+# Unparseable 일자 value -> rows seen, for report_unparsed_dates
+UNPARSED_DATES = Counter()
+
+
+def map_unique(series, func, na_value=None):
+    # func receives the unique values as a string Series and must return a Series
+    # aligned with it.
+    codes, uniques = pd.factorize(series)
+    mapped = func(pd.Series(uniques, dtype=object).astype(str))
+    result = pd.Series(mapped.to_numpy()[codes], index=series.index)
+    if (codes == -1).any():
+        result = result.where(codes != -1, na_value)
+    return result
+
+
+def _contains_any(values, keywords):
+    pattern = '|'.join(re.escape(k) for k in keywords)
+    return values.str.contains(pattern, regex=True)
+
+
+def infer_date_format(sample):
+    # The known format matching most of the sample, else pandas' guess from its first value
+    best, hits = None, 0
+    for fmt in DATE_FORMATS:
+        n = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if n > hits:
+            best, hits = fmt, n
+    if best is None and len(sample):
+        best = guess_datetime_format(str(sample.iloc[0]))
+    return best
+
+
+def _parse_unique(uniques, date_format=None):
+    # Unique strings -> datetime64 array. Without a date_format the format is inferred
+    # from a sample; strings it misses get the other known formats, so files mixing
+    # formats keep their rows.
+    if uniques.dtype.kind == 'f':
+        # 일자 read as numbers (20250103.0 once a blank row turns the column float)
+        uniques = uniques.astype(np.int64)
+    values = pd.Series(uniques, dtype=object).astype(str)
+    if date_format:
+        return pd.to_datetime(values, format=date_format, errors='coerce').to_numpy()
+    dates = pd.to_datetime(pd.Series(values.map(_date_cache)), errors='coerce')
+    todo = dates.isna() & ~values.isin(_date_cache.keys())
+    if todo.any():
+        new = values[todo]
+        fmt = infer_date_format(new.head(DATE_SAMPLE))
+        parsed = pd.to_datetime(new, format=fmt, errors='coerce') if fmt else pd.Series(pd.NaT, index=new.index)
+        for other in DATE_FORMATS:
+            missing = parsed.isna()
+            if not missing.any():
+                break
+            if other != fmt:
+                parsed[missing] = pd.to_datetime(new[missing], format=other, errors='coerce')
+        if len(_date_cache) + len(new) > DATE_CACHE_MAX:
+            _date_cache.clear()
+        _date_cache.update(zip(new, parsed))
+        dates[todo] = parsed
+    return dates.to_numpy()
+
+
+def parse_dates(values, date_format=None):
+    # Parses each distinct 일자 string once and broadcasts it back; rows that fail stay
+    # NaT and are counted in UNPARSED_DATES
+    codes, uniques = pd.factorize(values)
+    parsed = _parse_unique(uniques, date_format)
+    dates = pd.Series(np.append(parsed, np.datetime64('NaT', 'ns')).astype('datetime64[ns]')[codes],
+                      index=values.index)
+    bad = np.flatnonzero(pd.isna(parsed))
+    if len(bad):
+        rows = np.bincount(codes[codes >= 0], minlength=len(uniques))[bad]
+        UNPARSED_DATES.update(dict(zip(map(str, np.asarray(uniques, dtype=object)[bad]), rows.tolist())))
+    return dates
+
+
+def report_unparsed_dates(df, examples=5):
+    # Warn about rows whose 일자 couldn't be parsed (kept, with no Year/Month). Works on a
+    # cleaned frame or a cube with a Rows column, so worker-process rows are counted too.
+    col = 'Year' if 'Year' in df.columns else 'YearMonth'
+    missing = df[col].isna()
+    rows = int(df.loc[missing, 'Rows'].sum()) if 'Rows' in df.columns else int(missing.sum())
+    if rows:
+        seen = ', '.join(repr(v) for v, _ in UNPARSED_DATES.most_common(examples))
+        print(f"Warning: {rows:,} rows have an unparseable 일자 and no Year/Month"
+              + (f", e.g. {seen}" if seen else ''))
+    UNPARSED_DATES.clear()
+    return rows
+
+
+def customer_matcher():
+    return load_alias_matcher(ALIAS_RULES_FILE, fallback=[(a, RUSSIA_CUSTOMER) for a in RUSSIA_ALIASES])
+
+
+def normalize_customers(series, matcher=None):
+    # Map customer names onto their canonical name via the alias rules
+    matcher = matcher or customer_matcher()
+    return map_unique(series, lambda names: names.map(matcher.normalize), na_value='Unknown')
+
+
+def extract_brands(items):
+    # Brand = first word of the item name
+    return map_unique(items, lambda names: names.str.split(' ').str[0], na_value='Unknown')
+
+
+def flag_dummy_items(items, keywords=DUMMY_ITEM_KEYWORDS):
+    return map_unique(items, lambda names: _contains_any(names, keywords), na_value=False).astype(bool)
+
+
+def classify_markets(groups, customers):
+    # Export if '수출' appears in either the customer group or the customer name
+    grp = map_unique(groups, lambda v: v.str.contains(EXPORT_KEYWORD, regex=False), na_value=False)
+    cust = map_unique(customers, lambda v: v.str.contains(EXPORT_KEYWORD, regex=False), na_value=False)
+    is_export = grp.astype(bool) | cust.astype(bool)
+    return pd.Series(np.where(is_export, 'Export', 'Domestic'), index=groups.index)
+
+
+# Bump when the cleaning rules change so persisted cubes get rebuilt
+RULES_VERSION = 'ledger-v1'
+
+
+def rules_version():
+    # RULES_VERSION plus the alias rules and item master in effect, so editing either rebuilds
+    master = load_item_master()
+    return f"{RULES_VERSION}+aliases-{customer_matcher().digest}+items-{master.digest if master else 'none'}"
+
+def year_month(year, month):
+    # YearMonth periods rebuilt from stored Year/Month columns (NaT where either is missing).
+    # Only complete rows are converted: to_datetime rejects nullable ints holding NA.
+    year, month = pd.Series(year), pd.Series(month, index=year.index)
+    known = (year.notna() & month.notna()).to_numpy()
+    periods = pd.Series(pd.NaT, index=year.index, dtype='period[M]')
+    if known.any():
+        dates = pd.to_datetime(pd.DataFrame({'year': year[known].astype(np.int64),
+                                             'month': month[known].astype(np.int64), 'day': 1}))
+        periods[known] = dates.dt.to_period('M')
+    return periods
+
+# Everything any report reads; clean_ledger keeps the subset it is asked for
+LEDGER_COLUMNS = ['Year', 'Month', 'YearMonth', '거래처명', '품목명', '거래처그룹',
+                  '금액', '수량', 'Brand', 'Category', 'Market', 'IsDummy']
+
+
+def clean_ledger(df, date_format=None, columns=LEDGER_COLUMNS):
+    # The one set of cleaning rules every report uses
+    df['Date'] = parse_dates(df['일자'], date_format)
+    df['Year'] = df['Date'].dt.year
+    df['Month'] = df['Date'].dt.month
+    if 'YearMonth' in columns:
+        df['YearMonth'] = df['Date'].dt.to_period('M')
+
+    # Fill NA
+    df['거래처명'] = df['거래처명'].fillna('Unknown')
+    df['품목명'] = df['품목명[규격]'].fillna('Unknown')
+    df['거래처그룹'] = df['거래처그룹1명'].fillna('Unknown')
+    df['금액'] = pd.to_numeric(df['금액'], errors='coerce').fillna(0)
+    if '수량' in df.columns:
+        df['수량'] = pd.to_numeric(df['수량'], errors='coerce').fillna(0)
+
+    # Customer Normalization (alias rules, e.g. Russia consolidation)
+    df['거래처명'] = normalize_customers(df['거래처명'])
+
+    # Brand / category from the item master; without one, brand = first word of the item name
+    master = load_item_master()
+    if master is not None:
+        df['Brand'], df['Category'] = resolve_items(df['품목명'], master)
+    else:
+        df['Brand'], df['Category'] = extract_brands(df['품목명']), 'Unknown'
+
+    # Export if '수출' is in the customer group or name
+    if 'Market' in columns:
+        df['Market'] = classify_markets(df['거래처그룹'], df['거래처명'])
+
+    # '월마감' / '배송비' lines are revenue-only dummies, excluded from item analysis
+    if 'IsDummy' in columns:
+        df['IsDummy'] = flag_dummy_items(df['품목명'])
+
+    return compact_frame(df, columns)
+
+
+# Columns kept as categoricals after cleaning; their cardinality is tiny next to the row count
+CATEGORY_COLUMNS = ['거래처명', '품목명', '거래처그룹', 'Brand', 'Category', 'Market']
+INT32_MAX = np.iinfo(np.int32).max
+INT32_MIN = np.iinfo(np.int32).min
+
+
+def _downcast_int(s):
+    # Only whole, non-null numbers are downcast; anything else keeps its dtype
+    if s.dtype.kind not in 'iuf' or s.isna().any():
+        return s
+    if s.dtype.kind == 'f' and not (s == np.floor(s)).all():
+        return s
+    if s.empty or (s.min() >= INT32_MIN and s.max() <= INT32_MAX):
+        return s.astype(np.int32)
+    return s.astype(np.int64)
+
+
+def compact_frame(df, columns=None):
+    # Keep only the report columns, as categoricals / narrow ints.
+    # build_cube widens the int32 amounts again before summing them.
+    columns = [c for c in (columns or df.columns) if c in df.columns]
+    out = {}
+    for col in columns:
+        s = df[col]
+        if col in CATEGORY_COLUMNS:
+            s = s.astype('category')
+        elif col in ('금액', '수량'):
+            s = _downcast_int(s)
+        elif col in ('Year', 'Month') and not s.isna().any():
+            s = s.astype(np.int16)
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+def print_memory_report(raw_mb, raw_cols, clean_df):
+    # raw_mb / raw_cols must be measured before cleaning, clean_data adds columns in place
+    clean = memory_mb(clean_df)
+    saved = (1 - clean / raw_mb) * 100 if raw_mb else 0
+    print(f"Memory: raw {raw_mb:,.1f} MB ({raw_cols} cols) -> "
+          f"clean {clean:,.1f} MB ({len(clean_df.columns)} cols), {saved:.0f}% smaller")
+    for col, dtype in clean_df.dtypes.items():
+        print(f"  {col}: {dtype}")
+
+
+def print_cube_memory(cube):
+    # --memory-report on the cube paths (--stream, --incremental): no row-level frame exists
+    print(f"Memory: cube {memory_mb(cube):,.1f} MB ({len(cube):,} groups, {len(cube.columns)} cols); "
+          f"the ledger rows behind it are not kept in memory")
+    for col, dtype in cube.dtypes.items():
+        print(f"  {col}: {dtype}")
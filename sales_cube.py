@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import CACHE_DIR, path_id, read_parts, sync_sales_csv
+from sales_dedup import Deduper, resume_deduper, save_deduper
+
+# Pre-aggregated sales cube.
+# The cleaned ledger is grouped once on every dimension the reports slice by; report
+# sections then roll the (much smaller) cube up instead of rescanning the raw rows.
+CUBE_DIMENSIONS = ['Year', 'Month', 'Market', 'Brand', '거래처명', '품목명', 'IsDummy']
+CUBE_MEASURES = ['금액', '수량']
+ROW_COUNT = 'Rows'
+
+
+def build_cube(df, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, count=False):
+    # Rows with a missing key (e.g. unparseable 일자) are kept so cube totals equal ledger totals
+    dims = [d for d in dimensions if d in df.columns]
+    vals = [m for m in measures if m in df.columns]
+    # Narrow int measures (see sales_clean.compact_frame) are summed as int64. pandas 3.0
+    # returns an int32 sum when every group has a single row, and numpy int32 arithmetic
+    # on such cube values later wraps around silently
+    wide = {m: df[m].astype(np.int64) for m in vals if df[m].dtype.kind in 'iu' and df[m].dtype.itemsize < 8}
+    if wide:
+        df = df.assign(**wide)
+    grouped = df.groupby(dims, observed=True, dropna=False)
+    cube = grouped[vals].sum()
+    if count:
+        cube[ROW_COUNT] = grouped.size()
+    return cube.reset_index()
+
+
+def merge_cubes(cubes, dimensions=CUBE_DIMENSIONS):
+    # Re-aggregate cubes built on the same dimensions; every other column is summed
+    cubes = [c for c in cubes if len(c)]
+    if not cubes:
+        return pd.DataFrame(columns=list(dimensions) + CUBE_MEASURES)
+    if len(cubes) == 1:
+        return cubes[0]
+    merged = pd.concat(cubes, ignore_index=True)
+    dims = [d for d in dimensions if d in merged.columns]
+    return build_cube(merged, dims, [c for c in merged.columns if c not in dims])
+
+
+def rollup(cube, dims, measures=None):
+    # Sum the cube up to `dims`; index is sorted like a plain groupby on the raw rows
+    vals = measures or [m for m in CUBE_MEASURES if m in cube.columns]
+    return cube.groupby(dims, observed=True)[vals].sum()
+
+
+def cube_slice(agg, key):
+    # Rows of a multi-level rollup under the first-level `key` (empty if absent)
+    try:
+        return agg.xs(key, level=0)
+    except KeyError:
+        return agg.iloc[0:0].droplevel(0)
+
+
+def _load_cube_meta(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_incremental_cube(files, clean_fn, rules='default', cache_dir=CACHE_DIR,
+                          dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES, count=False, dedup=True):
+    # Persisted per-file cubes kept in step with the raw cache in sales_cache.py.
+    # Rows appended to a CSV since the last run are cleaned with clean_fn and merged
+    # into the stored cube; a changed file (new cache generation) or a different
+    # `rules` tag rebuilds that file's cube from scratch.
+    # With dedup the appended rows first go through the Deduper state saved by the last
+    # run (sales_dedup.resume_deduper); when that state can't be resumed every file's
+    # cube is rebuilt, since which lines count as repeats depends on all the files.
+    shape = hashlib.sha1('|'.join(list(dimensions) + list(measures) + [str(count)]).encode('utf-8'))
+    shape = shape.hexdigest()[:8]
+    if dedup:
+        rules = rules + '+dedup'
+    entries = {}
+    for f in files:
+        if os.path.exists(f):
+            entries[os.path.abspath(f)] = sync_sales_csv(f, cache_dir)[1]
+    state_path = os.path.join(cache_dir, f"dedup-{shape}.npz")
+    deduper, starts = resume_deduper(state_path, entries, rules) if dedup else (None, None)
+
+    plans = []
+    for key, entry in entries.items():
+        # One stored cube per source file and dimension set
+        base = os.path.join(cache_dir, f"{path_id(key)}.cube-{shape}")
+        cube_path, meta_path = base + '.parquet', base + '.json'
+        meta = _load_cube_meta(meta_path)
+        same_source = (
+            os.path.exists(cube_path)
+            and meta.get('generation') == entry['generation']
+            and meta.get('rules') == rules
+            and meta.get('rows', 0) <= entry['rows']
+        )
+        plans.append([key, entry, cube_path, meta_path, meta, same_source])
+    if dedup and (starts is None or any(
+            (p[4]['rows'] if p[5] else 0) != starts[p[0]] for p in plans)):
+        # The stored cubes and the dedup state disagree: start over on every file
+        deduper, starts = Deduper(), None
+        for p in plans:
+            p[5] = False
+
+    cubes = []
+    for key, entry, cube_path, meta_path, meta, same_source in plans:
+        f = os.path.basename(key)
+        if same_source and meta['rows'] == entry['rows']:
+            cubes.append(pd.read_parquet(cube_path))
+            continue
+        start = meta['rows'] if same_source else 0
+        delta = read_parts(entry, cache_dir, start=start)
+        if deduper:
+            deduper.start_source(key)
+            delta = deduper.filter(delta)
+        if same_source:
+            print(f"{f}: merging {len(delta):,} new rows into cube")
+            delta_cube = build_cube(clean_fn(delta), dimensions, measures, count)
+            cube = merge_cubes([pd.read_parquet(cube_path), delta_cube], dimensions)
+        else:
+            print(f"{f}: rebuilding cube")
+            cube = build_cube(clean_fn(delta), dimensions, measures, count)
+
+        cube.to_parquet(cube_path, index=False)
+        with open(meta_path, 'w', encoding='utf-8') as fh:
+            json.dump({'generation': entry['generation'], 'rows': entry['rows'], 'rules': rules}, fh)
+        cubes.append(cube)
+
+    if deduper:
+        save_deduper(deduper, state_path, entries, rules)
+        deduper.print_report(quiet=True)
+    if not cubes:
+        raise ValueError("No data loaded")
+    return merge_cubes(cubes, dimensions)
@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from sales_cache import CACHE_DIR, HAS_PARQUET, read_parts, sync_sales_csv
+from sales_clean import LEDGER_COLUMNS, clean_ledger, compact_frame, rules_version, year_month
+from sales_cube import build_cube
+from sales_dedup import Deduper, resume_deduper, save_deduper
+from sales_periods import parse_period
+
+if HAS_PARQUET:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+# Partitioned on-disk dataset of cleaned ledger rows.
+# Cleaned rows are written as Parquet under year=/month=/market= directories
+# (Hive-style), so a query for one month or one market opens only the files in the
+# matching directories, and only the columns it asks for. Appended CSV rows are added
+# as new files in their partitions; a changed file or new cleaning rules rewrite the
+# dataset. YearMonth isn't stored, it is rebuilt from year/month on read.
+#
+#   python sales_dataset.py sync
+#   python sales_dataset.py scan --period 2025-03 --market Export --columns 거래처명 금액
+#   python sales_report.py --dataset --period 2025Q3 --market Domestic
+DATASET_DIR = os.environ.get('SALES_DATASET', os.path.join(CACHE_DIR, 'dataset'))
+MANIFEST_NAME = '_manifest.json'
+# Files starting with '_' are skipped when the dataset is scanned
+DEDUP_STATE = '_dedup.npz'
+# Cleaned column -> partition key
+PARTITION_KEYS = {'Year': 'year', 'Month': 'month', 'Market': 'market'}
+DATASET_COLUMNS = [c for c in LEDGER_COLUMNS if c != 'YearMonth']
+
+
+def _partitioning():
+    schema = pa.schema([('year', pa.int16()), ('month', pa.int16()), ('market', pa.string())])
+    return ds.partitioning(schema, flavor='hive')
+
+
+def _load_manifest(dataset_dir):
+    try:
+        with open(os.path.join(dataset_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest, dataset_dir):
+    path = os.path.join(dataset_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def write_partitions(df, dataset_dir, seq):
+    # Add cleaned rows to the dataset; part files of batch `seq` never overwrite earlier ones
+    frame = df[[c for c in DATASET_COLUMNS if c in df.columns]].rename(columns=PARTITION_KEYS)
+    frame = frame.assign(year=frame['year'].astype('Int16'), month=frame['month'].astype('Int16'),
+                         market=frame['market'].astype(str))
+    ds.write_dataset(
+        pa.Table.from_pandas(frame, preserve_index=False), dataset_dir, format='parquet',
+        partitioning=_partitioning(), basename_template=f"part-{seq}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+
+def sync_dataset(files, clean_fn, rules='default', dataset_dir=DATASET_DIR, cache_dir=CACHE_DIR, dedup=True):
+    # Bring the dataset in line with `files`; returns the number of rows cleaned.
+    # With dedup the new rows first go through the Deduper state kept in the dataset
+    # directory (sales_dedup.resume_deduper); if it can't be resumed the dataset is rewritten.
+    if dedup:
+        rules = rules + '+dedup'
+    manifest = _load_manifest(dataset_dir)
+    sources = manifest.get('sources', {})
+    entries = {}
+    for f in files:
+        if os.path.exists(f):
+            entries[os.path.abspath(f)] = sync_sales_csv(f, cache_dir)[1]
+    if not entries:
+        raise ValueError("No data loaded")
+
+    rebuild = (
+        manifest.get('rules') != rules
+        or set(sources) != set(entries)
+        or any(sources[k]['generation'] != e['generation'] or sources[k]['rows'] > e['rows']
+               for k, e in entries.items())
+    )
+    state_path = os.path.join(dataset_dir, DEDUP_STATE)
+    deduper, starts = resume_deduper(state_path, entries, rules) if dedup and not rebuild else (None, None)
+    if dedup and (starts is None or any(sources.get(k, {}).get('rows', 0) != starts[k] for k in entries)):
+        rebuild, deduper = True, Deduper()
+    if rebuild:
+        print("Rewriting partitioned dataset")
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+        manifest, sources = {'rules': rules, 'seq': 0}, {}
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    cleaned = 0
+    for key, entry in entries.items():
+        start = sources.get(key, {}).get('rows', 0)
+        if start == entry['rows']:
+            continue
+        delta = read_parts(entry, cache_dir, start=start)
+        if start:
+            print(f"{os.path.basename(key)}: adding {len(delta):,} new rows to the dataset")
+        cleaned += len(delta)
+        if deduper:
+            deduper.start_source(key)
+            delta = deduper.filter(delta)
+        manifest['seq'] += 1
+        write_partitions(clean_fn(delta), dataset_dir, manifest['seq'])
+        sources[key] = {'generation': entry['generation'], 'rows': entry['rows']}
+    if deduper:
+        save_deduper(deduper, state_path, entries, rules)
+        deduper.print_report(quiet=True)
+    manifest['sources'] = sources
+    _save_manifest(manifest, dataset_dir)
+    return cleaned
+
+
+def partition_filter(period=None, markets=None):
+    # Filter on partition keys only, so whole directories are skipped
+    expr = None
+    if period is not None:
+        first, last = parse_period(period)
+        months = {}
+        for o in range(first, last + 1):
+            months.setdefault(o // 12, []).append(o % 12 + 1)
+        for year, ms in months.items():
+            part = (ds.field('year') == year) & ds.field('month').isin(ms)
+            expr = part if expr is None else expr | part
+    if markets:
+        part = ds.field('market').isin(list(markets))
+        expr = part if expr is None else expr & part
+    return expr
+
+
+def open_dataset(dataset_dir=DATASET_DIR):
+    return ds.dataset(dataset_dir, format='parquet', partitioning=_partitioning())
+
+
+def read_dataset(columns=None, period=None, markets=None, dataset_dir=DATASET_DIR):
+    # Cleaned rows of the matching partitions, only `columns` (default: all)
+    wanted = list(columns or LEDGER_COLUMNS)
+    stored = [PARTITION_KEYS.get(c, c) for c in wanted if c != 'YearMonth']
+    if 'YearMonth' in wanted:
+        stored += [k for k in ('year', 'month') if k not in stored]
+    table = open_dataset(dataset_dir).to_table(columns=stored, filter=partition_filter(period, markets))
+    df = table.to_pandas().rename(columns={v: k for k, v in PARTITION_KEYS.items()})
+    if 'YearMonth' in wanted:
+        df['YearMonth'] = year_month(df['Year'], df['Month'])
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Category order as a fresh astype('category') gives, so cubes sort the same
+            df[col] = df[col].cat.set_categories(sorted(df[col].cat.categories))
+    return compact_frame(df, wanted)
+
+
+def load_dataset_cube(files, dimensions, measures, period=None, markets=None,
+                      dataset_dir=DATASET_DIR, cache_dir=CACHE_DIR, dedup=True):
+    # Engine cube over the requested slice; the dataset is synced with `files` first
+    sync_dataset(files, _clean, rules_version(), dataset_dir, cache_dir, dedup)
+    df = read_dataset(list(dimensions) + list(measures), period, markets, dataset_dir)
+    if df.empty:
+        raise ValueError("No rows in the requested slice")
+    return build_cube(df, dimensions, measures, count=True)
+
+
+def _clean(df, date_format=None):
+    return clean_ledger(df, date_format, LEDGER_COLUMNS)
+
+
+def main():
+    from sales_report import default_files
+
+    parser = argparse.ArgumentParser(description="Partitioned dataset of cleaned sales rows")
+    parser.add_argument('--dataset-dir', default=DATASET_DIR, help="dataset root (default: $SALES_DATASET)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync = sub.add_parser('sync', help="write new/changed CSV rows into the dataset")
+    sync.add_argument('--files', nargs='+', help="ERP CSV exports (default: FILES of generate_sales_report.py)")
+    scan = sub.add_parser('scan', help="read a slice and show what it cost")
+    scan.add_argument('--period', help="2025, 2025Q3, 2025-03 or R12:2025-06")
+    scan.add_argument('--market', nargs='+', choices=['Export', 'Domestic'])
+    scan.add_argument('--columns', nargs='+', default=['Year', 'Month', 'Market', '금액'])
+    args = parser.parse_args()
+
+    if not HAS_PARQUET:
+        parser.error("pyarrow is required for the partitioned dataset")
+    t0 = time.perf_counter()
+    if args.command == 'sync':
+        rows = sync_dataset(args.files or default_files(), _clean, rules_version(), args.dataset_dir)
+        files = open_dataset(args.dataset_dir).files
+        print(f"Cleaned {rows:,} rows; dataset has {len(files):,} files ({time.perf_counter() - t0:.2f}s)")
+        return
+
+    dataset = open_dataset(args.dataset_dir)
+    expr = partition_filter(args.period, args.market)
+    fragments = list(dataset.get_fragments(filter=expr))
+    df = read_dataset(args.columns, args.period, args.market, args.dataset_dir)
+    print(f"Read {len(fragments):,} of {len(dataset.files):,} files, {len(df):,} rows, "
+          f"{len(df.columns)} columns ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    measures = [c for c in df.columns if c in ('금액', '수량')]
+    keys = [c for c in ('Year', 'Month', 'Market') if c in df.columns]
+    if measures and keys:
+        print(df.groupby(keys, observed=True)[measures].sum().to_string())
+
+
+if __name__ == "__main__":
+    main()
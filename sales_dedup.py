@@ -0,0 +1,386 @@
+import argparse
+import copy
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Duplicate and reversal pass over raw ERP rows, before cleaning.
+# Every row is fingerprinted as a 64-bit hash of its ledger columns and checked
+# against a sorted uint64 array of the fingerprints kept so far (8 bytes a row), so
+# the pass works chunk by chunk and never holds more than the hashes of earlier rows.
+# Identical lines inside one export are separate sales and are kept: the n-th copy of
+# a line in a file only matches the n-th copy in an earlier file, which is exactly
+# what an overlapping or rolling re-export repeats. mode='exact' drops every repeat.
+# Negative rows (returns, cancellations) are paired with a positive row of the same
+# customer, item, amount and quantity, in either order. Pairs sum to zero, so both
+# rows stay in the data; the pass only reports them, with the reversals that have no
+# original in the loaded files.
+# The incremental loaders (--incremental, --store, --dataset) save the state between
+# runs (resume_deduper) and pass only appended rows through it.
+#
+#   python sales_dedup.py                              # report on the default FILES
+#   python sales_dedup.py --files jan-jun.csv 2025.csv --removed removed.csv
+DEDUP_COLUMNS = ['일자', '거래처명', '품목명[규격]', '금액', '수량', '거래처그룹1명', '비고']
+REVERSAL_COLUMNS = ['거래처명', '품목명[규격]']
+MEASURE_COLUMNS = ['금액', '수량']
+# Mixed into a fingerprint with the line's occurrence number within its file
+OCCURRENCE_SALT = np.uint64(0x9E3779B97F4A7C15)
+HASH_MIX = np.uint64(0x100000001B3)
+EXAMPLES = 5
+
+
+def _text_hashes(values):
+    # Hashes of text as written; 일자 read as a number (20240319.0) hashes like '20240319'
+    codes, uniques = pd.factorize(values)
+    text = [str(int(v)) if isinstance(v, float) and v.is_integer() else str(v) for v in uniques]
+    hashed = pd.util.hash_array(np.array(text + [''], dtype=object))
+    return hashed[codes]
+
+
+def _number_hashes(values, absolute=False):
+    numbers = pd.to_numeric(values, errors='coerce').to_numpy(np.float64, na_value=np.nan)
+    if absolute:
+        numbers = np.abs(numbers)
+    # 0.0 and -0.0 are the same amount
+    return pd.util.hash_array(numbers + 0.0)
+
+
+def _combine(columns, n):
+    h = np.zeros(n, dtype=np.uint64)
+    for col in columns:
+        h = (h ^ col) * HASH_MIX
+    return h
+
+
+def column_hashes(df, columns=DEDUP_COLUMNS):
+    # {column: 64-bit hash per row} for the ledger columns `df` has
+    return {c: _number_hashes(df[c]) if c in MEASURE_COLUMNS else _text_hashes(df[c])
+            for c in columns if c in df.columns}
+
+
+def row_hashes(df, columns=DEDUP_COLUMNS, hashes=None):
+    # 64-bit fingerprint of each row over the ledger columns it has
+    hashes = hashes if hashes is not None else column_hashes(df, columns)
+    return _combine([hashes[c] for c in columns if c in hashes], len(df))
+
+
+def reversal_keys(df, hashes=None):
+    # Customer, item and absolute amount/quantity: a reversal and its original share it
+    hashes = hashes or {}
+    keys = [hashes[c] if c in hashes else _text_hashes(df[c]) for c in REVERSAL_COLUMNS if c in df.columns]
+    keys += [_number_hashes(df[c], absolute=True) for c in MEASURE_COLUMNS if c in df.columns]
+    return _combine(keys, len(df))
+
+
+def fingerprints(df, columns=DEDUP_COLUMNS):
+    # What the pass needs of each row, without the row itself (32 bytes a row):
+    # (row hash, reversal key, 금액, sign) with sign -1 for a reversal, 1 for a positive
+    # row and 0 otherwise; keys and sign are None without both 금액 and 수량
+    hashes = column_hashes(df, columns)
+    h = row_hashes(df, columns, hashes)
+    amount = pd.to_numeric(df['금액'], errors='coerce').fillna(0).to_numpy(np.float64) \
+        if '금액' in df.columns else np.zeros(len(df))
+    if not all(c in df.columns for c in MEASURE_COLUMNS):
+        return h, None, amount, None
+    qty = pd.to_numeric(df['수량'], errors='coerce').fillna(0).to_numpy()
+    negative = (amount < 0) | (qty < 0)
+    positive = ~negative & ((amount > 0) | (qty > 0))
+    sign = np.where(negative, -1, np.where(positive, 1, 0)).astype(np.int8)
+    return h, reversal_keys(df, hashes), amount, sign
+
+
+def _occurrence(h):
+    # 0 for the first time a hash appears in `h`, 1 for the second, ...
+    # (equal hashes are identical rows, so which copy gets which number doesn't matter)
+    order = np.argsort(h)
+    ordered = h[order]
+    starts = np.r_[True, ordered[1:] != ordered[:-1]]
+    positions = np.arange(len(h))
+    occ = np.empty(len(h), dtype=np.int64)
+    occ[order] = positions - np.maximum.accumulate(np.where(starts, positions, 0))
+    return occ
+
+
+def _unique_counts(ordered, counts=None):
+    # Distinct values of a sorted array with their (summed) counts
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if len(ordered) else np.empty(0, dtype=np.int64)
+    if counts is None:
+        return ordered[starts], np.diff(np.r_[starts, len(ordered)])
+    return ordered[starts], np.add.reduceat(counts, starts) if len(starts) else counts
+
+
+def _positions(keys, h):
+    # Index of each hash in the sorted `keys` and whether it is there
+    if not len(keys):
+        return np.zeros(len(h), dtype=np.int64), np.zeros(len(h), dtype=bool)
+    # Sorted needles walk the keys in order, several times faster than random lookups
+    order = np.argsort(h)
+    idx = np.empty(len(h), dtype=np.int64)
+    idx[order] = np.searchsorted(keys, h[order])
+    idx = np.minimum(idx, len(keys) - 1)
+    return idx, keys[idx] == h
+
+
+class HashCounts:
+    # Multiset of uint64 hashes as sorted key/count arrays
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.counts.nbytes
+
+    def _positions(self, h):
+        return _positions(self.keys, h)
+
+    def lookup(self, h):
+        idx, found = self._positions(h)
+        return np.where(found, self.counts[idx], 0) if len(self.keys) else np.zeros(len(h), dtype=np.int64)
+
+    def add(self, h):
+        if not len(h):
+            return
+        keys, counts = _unique_counts(np.sort(h))
+        if len(self.keys):
+            keys = np.concatenate([self.keys, keys])
+            # Two sorted runs; the stable (radix/merge) sort is close to linear here
+            order = np.argsort(keys, kind='stable')
+            keys, counts = _unique_counts(keys[order], np.concatenate([self.counts, counts])[order])
+        self.keys, self.counts = keys, counts
+
+    def take(self, h):
+        # Match each hash against one stored copy; returns the mask of matched ones
+        matched = _occurrence(h) < self.lookup(h)
+        if matched.any():
+            np.subtract.at(self.counts, self._positions(h[matched])[0], 1)
+            keep = self.counts > 0
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+        return matched
+
+
+class Deduper:
+    def __init__(self, mode='overlap', columns=DEDUP_COLUMNS, keep_removed=False, examples=EXAMPLES):
+        if mode not in ('overlap', 'exact'):
+            raise ValueError(f"mode must be 'overlap' or 'exact', got {mode!r}")
+        self.mode = mode
+        self.columns = columns
+        self.keep_removed = keep_removed
+        self.examples = examples
+        self.seen = np.empty(0, dtype=np.uint64)
+        self.sources = {}
+        self.removed = []
+        self._source = None
+        # Occurrence counts per file, so rows appended to a file later continue its numbering
+        self._occurrences = {}
+        # Unpaired positive rows and unpaired reversals, by reversal key
+        self._originals = HashCounts()
+        self._reversals = HashCounts()
+        self.reversal_rows = 0
+        self.reversal_amount = 0
+        self.paired = 0
+        self.paired_amount = 0
+
+    def start_source(self, name):
+        # Call before the first chunk of each file; occurrence numbers are counted per file
+        self._source = name
+        self._occurrences.setdefault(name, HashCounts())
+        self.sources.setdefault(name, {'rows': 0, 'duplicates': 0, 'amount': 0})
+
+    def checkpoint(self):
+        # State to go back to if a file has to be re-read (see sales_stream)
+        return copy.deepcopy(self.__dict__)
+
+    def restore(self, state):
+        self.__dict__.update(state)
+
+    def save(self, path, meta=None):
+        # Hash state plus `meta` (JSON) in one .npz, so a later run can pass only the rows
+        # appended since through filter(); see resume_deduper
+        names = list(self._occurrences)
+        state = {
+            'meta': meta or {}, 'mode': self.mode, 'columns': self.columns, 'sources': self.sources,
+            'occurrences': names, 'reversal_rows': self.reversal_rows,
+            'reversal_amount': self.reversal_amount, 'paired': self.paired,
+            'paired_amount': self.paired_amount,
+        }
+        arrays = {'state': np.array(json.dumps(state, ensure_ascii=False)), 'seen': self.seen}
+        for name, counts in [('originals', self._originals), ('reversals', self._reversals)] + \
+                [(f'occ{i}', self._occurrences[n]) for i, n in enumerate(names)]:
+            arrays[f'{name}_keys'], arrays[f'{name}_counts'] = counts.keys, counts.counts
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        # (Deduper, meta) saved by save(); the removed-row examples are not kept
+        with np.load(path, allow_pickle=False) as data:
+            state = json.loads(str(data['state']))
+            deduper = cls(state['mode'], state['columns'])
+            deduper.seen = data['seen']
+            deduper.sources = state['sources']
+            for k in ('reversal_rows', 'reversal_amount', 'paired', 'paired_amount'):
+                setattr(deduper, k, state[k])
+
+            def counts(name):
+                c = HashCounts()
+                c.keys, c.counts = data[f'{name}_keys'], data[f'{name}_counts']
+                return c
+            deduper._originals, deduper._reversals = counts('originals'), counts('reversals')
+            deduper._occurrences = {n: counts(f'occ{i}') for i, n in enumerate(state['occurrences'])}
+        return deduper, state['meta']
+
+    def filter(self, chunk):
+        # `chunk` without rows already seen in an earlier file (or anywhere, mode='exact')
+        dup = self.check(*fingerprints(chunk, self.columns))
+        if dup.any():
+            removed = chunk[dup]
+            if self.keep_removed:
+                self.removed.append(removed.assign(source=self._source))
+            elif sum(len(r) for r in self.removed) < self.examples:
+                self.removed.append(removed.head(self.examples).assign(source=self._source))
+            chunk = chunk[~dup]
+        return chunk
+
+    def check(self, h, keys, amount, sign):
+        # Mask of the duplicate rows among the next rows of the current source, given
+        # only their fingerprints(); the process pool in sales_stream calls this directly
+        if self._source is None:
+            self.start_source('')
+        stats = self.sources[self._source]
+        if self.mode == 'overlap':
+            occurrences = self._occurrences[self._source]
+            occ = occurrences.lookup(h) + _occurrence(h)
+            occurrences.add(h)
+            fp = h + occ.astype(np.uint64) * OCCURRENCE_SALT
+        else:
+            fp = h
+        dup = _positions(self.seen, fp)[1]
+        if self.mode == 'exact':
+            dup |= _occurrence(fp) > 0
+        # Kept fingerprints are new and distinct, so this is a merge, not a unique()
+        self.seen = np.sort(np.concatenate([self.seen, fp[~dup]]), kind='stable')
+
+        stats['rows'] += len(h)
+        if dup.any():
+            stats['duplicates'] += int(dup.sum())
+            stats['amount'] += int(amount[dup].sum())
+        if sign is not None:
+            self._pair_reversals(keys[~dup], amount[~dup], sign[~dup])
+        return dup
+
+    def _pair_reversals(self, keys, amount, sign):
+        negative, positive = sign < 0, sign > 0
+        self.reversal_rows += int(negative.sum())
+        self.reversal_amount += int(amount[negative].sum())
+        # Reversals whose original came earlier, then originals of earlier reversals
+        late = self._originals.take(keys[negative])
+        self._reversals.add(keys[negative][~late])
+        early = self._reversals.take(keys[positive])
+        self._originals.add(keys[positive][~early])
+        self.paired += int(late.sum() + early.sum())
+        self.paired_amount += int(-amount[negative][late].sum() + amount[positive][early].sum())
+
+    def summary(self):
+        return {
+            'mode': self.mode,
+            'rows': sum(s['rows'] for s in self.sources.values()),
+            'duplicates': sum(s['duplicates'] for s in self.sources.values()),
+            'duplicate_amount': sum(s['amount'] for s in self.sources.values()),
+            'sources': self.sources,
+            'reversals': self.reversal_rows,
+            'reversal_amount': self.reversal_amount,
+            'paired': self.paired,
+            'paired_amount': self.paired_amount,
+            'unmatched_reversals': len(self._reversals),
+            'hash_bytes': self.seen.nbytes + self._originals.nbytes + self._reversals.nbytes,
+        }
+
+    def print_report(self, quiet=False):
+        # quiet: nothing at all when no duplicates were removed
+        s = self.summary()
+        if quiet and not s['duplicates']:
+            return
+        print(f"Duplicate check ({s['mode']}): removed {s['duplicates']:,} of {s['rows']:,} rows, "
+              f"금액 {s['duplicate_amount']:,}")
+        for name, st in s['sources'].items():
+            if st['duplicates']:
+                print(f"  {os.path.basename(name) or '-'}: {st['duplicates']:,} rows already in an earlier export "
+                      f"(금액 {st['amount']:,})")
+        if self.removed:
+            print(pd.concat(self.removed).head(self.examples).to_string(index=False))
+        print(f"Reversals: {s['reversals']:,} rows (금액 {s['reversal_amount']:,}), {s['paired']:,} paired "
+              f"with their original, {s['unmatched_reversals']:,} without one in these files")
+
+
+def resume_deduper(path, entries, rules=''):
+    # Deduper state saved at `path` by an incremental loader, for the files in `entries`
+    # ({path: cache manifest entry}, see sales_cache.sync_sales_csv).
+    # Returns (deduper, starts): `starts` maps each file to the rows already passed through
+    # the saved state, so only rows from there on are filtered next. When any file it saw
+    # was rewritten, shrank or left the list, or `rules` differ, the state is dropped and
+    # (Deduper(), None) returned: the caller must then filter every file from row 0.
+    if os.path.exists(path):
+        try:
+            deduper, meta = Deduper.load(path)
+        except (OSError, ValueError, KeyError):
+            deduper, meta = None, {}
+        seen = meta.get('sources', {})
+        if deduper and meta.get('rules') == rules and all(
+                k in entries and entries[k]['generation'] == s['generation'] and entries[k]['rows'] >= s['rows']
+                for k, s in seen.items()):
+            return deduper, {k: seen[k]['rows'] if k in seen else 0 for k in entries}
+    return Deduper(), None
+
+
+def save_deduper(deduper, path, entries, rules=''):
+    # Counterpart of resume_deduper once every file in `entries` went through `deduper`
+    sources = {k: {'generation': e['generation'], 'rows': e['rows']} for k, e in entries.items()}
+    deduper.save(path, {'rules': rules, 'sources': sources})
+
+
+def dedup_frame(df, mode='overlap', source=''):
+    # One-shot pass over a whole frame; returns (kept rows, Deduper with the report)
+    deduper = Deduper(mode)
+    deduper.start_source(source)
+    return deduper.filter(df), deduper
+
+
+def main():
+    from sales_cache import read_sales_csv
+    from sales_report import default_files
+
+    parser = argparse.ArgumentParser(description="Find duplicate lines and reversal pairs in ERP exports")
+    parser.add_argument('--files', nargs='+', help="ERP CSV exports in load order (default: FILES of generate_sales_report.py)")
+    parser.add_argument('--mode', default='overlap', choices=['overlap', 'exact'],
+                        help="overlap: only lines repeated from an earlier file; exact: every repeat")
+    parser.add_argument('--removed', help="write every removed row to this CSV")
+    args = parser.parse_args()
+
+    deduper = Deduper(args.mode, keep_removed=bool(args.removed))
+    for f in args.files or default_files():
+        if not os.path.exists(f):
+            print(f"Warning: File not found: {f}")
+            continue
+        deduper.start_source(f)
+        deduper.filter(read_sales_csv(f))
+    deduper.print_report()
+    print(f"Hash state: {deduper.summary()['hash_bytes'] / 1024:,.0f} KB")
+    if args.removed:
+        removed = pd.concat(deduper.removed) if deduper.removed else pd.DataFrame(columns=DEDUP_COLUMNS)
+        removed.to_csv(args.removed, index=False, encoding='utf-8-sig')
+        print(f"Removed rows saved to: {args.removed}")
+
+
+if __name__ == "__main__":
+    main()
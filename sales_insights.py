@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sales_periods import PeriodIndex, parse_period, period_label, prior_period
+from sales_tables import fmt_int, fmt_pct, growth, markdown_table
+
+# Insight and anomaly engine.
+# Growth, export share, revenue tier and a monthly z-score are computed for every
+# brand, customer and item at once, as arrays over the aggregate cube, and turned into
+# the deep report's insight tags and a ranked alert list. That way a declining
+# long-tail account shows up as an alert, not just the top 5 the report narrates.
+# Thresholds default to the values the deep report always used and can be overridden
+# from a JSON/YAML file ({"star_growth": 15, ...}) or with --set key=value.
+#
+#   python sales_insights.py                        # 2025 vs 2024, top 30 alerts
+#   python sales_insights.py 2025Q3 --set anomaly_z=2.5 --top 50
+INSIGHT_THRESHOLDS_FILE = os.environ.get(
+    'SALES_INSIGHT_THRESHOLDS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'insight_thresholds.json'),
+)
+DEFAULT_THRESHOLDS = {
+    'star_growth': 10.0,        # YoY % above which an entity is 🚀 고성장
+    'decline_growth': -10.0,    # YoY % below which it is 📉 쇠퇴주의 (below 0: ⚠️ 역성장)
+    'export_led': 60.0,         # export share % for 🌏 수출주도형
+    'domestic_led': 20.0,       # export share % below which it is 🏠 내수집중형
+    'export_heavy': 50.0,       # export share % the brand summary calls export-dependent
+    'cash_cow': 3_000_000_000,  # current revenue for 💰 캐시카우
+    'account_surge': 20.0,      # customer YoY % for the "급성장" account insight
+    'account_decline': -10.0,   # customer YoY % for the "축소" account insight
+    'item_hot': 50.0,           # item quantity YoY % marked 🔥
+    'item_cold': -20.0,         # item quantity YoY % marked 📉
+    'tier_a': 80.0,             # cumulative revenue share % covered by tier A
+    'tier_b': 95.0,             # ... by tiers A and B; the rest is C
+    'anomaly_z': 3.0,           # |z| of a month against the prior period's months
+    'min_prior': 1_000_000,     # prior revenue below which declines aren't alerted
+}
+ENTITIES = {'Brand': '브랜드', '거래처명': '거래처', '품목명': '품목'}
+ACCOUNT_INSIGHTS = [
+    "전략적 파트너로서 거래 규모가 급성장 중입니다.",
+    "거래 규모가 축소되고 있어 원인 파악 및 Relationship 관리가 시급합니다.",
+    "안정적인 거래 규모를 유지하고 있습니다.",
+]
+ALERT_COLUMNS = ['entity', 'key', 'alert', 'current', 'prior', 'growth', 'z', 'impact']
+OUTPUT_FILE = 'sales_alerts_report.md'
+
+
+def load_thresholds(path=INSIGHT_THRESHOLDS_FILE, overrides=None):
+    # Defaults, then the file (if any), then key=value overrides
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.lower().endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError(f"PyYAML is needed to read {path}; install it or use a JSON file")
+                data = yaml.safe_load(f) or {}
+            else:
+                data = json.load(f)
+        thresholds.update(data)
+    for pair in overrides or []:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f"Threshold override must be key=value, got {pair!r}")
+        thresholds[key] = float(value)
+    unknown = set(thresholds) - set(DEFAULT_THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Unknown insight threshold(s): {', '.join(sorted(unknown))}")
+    return thresholds
+
+
+def _join_tags(*columns):
+    # Space-joined non-empty tags per row, without a Python loop over the rows
+    joined = pd.Series(columns[0]).str.cat([pd.Series(c) for c in columns[1:]], sep=' ')
+    return joined.str.replace(r'\s+', ' ', regex=True).str.strip().to_numpy()
+
+
+def revenue_tiers(values, thresholds):
+    # ABC tiers: A until tier_a % of the total is covered, then B until tier_b %, then C
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-values, kind='stable')
+    total = values.clip(min=0).sum()
+    before = np.zeros(len(values))
+    if total > 0:
+        # Share covered by the entities ranked above each one
+        before[order] = (np.cumsum(values[order].clip(min=0)) - values[order].clip(min=0)) / total * 100
+    return np.select([before < thresholds['tier_a'], before < thresholds['tier_b']], ['A', 'B'], 'C')
+
+
+def monthly_zscores(cube, dim, current, prior, measure='금액'):
+    # For each key, the month of `current` furthest from the mean of the `prior` months,
+    # in standard deviations: (z, month ordinal, value, baseline mean)
+    dated = cube[cube['Year'].notna() & cube['Month'].notna()]
+    ordinal = (dated['Year'].astype('int64') * 12 + dated['Month'].astype('int64') - 1).rename('_month')
+    grid = dated.groupby([dated[dim], ordinal], observed=True)[measure].sum().unstack(fill_value=0)
+    cur_first, cur_last = parse_period(current)
+    prior_first, prior_last = parse_period(prior)
+    # Months after the last one with data are not zero sales, just not there yet
+    cur_last = min(cur_last, int(ordinal.max())) if len(ordinal) else cur_last
+    base = grid.reindex(columns=range(prior_first, prior_last + 1), fill_value=0)
+    test = grid.reindex(columns=range(cur_first, cur_last + 1), fill_value=0)
+    mean = base.to_numpy(np.float64).mean(axis=1) if base.shape[1] else np.zeros(len(grid))
+    std = base.to_numpy(np.float64).std(axis=1) if base.shape[1] else np.zeros(len(grid))
+    values = test.to_numpy(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(std[:, None] > 0, (values - mean[:, None]) / std[:, None], 0.0)
+    if not values.shape[1]:
+        empty = np.zeros(len(grid))
+        return pd.DataFrame({'z': empty, 'z_month': -1, 'z_value': empty, 'z_mean': mean}, index=grid.index)
+    pick = np.abs(z).argmax(axis=1)
+    rows = np.arange(len(grid))
+    return pd.DataFrame({
+        'z': z[rows, pick],
+        'z_month': cur_first + pick,
+        'z_value': values[rows, pick],
+        'z_mean': mean,
+    }, index=grid.index)
+
+
+def entity_insights(cube, dim, current=2025, prior=None, thresholds=None):
+    # One row per `dim` value: current/prior revenue, growth, export share, tier,
+    # monthly z-score and the insight tags
+    thresholds = thresholds or load_thresholds()
+    prior = prior if prior is not None else prior_period(current)
+    index = PeriodIndex(cube, [dim, 'Market'])
+    by_market = pd.DataFrame({
+        'current': index.total(current),
+        'prior': index.total(prior),
+    }).unstack('Market', fill_value=0)
+    cur = by_market['current'].sum(axis=1)
+    prev = by_market['prior'].sum(axis=1)
+    export = by_market['current'].get('Export', pd.Series(0, index=by_market.index))
+
+    c, p, e = cur.to_numpy(), prev.to_numpy(), export.to_numpy()
+    g = growth(c, p, valid=p != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ex_share = np.where(c != 0, e / c * 100, 0.0)
+    t = thresholds
+    growth_tag = np.select([g > t['star_growth'], g < t['decline_growth'], g < 0],
+                           ["🚀 고성장(Star)", "📉 쇠퇴주의(Decline)", "⚠️ 역성장"], "")
+    market_tag = np.select([ex_share > t['export_led'], ex_share < t['domestic_led']],
+                           ["🌏 수출주도형", "🏠 내수집중형"], "")
+    cash_tag = np.where(c > t['cash_cow'], "💰 캐시카우", "")
+
+    out = pd.DataFrame({
+        'current': c, 'prior': p, 'growth': g, 'export': e, 'export_share': ex_share,
+        'tier': revenue_tiers(c, t),
+        'tags': _join_tags(growth_tag, market_tag, cash_tag),
+        'account': np.select([g > t['account_surge'], g < t['account_decline']],
+                             ACCOUNT_INSIGHTS[:2], ACCOUNT_INSIGHTS[2]),
+    }, index=by_market.index)
+    return out.join(monthly_zscores(cube, dim, current, prior)).fillna({'z': 0.0, 'z_month': -1})
+
+
+def trend_marks(values, thresholds=None):
+    # 🔥 / 📉 for item quantity growth beyond the item_hot / item_cold thresholds
+    t = thresholds or load_thresholds()
+    return np.select([values > t['item_hot'], values < t['item_cold']], ["🔥", "📉"], "")
+
+
+def rank_alerts(cube, current=2025, prior=None, thresholds=None, entities=ENTITIES):
+    # Declines and monthly anomalies over every brand, customer and item, ranked by
+    # the revenue involved (lost revenue, or the distance from the usual month)
+    thresholds = thresholds or load_thresholds()
+    frames = []
+    for dim, label in entities.items():
+        ins = entity_insights(cube, dim, current, prior, thresholds)
+        keys = ins.index.astype(str).to_numpy()
+
+        declining = (ins['growth'] < thresholds['decline_growth']) & (ins['prior'] >= thresholds['min_prior'])
+        lost = declining & (ins['current'] <= 0)
+        frames.append(pd.DataFrame({
+            'entity': label, 'key': keys[declining.to_numpy()],
+            'alert': np.where(lost[declining], "⛔ 거래 중단", "📉 매출 감소"),
+            'current': ins['current'][declining], 'prior': ins['prior'][declining],
+            'growth': ins['growth'][declining], 'z': ins['z'][declining],
+            'impact': (ins['prior'] - ins['current'])[declining],
+        }))
+
+        z = ins['z'].to_numpy()
+        odd = np.abs(z) >= thresholds['anomaly_z']
+        months = ins['z_month'].to_numpy()[odd].astype(int)
+        frames.append(pd.DataFrame({
+            'entity': label, 'key': keys[odd],
+            'alert': [f"{'🔺 급증' if v > 0 else '🔻 급감'} {m // 12}-{m % 12 + 1:02d}"
+                      for v, m in zip(z[odd], months)],
+            'current': ins['current'].to_numpy()[odd], 'prior': ins['prior'].to_numpy()[odd],
+            'growth': ins['growth'].to_numpy()[odd], 'z': z[odd],
+            'impact': np.abs(ins['z_value'] - ins['z_mean']).to_numpy()[odd],
+        }))
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    alerts = pd.concat(frames, ignore_index=True)[ALERT_COLUMNS]
+    return alerts.sort_values('impact', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def generate_alerts(cube, current=2025, prior=None, top=50, thresholds=None):
+    # Yields the ranked alert list as Markdown (sales_report variant 'alerts')
+    prior = prior if prior is not None else prior_period(current)
+    alerts = rank_alerts(cube, current, prior, thresholds)
+    yield f"# 영업 알림 ({period_label(current)} vs {period_label(prior)})"
+    yield f"작성일: {datetime.now().strftime('%Y-%m-%d')}\n"
+    yield f"전체 {len(alerts):,}건 (브랜드/거래처/품목 전수 점검)\n"
+    if not len(alerts):
+        return
+    summary = alerts.groupby('entity', sort=False).size()
+    yield markdown_table(["구분", "알림 수"], [summary.index, fmt_int(summary)])
+    yield ""
+    shown = alerts.head(top) if top else alerts
+    yield markdown_table(["순위", "구분", "대상", "알림", "당기 매출", "전기 매출", "증감율", "z", "영향액"], [
+        range(1, len(shown) + 1), shown['entity'], shown['key'], shown['alert'],
+        fmt_int(shown['current']), fmt_int(shown['prior']), fmt_pct(shown['growth'], signed=True),
+        [f"{v:+.1f}" for v in shown['z'].tolist()], fmt_int(shown['impact']),
+    ])
+
+
+def main():
+    from sales_report import default_files, load_cube
+
+    parser = argparse.ArgumentParser(description="Ranked insight alerts over every brand, customer and item")
+    parser.add_argument('current', nargs='?', default='2025', help="2025, 2025Q3, 2025-03 or R12:2025-06")
+    parser.add_argument('--prior', help="period to compare against (default: a year earlier)")
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help="override a threshold")
+    parser.add_argument('--thresholds', default=INSIGHT_THRESHOLDS_FILE, help="JSON/YAML threshold file")
+    parser.add_argument('--top', type=int, default=30, help="alerts to list (0 for all)")
+    parser.add_argument('--csv', help="also write every alert to this CSV")
+    parser.add_argument('--files', nargs='+', help="ERP CSV exports (default: FILES of generate_sales_report.py)")
+    args = parser.parse_args()
+
+    thresholds = load_thresholds(args.thresholds, args.set)
+    cube = load_cube(args.files or default_files())
+    for line in generate_alerts(cube, args.current, args.prior, args.top, thresholds):
+        print(line)
+    if args.csv:
+        rank_alerts(cube, args.current, args.prior, thresholds).to_csv(args.csv, index=False, encoding='utf-8-sig')
+        print(f"\nAlerts saved to: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import difflib
+import hashlib
+import os
+import pickle
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import CACHE_DIR
+
+# Item master lookup.
+# processed_cms_product_master.csv maps site product names and 'BRAND | 품목군' item
+# names to brand and item_category. It is compiled once into a dict keyed by a
+# normalised name and pickled next to the Parquet cache. Ledger item names are
+# resolved once per unique name: exact key, then the name with trailing spec words
+# (e.g. '50ml') dropped, then a fuzzy match whose result is cached per name.
+# Anything still unmatched keeps the old rule: brand = first word of the name.
+ITEM_MASTER_FILE = os.environ.get(
+    'SALES_ITEM_MASTER',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'processed_cms_product_master.csv'),
+)
+MASTER_CACHE_NAME = 'item_master.pkl'
+FUZZY_CACHE_NAME = 'item_fuzzy.pkl'
+FUZZY_CUTOFF = 0.8
+UNKNOWN = 'Unknown'
+_SPACES = re.compile(r'\s+')
+
+
+def item_key(name):
+    return _SPACES.sub(' ', str(name).replace('|', ' ')).strip().lower()
+
+
+class ItemMaster:
+    def __init__(self, index, brands, digest):
+        self.index = index      # item key -> (brand, category)
+        self.brands = brands    # brand key -> (brand, {category key: category})
+        self.digest = digest
+
+    @classmethod
+    def from_csv(cls, path):
+        master = pd.read_csv(path, dtype=str, encoding='utf-8-sig')
+        master = master.dropna(subset=['brand'])
+        master['item_category'] = master['item_category'].fillna(UNKNOWN)
+        index, brands = {}, {}
+        for site_name, item_name, brand, category in zip(
+            master['site_product_name'], master['item_name'], master['brand'], master['item_category']
+        ):
+            value = (brand, category)
+            for name in (item_name, site_name, f"{brand} {category}"):
+                if isinstance(name, str) and item_key(name):
+                    index.setdefault(item_key(name), value)
+            brands.setdefault(item_key(brand), (brand, {}))[1].setdefault(item_key(category), category)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:8]
+        return cls(index, brands, digest)
+
+    def exact(self, name):
+        # The name itself, then with trailing words (sizes, specs) dropped one at a time;
+        # a shortened name only counts if it pins down a category
+        words = item_key(name).split(' ')
+        hit = self.index.get(' '.join(words))
+        while hit is None and len(words) > 1:
+            words.pop()
+            hit = self.index.get(' '.join(words))
+            if hit and hit[1] == UNKNOWN:
+                hit = None
+        return hit
+
+    def fuzzy(self, name):
+        key = item_key(name)
+        # A known brand at the start of the name fixes the brand; the rest picks the category
+        for brand_key in sorted(self.brands, key=len, reverse=True):
+            brand, categories = self.brands[brand_key]
+            if key == brand_key or key.startswith(brand_key + ' '):
+                return brand, self._category(key[len(brand_key):], categories)
+        match = difflib.get_close_matches(key, list(self.index), n=1, cutoff=FUZZY_CUTOFF)
+        if match:
+            return self.index[match[0]]
+        return str(name).split(' ')[0], UNKNOWN
+
+    @staticmethod
+    def _category(rest, categories):
+        # Compare without spaces ('수플레 바디' vs '수플레바디'), dropping trailing spec words
+        squeezed = {k.replace(' ', ''): v for k, v in categories.items() if v != UNKNOWN}
+        words = rest.split()
+        while words:
+            match = difflib.get_close_matches(''.join(words), list(squeezed), n=1, cutoff=FUZZY_CUTOFF)
+            if match:
+                return squeezed[match[0]]
+            words.pop()
+        return UNKNOWN
+
+
+def _read_pickle(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _write_pickle(obj, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+@lru_cache(maxsize=4)
+def _load_master(path, size, mtime_ns, cache_dir):
+    cache_path = os.path.join(cache_dir, MASTER_CACHE_NAME)
+    cached = _read_pickle(cache_path)
+    if cached and cached.get('source') == (os.path.abspath(path), size, mtime_ns):
+        return cached['master']
+    master = ItemMaster.from_csv(path)
+    _write_pickle({'source': (os.path.abspath(path), size, mtime_ns), 'master': master}, cache_path)
+    return master
+
+
+def load_item_master(path=ITEM_MASTER_FILE, cache_dir=CACHE_DIR):
+    # None if there is no master file
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return _load_master(path, st.st_size, st.st_mtime_ns, cache_dir)
+
+
+def resolve_items(items, master, cache_dir=CACHE_DIR):
+    # (Brand, Category) Series aligned with `items`, resolved once per unique name
+    codes, uniques = pd.factorize(items)
+    fuzzy_path = os.path.join(cache_dir, FUZZY_CACHE_NAME)
+    fuzzy = None
+    brands, categories = [], []
+    for name in uniques:
+        hit = master.exact(name)
+        if hit is None:
+            if fuzzy is None:
+                stored = _read_pickle(fuzzy_path) or {}
+                fuzzy = stored.get('names', {}) if stored.get('master') == master.digest else {}
+                known = len(fuzzy)
+            if name not in fuzzy:
+                fuzzy[name] = master.fuzzy(name)
+            hit = fuzzy[name]
+        brands.append(hit[0])
+        categories.append(hit[1])
+    if fuzzy is not None and len(fuzzy) > known:
+        _write_pickle({'master': master.digest, 'names': fuzzy}, fuzzy_path)
+
+    brands = np.array(brands + [UNKNOWN], dtype=object)
+    categories = np.array(categories + [UNKNOWN], dtype=object)
+    # Missing names (code -1) pick up the trailing UNKNOWN
+    return (pd.Series(brands[codes], index=items.index),
+            pd.Series(categories[codes], index=items.index))
@@ -0,0 +1,57 @@
+import os
+
+# Streaming Markdown sink.
+# Report renderers yield their lines one at a time instead of collecting the whole
+# document in a list; the writer joins them in small batches and hands them to a
+# buffered file, so memory stays flat however long the tables get. The file content
+# is the same as "\n".join(lines).
+BUFFER_LINES = 1024
+BUFFER_BYTES = 1 << 20
+
+
+class MarkdownWriter:
+    def __init__(self, path, buffer_lines=BUFFER_LINES):
+        self.path = path
+        self.buffer_lines = buffer_lines
+        self.lines = 0
+        self._batch = []
+        self._file = open(path, 'w', encoding='utf-8', buffering=BUFFER_BYTES)
+
+    def write(self, line):
+        self._batch.append(line)
+        if len(self._batch) >= self.buffer_lines:
+            self._flush_batch()
+
+    def write_all(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def _flush_batch(self):
+        if not self._batch:
+            return
+        # Lines are newline-separated, with no newline after the last one
+        if self.lines:
+            self._file.write("\n")
+        self._file.write("\n".join(self._batch))
+        self.lines += len(self._batch)
+        self._batch = []
+
+    def close(self):
+        self._flush_batch()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if exc_type is not None:
+            # Don't leave a half-written report behind
+            os.remove(self.path)
+
+
+def write_markdown(path, lines):
+    # Drain a renderer's line generator into `path`; returns the number of lines
+    with MarkdownWriter(path) as w:
+        w.write_all(lines)
+    return w.lines
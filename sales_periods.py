@@ -0,0 +1,157 @@
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from sales_tables import fmt_int, fmt_pct, growth, markdown_table
+
+# Period comparison index.
+# Cube rows are summed per (dimension key, month) once and kept as running totals
+# along the month axis, so the total of any run of months for every key is the
+# difference of two columns. Comparing two periods (year, quarter, month, rolling
+# N months) is then two such differences on the same aligned keys, whatever the
+# size of the ledger.
+#
+#   python sales_periods.py 2025 --by Brand                 # 2025 vs 2024
+#   python sales_periods.py 2025-03 --prior 2025-02         # month over month
+#   python sales_periods.py R12:2025-06 --by Market         # trailing 12 months YoY
+
+PERIOD_PATTERNS = [
+    (re.compile(r'^(\d{4})$'), 'year'),
+    (re.compile(r'^(\d{4})Q([1-4])$'), 'quarter'),
+    (re.compile(r'^(\d{4})-(\d{1,2})$'), 'month'),
+    (re.compile(r'^R(\d+):(\d{4})-(\d{1,2})$'), 'rolling'),
+]
+
+
+def month_ordinal(year, month):
+    return int(year) * 12 + int(month) - 1
+
+
+def parse_period(period):
+    # Inclusive (first, last) month ordinals of a period:
+    # 2025, '2025Q2', '2025-03', 'R12:2025-06' (12 months ending June 2025) or a tuple
+    if isinstance(period, tuple):
+        return period
+    text = str(period).strip().upper()
+    for pattern, kind in PERIOD_PATTERNS:
+        m = pattern.match(text)
+        if not m:
+            continue
+        if kind == 'year':
+            first = month_ordinal(m.group(1), 1)
+            return first, first + 11
+        if kind == 'quarter':
+            first = month_ordinal(m.group(1), (int(m.group(2)) - 1) * 3 + 1)
+            return first, first + 2
+        if kind == 'month':
+            first = month_ordinal(m.group(1), m.group(2))
+            return first, first
+        last = month_ordinal(m.group(2), m.group(3))
+        return last - int(m.group(1)) + 1, last
+    raise ValueError(f"Unrecognised period: {period!r}")
+
+
+def shift_period(period, months):
+    first, last = parse_period(period)
+    return first + months, last + months
+
+
+def prior_period(period, lag='year'):
+    # Same-length period a year earlier ('year') or directly before it ('period')
+    first, last = parse_period(period)
+    return shift_period((first, last), -12 if lag == 'year' else -(last - first + 1))
+
+
+def _month_label(ordinal):
+    return f"{ordinal // 12}-{ordinal % 12 + 1:02d}"
+
+
+def period_label(period):
+    first, last = parse_period(period)
+    if first == last:
+        return _month_label(first)
+    return f"{_month_label(first)}..{_month_label(last)}"
+
+
+class PeriodIndex:
+    def __init__(self, cube, dims, measures=('금액',)):
+        self.dims = list(dims)
+        self.measures = [m for m in measures if m in cube.columns]
+        # Rows without a date can't be placed in a period
+        dated = cube[cube['Year'].notna() & cube['Month'].notna()]
+        ordinal = dated['Year'].astype('int64') * 12 + dated['Month'].astype('int64') - 1
+        self.first = int(ordinal.min()) if len(dated) else 0
+        months = int(ordinal.max()) - self.first + 1 if len(dated) else 0
+
+        keys = dated[self.dims].copy() if self.dims else pd.DataFrame(index=dated.index)
+        keys['_month'] = (ordinal - self.first).to_numpy()
+        monthly = pd.concat([keys, dated[self.measures]], axis=1)
+        monthly = monthly.groupby(self.dims + ['_month'], observed=True, dropna=False)[self.measures].sum()
+
+        if self.dims:
+            groups = monthly.index.droplevel('_month')
+            self.keys = groups.unique()
+            rows = self.keys.get_indexer(groups)
+        else:
+            self.keys = pd.Index(['Total'])
+            rows = np.zeros(len(monthly), dtype=np.int64)
+        cols = monthly.index.get_level_values('_month').to_numpy() + 1
+
+        # Column 0 stays zero so a range sum is running[:, last + 1] - running[:, first]
+        self.running = {}
+        for m in self.measures:
+            values = monthly[m].to_numpy()
+            grid = np.zeros((len(self.keys), months + 1), dtype=values.dtype)
+            grid[rows, cols] = values
+            self.running[m] = np.cumsum(grid, axis=1)
+
+    def total(self, period, measure='금액'):
+        first, last = parse_period(period)
+        running = self.running[measure]
+        lo = min(max(first - self.first, 0), running.shape[1] - 1)
+        hi = min(max(last - self.first + 1, 0), running.shape[1] - 1)
+        return pd.Series(running[:, hi] - running[:, lo], index=self.keys, name=measure)
+
+    def compare(self, current, prior=None, measure='금액'):
+        # Current vs prior totals on the same keys, with % growth; prior defaults to a year earlier
+        if prior is None:
+            prior = prior_period(current)
+        cur = self.total(current, measure)
+        prev = self.total(prior, measure)
+        return pd.DataFrame({
+            'current': cur,
+            'prior': prev,
+            'growth': growth(cur.to_numpy(), prev.to_numpy()),
+        }, index=self.keys)
+
+
+def main():
+    from sales_report import default_files, load_cube
+
+    parser = argparse.ArgumentParser(description="Compare sales between two periods")
+    parser.add_argument('current', help="2025, 2025Q2, 2025-03 or R12:2025-06 (trailing 12 months)")
+    parser.add_argument('--prior', help="period to compare against (default: a year earlier)")
+    parser.add_argument('--by', nargs='*', default=[], help="dimensions to break the comparison down by")
+    parser.add_argument('--measure', default='금액', choices=['금액', '수량'])
+    parser.add_argument('--top', type=int, default=20, help="rows to show, by current value (0 for all)")
+    parser.add_argument('--files', nargs='+', help="ERP CSV exports (default: FILES of generate_sales_report.py)")
+    args = parser.parse_args()
+
+    cube = load_cube(args.files or default_files())
+    index = PeriodIndex(cube, args.by, [args.measure])
+    prior = args.prior or prior_period(args.current)
+    result = index.compare(args.current, prior, args.measure).sort_values('current', ascending=False)
+    if args.top:
+        result = result.head(args.top)
+
+    print(f"{period_label(args.current)} vs {period_label(prior)} ({args.measure})")
+    labels = [' / '.join(map(str, k)) if isinstance(k, tuple) else k for k in result.index]
+    print(markdown_table([' / '.join(args.by) or 'Total', 'Current', 'Prior', 'Growth'], [
+        labels, fmt_int(result['current']), fmt_int(result['prior']), fmt_pct(result['growth'], signed=True),
+    ]))
+
+
+if __name__ == "__main__":
+    main()
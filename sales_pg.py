@@ -0,0 +1,281 @@
+import argparse
+import importlib.util
+import io
+import os
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pandas as pd
+
+from sales_clean import LEDGER_COLUMNS, clean_ledger
+from sales_cube import ROW_COUNT, build_cube, merge_cubes
+from sales_periods import parse_period
+from sales_stream import CHUNK_ROWS, FOLD_EVERY, TEXT_COLUMNS
+
+# The driver itself is only imported when a connection is opened
+if importlib.util.find_spec('psycopg'):
+    PG_DRIVER = 'psycopg'
+elif importlib.util.find_spec('psycopg2'):
+    PG_DRIVER = 'psycopg2'
+else:
+    PG_DRIVER = None
+HAS_POSTGRES = PG_DRIVER is not None
+
+# Postgres data source for the report engine.
+# Reads the order lines the web app stores in cm_raw_order_lines instead of the ERP
+# CSV exports. Every column is selected under its ERP export name, so the rows go
+# through the same clean_ledger rules and come out in the same cleaned schema.
+# By default the period/platform filters and a GROUP BY month, customer, item and
+# group run in Postgres and only those aggregate rows cross the wire (the engine
+# only needs Year/Month, so nothing is lost). --raw-rows streams every line instead,
+# via COPY TO STDOUT (psycopg 3) or a server-side cursor (psycopg2), in chunks.
+#
+#   SALES_PG_DSN=postgresql://postgres@localhost/oms python sales_pg.py --period 2025 --pg-column 금액=price*qty
+#   python sales_report.py --source postgres --period 2025 --platforms 쿠팡 스마트스토어 --pg-column 금액=price*qty
+#   python sales_pg.py --period 2025Q3 --pg-column 금액=0 --show-sql   # print the query, no server needed
+PG_DSN = os.environ.get('SALES_PG_DSN', 'postgresql://postgres@localhost:5432/postgres')
+PG_TABLE = os.environ.get('SALES_PG_TABLE', 'cm_raw_order_lines')
+# Indexed text timestamp ('YYYY-MM-DD HH:MM:SS') the period filter is applied to
+PG_DATE_COLUMN = 'collected_at'
+# ERP ledger column -> SQL expression over PG_TABLE. The table has no amount column, so
+# 금액 has no default: --pg-column 금액=<expression> is required (금액=0 for quantities only).
+PG_COLUMNS = {
+    '일자': f"left({PG_DATE_COLUMN}, 10)",
+    '거래처명': 'platform_name',
+    '품목명[규격]': 'product_name',
+    '금액': None,
+    '수량': 'qty',
+    '거래처그룹1명': 'NULL::text',
+}
+PG_DATE_FORMAT = '%Y-%m-%d'
+# Gift lines are generated by promotions, not sold (same rule as the dashboard RPCs)
+PG_WHERE = "site_order_no NOT ILIKE 'GIFT-%%'"
+POOL_MIN = 1
+POOL_MAX = 4
+COPY_BUFFER = 1 << 20
+MEASURE_COLUMNS = ['금액', '수량']
+
+
+@lru_cache(maxsize=4)
+def _pool(dsn):
+    # One pool per DSN for the life of the process (the report server keeps it warm)
+    if PG_DRIVER == 'psycopg2':
+        import psycopg2.pool
+        return psycopg2.pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, dsn)
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        return None
+    return ConnectionPool(dsn, min_size=POOL_MIN, max_size=POOL_MAX, open=True)
+
+
+@contextmanager
+def connection(dsn=PG_DSN):
+    if not HAS_POSTGRES:
+        raise ImportError("The postgres source needs psycopg (pip install 'psycopg[binary,pool]') or psycopg2")
+    pool = _pool(dsn)
+    if PG_DRIVER == 'psycopg2':
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+    elif pool is not None:
+        with pool.connection() as conn:
+            yield conn
+    else:
+        # psycopg without psycopg_pool: a plain connection per call
+        import psycopg
+        with psycopg.connect(dsn) as conn:
+            yield conn
+
+
+def period_bounds(period):
+    # [start, end) date strings of a period, comparable with the text timestamps
+    first, last = parse_period(period)
+    return (f"{first // 12}-{first % 12 + 1:02d}-01",
+            f"{(last + 1) // 12}-{(last + 1) % 12 + 1:02d}-01")
+
+
+def build_where(columns, period=None, platforms=None, where=PG_WHERE):
+    # WHERE clause and its parameters; the filters run in Postgres, on the index
+    clauses, params = [where] if where else [], []
+    if period is not None:
+        start, end = period_bounds(period)
+        clauses.append(f"{PG_DATE_COLUMN} >= %s AND {PG_DATE_COLUMN} < %s")
+        params += [start, end]
+    if platforms:
+        clauses.append(f"{columns['거래처명']} = ANY(%s)")
+        params.append(list(platforms))
+    return (' WHERE ' + ' AND '.join(f"({c})" for c in clauses)) if clauses else '', params
+
+
+def _select_list(columns, monthly):
+    missing = [name for name, expr in columns.items() if expr is None]
+    if missing:
+        # Rather than a report with every revenue figure silently zero
+        raise ValueError(f"{PG_TABLE} has no column for {', '.join(missing)}; pass --pg-column "
+                         f"{missing[0]}=<SQL expression>, e.g. 금액=price*qty (or 금액=0 for quantities only)")
+    out = []
+    for name, expr in columns.items():
+        if name == '일자' and monthly:
+            expr = f"left({expr}, 7) || '-01'"
+        elif name in MEASURE_COLUMNS and monthly:
+            expr = f"SUM({expr})::bigint"
+        out.append(f'{expr} AS "{name}"')
+    return out
+
+
+def aggregate_query(columns=None, table=PG_TABLE, **filters):
+    # One row per month, customer, item and group with the summed measures and line count
+    columns = columns or PG_COLUMNS
+    where, params = build_where(columns, **filters)
+    keys = [str(i + 1) for i, c in enumerate(columns) if c not in MEASURE_COLUMNS]
+    select = _select_list(columns, monthly=True) + [f'COUNT(*) AS "{ROW_COUNT}"']
+    sql = f"SELECT {', '.join(select)} FROM {table}{where} GROUP BY {', '.join(keys)}"
+    return sql, params
+
+
+def rows_query(columns=None, table=PG_TABLE, **filters):
+    columns = columns or PG_COLUMNS
+    where, params = build_where(columns, **filters)
+    return f"SELECT {', '.join(_select_list(columns, monthly=False))} FROM {table}{where}", params
+
+
+class _CopyReader(io.RawIOBase):
+    # File-like view of the COPY blocks so read_csv can pull chunks as they arrive
+    def __init__(self, blocks):
+        self._blocks = iter(blocks)
+        self._buf = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            try:
+                self._buf = bytes(next(self._blocks))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def _copy_chunks(conn, sql, params, chunksize):
+    cur = conn.cursor()
+    # psycopg binds the parameters into the COPY statement client-side
+    with cur.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", params) as copy:
+        stream = io.BufferedReader(_CopyReader(copy), buffer_size=COPY_BUFFER)
+        yield from pd.read_csv(stream, encoding='utf-8', chunksize=chunksize, dtype=TEXT_COLUMNS)
+
+
+def _cursor_chunks(conn, sql, params, chunksize):
+    # Named cursor = server-side; rows are fetched chunksize at a time
+    with conn.cursor(name='sales_pg_rows') as cur:
+        cur.itersize = chunksize
+        cur.execute(sql, params)
+        columns = None
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if not rows:
+                break
+            columns = columns or [d[0] for d in cur.description]
+            yield pd.DataFrame(rows, columns=columns)
+
+
+def read_row_chunks(conn, sql, params, chunksize=CHUNK_ROWS):
+    if PG_DRIVER == 'psycopg':
+        return _copy_chunks(conn, sql, params, chunksize)
+    return _cursor_chunks(conn, sql, params, chunksize)
+
+
+def _clean(df, date_format=PG_DATE_FORMAT):
+    return clean_ledger(df, date_format, LEDGER_COLUMNS + [ROW_COUNT])
+
+
+def load_pg_cube(dimensions, measures, dsn=PG_DSN, columns=None, pushdown=True,
+                 chunksize=CHUNK_ROWS, **filters):
+    # Same cube as sales_report.load_cube, with a Rows column counting order lines
+    with connection(dsn) as conn:
+        if pushdown:
+            sql, params = aggregate_query(columns, **filters)
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                names = [d[0] for d in cur.description]
+                df = pd.DataFrame(cur.fetchall(), columns=names)
+            if df.empty:
+                raise ValueError("No data loaded")
+            return build_cube(_clean(df), dimensions, list(measures) + [ROW_COUNT])
+
+        sql, params = rows_query(columns, **filters)
+        partials = []
+        for chunk in read_row_chunks(conn, sql, params, chunksize):
+            partials.append(build_cube(clean_ledger(chunk, PG_DATE_FORMAT, LEDGER_COLUMNS),
+                                       dimensions, measures, count=True))
+            if len(partials) >= FOLD_EVERY:
+                partials = [merge_cubes(partials, dimensions)]
+    if not partials:
+        raise ValueError("No data loaded")
+    return merge_cubes(partials, dimensions)
+
+
+def column_overrides(pairs):
+    # ['금액=price * qty', ...] -> PG_COLUMNS with those expressions replaced
+    columns = dict(PG_COLUMNS)
+    for pair in pairs or []:
+        name, sep, expr = pair.partition('=')
+        if not sep or name not in columns:
+            raise ValueError(f"--pg-column expects <ERP column>=<SQL expression> with one of "
+                             f"{', '.join(columns)}, got {pair!r}")
+        columns[name] = expr
+    return columns
+
+
+def add_pg_arguments(parser):
+    parser.add_argument('--dsn', default=PG_DSN, help="Postgres connection string (default: $SALES_PG_DSN)")
+    parser.add_argument('--period', help="postgres/--dataset: only this period: 2025, 2025Q2, 2025-03 or R12:2025-06")
+    parser.add_argument('--platforms', nargs='+', help="postgres: only these platform_name values")
+    parser.add_argument('--raw-rows', action='store_true',
+                        help="stream every order line instead of grouping in Postgres")
+    parser.add_argument('--pg-column', action='append', metavar='COLUMN=SQL',
+                        help="override the SQL expression for an ERP column, e.g. 금액=price*qty")
+
+
+def load_pg_source(args, dimensions, measures):
+    # sales_report source entry point. There is no duplicate pass (--keep-duplicates is moot):
+    # every order line is one table row, read once, so no line repeats an earlier export
+    return load_pg_cube(dimensions, measures, dsn=args.dsn, columns=column_overrides(args.pg_column),
+                        pushdown=not args.raw_rows, chunksize=args.chunksize,
+                        period=args.period, platforms=args.platforms)
+
+
+def main():
+    from sales_report import ENGINE_DIMENSIONS, ENGINE_MEASURES
+
+    parser = argparse.ArgumentParser(description="Aggregate order lines straight from Postgres")
+    add_pg_arguments(parser)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="rows per chunk with --raw-rows")
+    parser.add_argument('--show-sql', action='store_true', help="print the query and exit")
+    args = parser.parse_args()
+
+    if args.show_sql:
+        build = rows_query if args.raw_rows else aggregate_query
+        sql, params = build(column_overrides(args.pg_column), period=args.period, platforms=args.platforms)
+        print(sql)
+        print(f"-- params: {params}")
+        return
+
+    cube = load_pg_source(args, ENGINE_DIMENSIONS, ENGINE_MEASURES)
+    print(f"{int(cube[ROW_COUNT].sum()):,} order lines in {len(cube):,} groups")
+    monthly = cube.groupby(['Year', 'Month'], observed=True)[ENGINE_MEASURES + [ROW_COUNT]].sum()
+    print(monthly.to_string())
+
+
+if __name__ == "__main__":
+    main()
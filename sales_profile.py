@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Stage instrumentation for the report scripts.
+# Each pipeline stage (load, clean, aggregate, every report section and chart) is
+# recorded with wall time, CPU time (including finished worker processes), peak RSS
+# so far and the row counts going in and out. The scripts print the table with
+# --timings, write it as JSON with --profile-out, and can run the whole job under
+# cProfile or pyinstrument with --profiler.
+
+
+def peak_rss_mb():
+    # Peak resident memory of this process so far, or None if it can't be read
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KB on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def _cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+class Profiler:
+    def __init__(self):
+        # Off in long-running processes that never print the table (sales_server)
+        self.enabled = True
+        self.reset()
+
+    def reset(self, run=None):
+        self.run = run
+        self.stages = []
+        self._section = None
+        self._started = time.perf_counter()
+
+    def record(self, name, wall, cpu=None, rows_in=None, rows_out=None):
+        if not self.enabled:
+            return
+        rss = peak_rss_mb()
+        self.stages.append({
+            'stage': name,
+            'wall_s': round(wall, 4),
+            'cpu_s': None if cpu is None else round(cpu, 4),
+            'peak_rss_mb': None if rss is None else round(rss, 1),
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+        })
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        # with PROFILER.stage('clean_data', rows_in=len(raw)) as st: ...; st.rows_out = len(df)
+        st = Stage(name, rows_in)
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield st
+        finally:
+            self.record(name, time.perf_counter() - wall, _cpu_seconds() - cpu, st.rows_in, st.rows_out)
+
+    def section(self, name):
+        # Report sections are consecutive, so starting one ends the previous one
+        self.end_section()
+        self._section = (name, time.perf_counter(), _cpu_seconds())
+
+    def end_section(self):
+        if self._section:
+            name, wall, cpu = self._section
+            self.record(name, time.perf_counter() - wall, _cpu_seconds() - cpu)
+            self._section = None
+
+    def summary(self):
+        rss = peak_rss_mb()
+        return {
+            'run': self.run,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'argv': sys.argv,
+            'wall_s': round(time.perf_counter() - self._started, 4),
+            'peak_rss_mb': None if rss is None else round(rss, 1),
+            'stages': self.stages,
+        }
+
+    def print_summary(self):
+        print(f"{'stage':<40} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'rows in':>12} {'rows out':>12}")
+        for s in self.stages:
+            cells = [s['wall_s'], s['cpu_s'], s['peak_rss_mb']]
+            nums = ' '.join(f"{v:>8.3f}" if isinstance(v, float) else f"{'-':>8}" for v in cells)
+            rows = ' '.join(f"{v:>12,}" if v is not None else f"{'-':>12}" for v in (s['rows_in'], s['rows_out']))
+            print(f"{s['stage'][:40]:<40} {nums} {rows}")
+
+    def write_summary(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    @contextmanager
+    def profile(self, kind=None, path=None):
+        # Run the block under cProfile or pyinstrument and save the result to `path`
+        if kind == 'cprofile':
+            import cProfile
+            prof = cProfile.Profile()
+            prof.enable()
+            try:
+                yield
+            finally:
+                prof.disable()
+                prof.dump_stats(path)
+                print(f"cProfile stats saved to: {path} (view with python -m pstats {path})")
+        elif kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as Sampler
+            except ImportError:
+                print("Warning: pyinstrument not installed, running without it")
+                yield
+                return
+            sampler = Sampler()
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(sampler.output_html())
+                print(f"pyinstrument report saved to: {path}")
+        else:
+            yield
+
+
+# Shared by the scripts and the helper modules they call
+PROFILER = Profiler()
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--timings', action='store_true',
+                        help="print wall/CPU time, peak RSS and row counts per stage")
+    parser.add_argument('--profile-out', help="write the per-stage summary as JSON here")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], help="also run under a profiler")
+    parser.add_argument('--profile-dump', help="profiler output file (default: <script>.prof or .html)")
+
+
+@contextmanager
+def profiled_run(run, args):
+    # Wraps a script's main(); reports according to the add_profile_arguments flags
+    PROFILER.reset(run)
+    dump = args.profile_dump or f"{run}.{'html' if args.profiler == 'pyinstrument' else 'prof'}"
+    with PROFILER.profile(args.profiler, dump):
+        yield PROFILER
+    PROFILER.end_section()
+    if args.timings:
+        PROFILER.print_summary()
+    if args.profile_out:
+        PROFILER.write_summary(args.profile_out)
+        print(f"Stage summary saved to: {args.profile_out}")
@@ -0,0 +1,168 @@
+import argparse
+import importlib
+import os
+import time
+
+from sales_cache import HAS_PARQUET, load_sales_files
+from sales_clean import LEDGER_COLUMNS, clean_ledger, report_unparsed_dates, rules_version
+from sales_cube import ROW_COUNT, build_cube, load_incremental_cube
+from sales_markdown import write_markdown
+from sales_pg import add_pg_arguments
+from sales_profile import add_profile_arguments, profiled_run
+from sales_stream import CHUNK_ROWS, stream_aggregate
+
+# Unified report engine.
+# The ledger is loaded and cleaned once (sales_clean.clean_ledger) and aggregated into
+# one cube over every dimension any report slices by. Each report variant is a
+# renderer taking that cube and yielding Markdown lines, so all variants share one load
+# and one set of cleaning rules.
+#
+#   python sales_report.py                      # all variants
+#   python sales_report.py -v en deep --stream  # a subset, chunked reading
+#   python sales_report.py --store              # cube from the persistent rollup store
+#   python sales_report.py --dataset --period 2025-03 --market Export   # one partition slice
+#   python sales_report.py --source postgres --period 2025   # from the app database
+
+ENGINE_DIMENSIONS = [c for c in LEDGER_COLUMNS if c not in ('금액', '수량')]
+ENGINE_MEASURES = ['금액', '수량']
+
+# name -> (module, render function, default output file name)
+REPORTS = {
+    'en': ('generate_sales_report', 'generate_markdown', 'sales_analysis_report.md'),
+    'ko': ('generate_sales_report_ko', 'generate_markdown', 'sales_analysis_report_ko.md'),
+    'deep': ('generate_deep_analysis', 'generate_report', 'sales_deep_analysis_report.md'),
+    'alerts': ('sales_insights', 'generate_alerts', 'sales_alerts_report.md'),
+}
+
+
+# name -> (module, load function); func(args, dimensions, measures) returns the cube
+SOURCES = {
+    'csv': ('sales_report', 'load_csv_source'),
+    'postgres': ('sales_pg', 'load_pg_source'),
+}
+
+
+def register_report(name, module, func, filename):
+    # Plug in another variant; func(cube) must yield the Markdown lines
+    REPORTS[name] = (module, func, filename)
+
+
+def register_source(name, module, func):
+    # Plug in another data source; see SOURCES for the contract
+    SOURCES[name] = (module, func)
+
+
+def default_files():
+    return importlib.import_module('generate_sales_report').FILES
+
+
+def _clean(df, date_format=None):
+    return clean_ledger(df, date_format, LEDGER_COLUMNS)
+
+
+def load_cube(files, stream=False, chunksize=CHUNK_ROWS, workers=1, incremental=False, store=False, dedup=True):
+    if store and HAS_PARQUET:
+        from sales_store import load_store_cube
+        return load_store_cube(files, dedup=dedup)
+    if stream or workers > 1:
+        return stream_aggregate(files, _clean, ENGINE_DIMENSIONS, ENGINE_MEASURES, chunksize, workers, dedup=dedup)
+    if incremental and HAS_PARQUET:
+        return load_incremental_cube(files, _clean, rules=rules_version(), dimensions=ENGINE_DIMENSIONS,
+                                     measures=ENGINE_MEASURES, count=True, dedup=dedup)
+    df = _clean(load_sales_files(files, dedup=dedup))
+    return build_cube(df, ENGINE_DIMENSIONS, ENGINE_MEASURES, count=True)
+
+
+def load_csv_source(args, dimensions, measures):
+    if args.dataset and HAS_PARQUET:
+        # Only the partitions of the requested period/market are read
+        from sales_dataset import load_dataset_cube
+        return load_dataset_cube(args.files or default_files(), dimensions, measures, args.period, args.market,
+                                 dedup=not args.keep_duplicates)
+    return load_cube(args.files or default_files(), args.stream, args.chunksize, args.workers, args.incremental,
+                     args.store, dedup=not args.keep_duplicates)
+
+
+def load_source(name, args):
+    module_name, func_name = SOURCES[name]
+    func = getattr(importlib.import_module(module_name), func_name)
+    return func(args, ENGINE_DIMENSIONS, ENGINE_MEASURES)
+
+
+def render(name, cube, out_dir=None, charts=True):
+    module_name, func_name, filename = REPORTS[name]
+    module = importlib.import_module(module_name)
+    if out_dir:
+        output = os.path.join(out_dir, filename)
+        # Charts are written next to the Markdown that links them
+        if hasattr(module, 'IMAGE_DIR'):
+            module.IMAGE_DIR = os.path.join(out_dir, 'report_images')
+    else:
+        output = module.OUTPUT_FILE
+    write_markdown(output, report_lines(name, cube, charts))
+    return output
+
+
+def report_lines(name, cube, charts=True):
+    # A variant's Markdown line generator, without writing it anywhere
+    module_name, func_name, _ = REPORTS[name]
+    module = importlib.import_module(module_name)
+    # Chart-producing variants have an IMAGE_DIR and take text_only
+    kwargs = {'text_only': True} if hasattr(module, 'IMAGE_DIR') and not charts else {}
+    return getattr(module, func_name)(cube, **kwargs)
+
+
+def add_source_arguments(parser):
+    # Where the cube comes from; shared by the report engine and the report server
+    parser.add_argument('--files', nargs='+', help="ERP CSV exports (default: FILES of generate_sales_report.py)")
+    parser.add_argument('--stream', action='store_true', help="aggregate the CSVs chunk by chunk instead of loading them whole")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="rows per chunk in --stream mode")
+    parser.add_argument('--workers', type=int, default=1, help="aggregate files/shards in N processes (implies --stream)")
+    parser.add_argument('--incremental', action='store_true', help="merge appended rows into the persisted cube")
+    parser.add_argument('--store', action='store_true',
+                        help="keep cleaned rows and rollups in the SQLite store (sales_store.py) and read the cube from it")
+    parser.add_argument('--dataset', action='store_true',
+                        help="read cleaned rows from the year/month/market partitioned dataset (sales_dataset.py)")
+    parser.add_argument('--market', nargs='+', choices=['Export', 'Domestic'], help="with --dataset: only these markets")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="don't drop lines an earlier file already had (see sales_dedup.py)")
+    parser.add_argument('--source', default='csv', choices=list(SOURCES), help="where the ledger comes from")
+    add_pg_arguments(parser)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render sales report variants from one load")
+    parser.add_argument('-v', '--variants', nargs='+', default=['all'],
+                        help=f"report variants to render: {', '.join(REPORTS)} or all")
+    parser.add_argument('--out-dir', help="write reports here instead of each variant's OUTPUT_FILE")
+    add_source_arguments(parser)
+    parser.add_argument('--no-charts', action='store_true', help="text-only reports; matplotlib is never imported")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    variants = list(REPORTS) if 'all' in args.variants else args.variants
+    unknown = [v for v in variants if v not in REPORTS]
+    if unknown:
+        parser.error(f"unknown variant(s): {', '.join(unknown)}")
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    with profiled_run('sales_report', args) as prof:
+        t0 = time.perf_counter()
+        print("Loading and cleaning data...")
+        with prof.stage('load_cube') as st:
+            cube = load_source(args.source, args)
+            st.rows_in, st.rows_out = int(cube[ROW_COUNT].sum()), len(cube)
+        print(f"Aggregated {int(cube[ROW_COUNT].sum()):,} rows into {len(cube):,} groups "
+              f"in {time.perf_counter() - t0:.2f}s")
+        report_unparsed_dates(cube)
+
+        for name in variants:
+            t1 = time.perf_counter()
+            with prof.stage(f"render {name}", rows_in=len(cube)):
+                output = render(name, cube, args.out_dir, charts=not args.no_charts)
+            print(f"[{name}] {output} ({time.perf_counter() - t1:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from sales_cube import ROW_COUNT
+from sales_profile import PROFILER
+from sales_report import REPORTS, add_source_arguments, default_files, load_source, report_lines
+
+# Long-running report server.
+# Loads the cube once and keeps it, and every rendered report, warm in memory; a
+# request for a cached report or section is a dict lookup instead of a cold Python
+# process reloading pandas and the CSVs. The source files are polled for changes:
+# a changed file reloads the cube in the background (use --incremental so appended
+# rows are merged instead of re-cleaned), the old cube is served until the new one is
+# ready, then every cached render is dropped. Rendering runs on one worker thread so
+# the event loop keeps answering cached requests meanwhile, and concurrent requests
+# for the same uncached page share one render.
+#
+#   python sales_server.py --incremental                  # http://127.0.0.1:8765
+#   python sales_server.py --unix /tmp/sales.sock
+#   curl localhost:8765/reports/deep/sections            # section titles (JSON)
+#   curl localhost:8765/reports/deep/sections/2          # one section as Markdown
+#   curl 'localhost:8765/reports/ko/sections/1?format=json'
+#   curl 'localhost:8765/insights/Brand?period=2025Q3&top=20'
+#   curl 'localhost:8765/alerts?period=2025&top=50'
+HOST = '127.0.0.1'
+PORT = int(os.environ.get('SALES_SERVER_PORT', 8765))
+WATCH_INTERVAL = 2.0
+MAX_HEADER_BYTES = 16 * 1024
+INSIGHT_DIMENSIONS = ['Brand', '거래처명', '품목명']
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def split_sections(text):
+    # [(title, markdown)] at each '## ' heading; the part before the first one is section 0
+    sections, title, lines = [], None, []
+    for line in text.split("\n"):
+        if line.startswith("## ") and (lines or title is not None):
+            sections.append((title or '', "\n".join(lines)))
+            title, lines = None, []
+        if line.startswith("## "):
+            title = line[3:].strip()
+        elif title is None and not lines and line.startswith("# "):
+            title = line[2:].strip()
+        lines.append(line)
+    sections.append((title or '', "\n".join(lines)))
+    return sections
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class ReportServer:
+    def __init__(self, args, files):
+        self.args = args
+        self.files = files
+        self.cube = None
+        self.generation = 0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.error = None
+        self._cache = {}
+        self._stats = {}
+        self._ready = asyncio.Event()
+        # One thread: pandas work holds the GIL anyway, and renderers share PROFILER
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sales-render')
+        # Nothing prints the stage table here, so every render would only grow PROFILER.stages
+        PROFILER.enabled = False
+
+    def _load(self):
+        t0 = time.perf_counter()
+        stats = {f: _stat(f) for f in self.files}
+        cube = load_source(self.args.source, self.args)
+        return cube, stats, time.perf_counter() - t0
+
+    async def reload(self):
+        loop = asyncio.get_running_loop()
+        try:
+            cube, stats, seconds = await loop.run_in_executor(self._executor, self._load)
+        except Exception as e:
+            # Keep serving the last good cube
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Reload failed: {self.error}")
+            # Requests waiting for the first load get a 503 instead of hanging
+            self._ready.set()
+            return
+        # Swap cube and cache together; requests in flight finish on the old generation
+        self.cube, self._stats, self.load_seconds, self.error = cube, stats, seconds, None
+        self.generation += 1
+        self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._cache = {}
+        self._ready.set()
+        print(f"[gen {self.generation}] {int(cube[ROW_COUNT].sum()):,} rows in {len(cube):,} groups "
+              f"({seconds:.2f}s)")
+
+    async def warm(self, variants):
+        if self.cube is None:
+            return
+        for name in variants:
+            await self.cached(('report', name), self._render, name)
+
+    async def watch(self, interval=WATCH_INTERVAL, warm=()):
+        # Poll mtime/size; no inotify dependency and works on network drives.
+        # Until a cube has loaded the load is retried every interval, changed or not.
+        while True:
+            await asyncio.sleep(interval)
+            changed = [f for f in self.files if _stat(f) != self._stats.get(f)]
+            if changed or self.cube is None:
+                if changed:
+                    print(f"Changed: {', '.join(os.path.basename(f) for f in changed)}; reloading")
+                await self.reload()
+                await self.warm(warm)
+
+    async def cached(self, key, func, *args):
+        # Compute func(cube, *args) once per generation, on the worker thread
+        await self._ready.wait()
+        if self.cube is None:
+            raise HTTPError(503, f"no data loaded yet ({self.error}); retrying")
+        cache = self._cache
+        task = cache.get(key)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = cache[key] = asyncio.ensure_future(
+                loop.run_in_executor(self._executor, func, self.cube, *args))
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            # Don't cache failures
+            if cache.get(key) is task:
+                del cache[key]
+            raise
+
+    # Page builders; run on the worker thread with the cube of their generation
+    def _render(self, cube, name):
+        text = "\n".join(report_lines(name, cube, charts=False))
+        return text, split_sections(text)
+
+    def _insights(self, cube, dim, period, prior, top):
+        from sales_insights import entity_insights
+        ins = entity_insights(cube, dim, period, prior).sort_values('current', ascending=False)
+        ins = (ins.head(top) if top else ins).rename_axis('key').reset_index()
+        # Month ordinal -> 'YYYY-MM' for the client
+        month = ins['z_month'].astype(int)
+        ins['z_month'] = [f"{m // 12}-{m % 12 + 1:02d}" if m >= 0 else None for m in month.tolist()]
+        return ins.to_dict(orient='records')
+
+    def _alerts(self, cube, period, prior, top):
+        from sales_insights import rank_alerts
+        alerts = rank_alerts(cube, period, prior)
+        return (alerts.head(top) if top else alerts).to_dict(orient='records')
+
+    async def handle(self, path, query):
+        # -> (status, content type, body)
+        parts = [unquote(p) for p in path.strip('/').split('/') if p]
+        fmt = query.get('format', 'md')
+        if parts == ['health']:
+            return self._json({
+                'ready': self.cube is not None, 'generation': self.generation, 'loaded_at': self.loaded_at,
+                'load_seconds': self.load_seconds, 'error': self.error, 'files': self.files,
+                'rows': None if self.cube is None else int(self.cube[ROW_COUNT].sum()),
+                'groups': None if self.cube is None else len(self.cube),
+                'cached': sorted('/'.join(map(str, k)) for k in self._cache),
+            })
+        if not parts or parts == ['reports']:
+            return self._json({'reports': list(REPORTS), 'insights': INSIGHT_DIMENSIONS})
+        if parts[0] == 'reports' and len(parts) >= 2:
+            name = parts[1][:-3] if parts[1].endswith('.md') else parts[1]
+            if name not in REPORTS:
+                raise HTTPError(404, f"unknown report {name!r}; one of {', '.join(REPORTS)}")
+            text, sections = await self.cached(('report', name), self._render, name)
+            if len(parts) == 2:
+                return self._page(fmt, text, {'report': name, 'markdown': text})
+            if parts[2] == 'sections' and len(parts) == 3:
+                return self._json([{'index': i, 'title': t} for i, (t, _) in enumerate(sections)])
+            if parts[2] == 'sections' and len(parts) == 4 and parts[3].isdigit() and int(parts[3]) < len(sections):
+                title, body = sections[int(parts[3])]
+                return self._page(fmt, body, {'report': name, 'index': int(parts[3]), 'title': title,
+                                              'markdown': body})
+            raise HTTPError(404, f"no such section; see /reports/{name}/sections")
+        if parts[0] in ('insights', 'alerts'):
+            period = self._period(query.get('period', '2025'))
+            prior = self._period(query['prior']) if 'prior' in query else None
+            top = self._int(query.get('top', '50'))
+            if parts[0] == 'alerts' and len(parts) == 1:
+                return self._json(await self.cached(('alerts', period, prior, top), self._alerts, period, prior, top))
+            if parts[0] == 'insights' and len(parts) == 2 and parts[1] in INSIGHT_DIMENSIONS:
+                key = ('insights', parts[1], period, prior, top)
+                return self._json(await self.cached(key, self._insights, parts[1], period, prior, top))
+            raise HTTPError(404, f"use /alerts or /insights/<{'|'.join(INSIGHT_DIMENSIONS)}>")
+        raise HTTPError(404, "see / for what is served")
+
+    @staticmethod
+    def _period(value):
+        from sales_periods import parse_period
+        try:
+            parse_period(value)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return int(value) if value.isdigit() else value
+
+    @staticmethod
+    def _int(value):
+        if not value.isdigit():
+            raise HTTPError(400, f"expected a number, got {value!r}")
+        return int(value)
+
+    def _page(self, fmt, markdown, payload):
+        if fmt == 'json':
+            return self._json(payload)
+        if fmt != 'md':
+            raise HTTPError(400, "format is md or json")
+        return 200, 'text/markdown; charset=utf-8', markdown.encode('utf-8')
+
+    @staticmethod
+    def _json(payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default)
+        return status, 'application/json; charset=utf-8', body.encode('utf-8')
+
+
+def _json_default(value):
+    # numpy scalars and pandas NA in the insight/alert records
+    if hasattr(value, 'item'):
+        return value.item()
+    return None if value != value else str(value)
+
+
+async def _respond(writer, status, content_type, body, keep_alive, head=False):
+    headers = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Access-Control-Allow-Origin: *",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + (b'' if head else body))
+    await writer.drain()
+
+
+async def serve_client(server, reader, writer):
+    # Minimal HTTP/1.1: GET/HEAD, keep-alive, no request bodies
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = head.decode('latin-1').split("\r\n")
+            try:
+                method, target, version = lines[0].split(' ')
+            except ValueError:
+                await _respond(writer, 400, 'text/plain', b"bad request line", False)
+                break
+            headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(':') for l in lines[1:] if l)}
+            keep_alive = (headers.get('connection', '').lower() != 'close'
+                          and (version == 'HTTP/1.1' or headers.get('connection', '').lower() == 'keep-alive'))
+            t0 = time.perf_counter()
+            if method not in ('GET', 'HEAD'):
+                status, ctype, body = ReportServer._json({'error': 'only GET'}, 405)
+            else:
+                url = urlsplit(target)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                try:
+                    status, ctype, body = await server.handle(url.path, query)
+                except HTTPError as e:
+                    status, ctype, body = ReportServer._json({'error': str(e)}, e.status)
+                except Exception as e:
+                    status, ctype, body = ReportServer._json({'error': f"{type(e).__name__}: {e}"}, 500)
+            await _respond(writer, status, ctype, body, keep_alive, head=method == 'HEAD')
+            if server.args.access_log:
+                print(f"{method} {target} {status} {len(body):,}B {(time.perf_counter() - t0) * 1000:.1f}ms")
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def run(args):
+    files = [os.path.abspath(f) for f in (args.files or default_files())] if args.source == 'csv' else []
+    server = ReportServer(args, files)
+    warm = [] if args.no_warm else list(REPORTS)
+
+    def handler(reader, writer):
+        return serve_client(server, reader, writer)
+
+    if args.unix:
+        listener = await asyncio.start_unix_server(handler, path=args.unix, limit=MAX_HEADER_BYTES)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(handler, args.host, args.port, limit=MAX_HEADER_BYTES)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving on {where}; loading data...")
+    await server.reload()
+    await server.warm(warm)
+    # The postgres source has no files to watch; its watcher only retries a failed first load
+    watcher = asyncio.ensure_future(server.watch(args.interval, warm))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve report sections from a warm in-memory cube")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT, help="default: $SALES_SERVER_PORT or 8765")
+    parser.add_argument('--unix', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help="seconds between source file checks")
+    parser.add_argument('--no-warm', action='store_true', help="render reports on first request, not at load")
+    parser.add_argument('--access-log', action='store_true', help="print one line per request with its latency")
+    add_source_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import CACHE_DIR, read_parts, sync_sales_csv
+from sales_clean import LEDGER_COLUMNS, clean_ledger, compact_frame, rules_version, year_month
+from sales_cube import ROW_COUNT, build_cube
+from sales_dedup import resume_deduper, save_deduper
+from sales_periods import parse_period
+from sales_tables import fmt_int, markdown_table
+
+# Persistent aggregate store.
+# Cleaned ledger rows are kept in a SQLite file next to the Parquet cache, together
+# with rollup tables materialized from them (monthly, brand, customer, group and the
+# full report cube). A sync only cleans the rows appended to a CSV since the last run
+# (same bookkeeping as sales_cube.load_incremental_cube) and recomputes the rollups
+# for the months those rows fall in. Reports read the materialized cube; ad-hoc
+# questions are answered from the rollups without touching the CSVs.
+#
+#   python sales_store.py sync
+#   python sales_store.py top --customer 직수출(러시아) --period 2025Q3 --by 품목명
+#   python sales_store.py sql "SELECT Brand, SUM(금액) FROM rollup_brand WHERE Year = 2025 GROUP BY 1"
+STORE_PATH = os.environ.get('SALES_STORE', os.path.join(CACHE_DIR, 'sales_store.sqlite'))
+STORE_DIMENSIONS = ['Year', 'Month', '거래처명', '품목명', '거래처그룹', 'Brand', 'Category', 'Market', 'IsDummy']
+STORE_MEASURES = ['금액', '수량']
+# rollup name -> dimensions; each is stored as table rollup_<name>
+ROLLUPS = {
+    'monthly': ['Year', 'Month', 'Market'],
+    'brand': ['Year', 'Month', 'Market', 'Brand'],
+    'customer': ['Year', 'Month', 'Market', '거래처명'],
+    'group': ['Year', 'Month', '거래처그룹'],
+    'cube': STORE_DIMENSIONS,
+}
+# Indexed lookups for the ad-hoc queries
+ROLLUP_INDEXES = {
+    'cube': [['거래처명', 'Year', 'Month'], ['Brand', 'Year', 'Month']],
+    'brand': [['Brand', 'Year', 'Month']],
+    'customer': [['거래처명', 'Year', 'Month']],
+}
+
+
+def _q(name):
+    return f'"{name}"'
+
+
+def _cols(names):
+    return ', '.join(_q(n) for n in names)
+
+
+def _records(df, columns):
+    # sqlite3 only binds plain Python values: ints, str and None for missing
+    out = df[columns].astype(object)
+    return list(out.where(out.notna(), None).itertuples(index=False, name=None))
+
+
+class SalesStore:
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create(self):
+        dims = ', '.join(f"{_q(d)} {'INTEGER' if d in ('Year', 'Month', 'IsDummy') else 'TEXT'}"
+                         for d in STORE_DIMENSIONS)
+        sums = ', '.join(f"{_q(m)} INTEGER" for m in STORE_MEASURES)
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS sources '
+                              '(path TEXT PRIMARY KEY, generation INTEGER, rows INTEGER, rules TEXT)')
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS ledger (source TEXT, {dims}, {sums})')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS ledger_month ON ledger ("Year", "Month")')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS ledger_source ON ledger (source)')
+            for name, keys in ROLLUPS.items():
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS rollup_{name} '
+                                  f'({_cols(keys)}, {sums}, {_q(ROW_COUNT)} INTEGER)')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS rollup_{name}_month '
+                                  f'ON rollup_{name} ("Year", "Month")')
+                for i, cols in enumerate(ROLLUP_INDEXES.get(name, [])):
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS rollup_{name}_{i} ON rollup_{name} ({_cols(cols)})')
+
+    def _months(self, where, params):
+        return set(self.conn.execute(f'SELECT DISTINCT "Year", "Month" FROM ledger WHERE {where}', params))
+
+    def _insert(self, source, df):
+        cols = STORE_DIMENSIONS + STORE_MEASURES
+        df = df.assign(IsDummy=df['IsDummy'].astype(int))
+        rows = [(source,) + r for r in _records(df, cols)]
+        self.conn.executemany(f'INSERT INTO ledger (source, {_cols(cols)}) VALUES ({", ".join("?" * (len(cols) + 1))})',
+                              rows)
+        return {(r[1], r[2]) for r in rows}
+
+    def refresh(self, months=None):
+        # Recompute the rollups for the given (Year, Month) pairs, or all of them
+        sums = ', '.join(f"SUM({_q(m)})" for m in STORE_MEASURES)
+        with self.conn:
+            for name, keys in ROLLUPS.items():
+                insert = (f'INSERT INTO rollup_{name} ({_cols(keys)}, {_cols(STORE_MEASURES)}, {_q(ROW_COUNT)}) '
+                          f'SELECT {_cols(keys)}, {sums}, COUNT(*) FROM ledger')
+                group = f' GROUP BY {_cols(keys)}'
+                if months is None:
+                    self.conn.execute(f'DELETE FROM rollup_{name}')
+                    self.conn.execute(insert + group)
+                    continue
+                # IS also matches the NULL month of rows with an unparseable 일자
+                match = ' WHERE "Year" IS ? AND "Month" IS ?'
+                for ym in months:
+                    self.conn.execute(f'DELETE FROM rollup_{name}' + match, ym)
+                    self.conn.execute(insert + match + group, ym)
+
+    def sync(self, files, clean_fn, rules='default', cache_dir=CACHE_DIR, prune=True, dedup=True):
+        # Bring the ledger and rollups in line with `files`: appended rows are cleaned and
+        # added, a changed file or different `rules` reloads that file, and (with prune)
+        # files no longer listed are dropped. Returns the number of rows cleaned.
+        # With dedup the new rows first go through the Deduper state saved next to the
+        # store (sales_dedup.resume_deduper); if it can't be resumed every file is reloaded.
+        touched = set()
+        cleaned = 0
+        if dedup:
+            rules = rules + '+dedup'
+        known = {r[0]: r[1:] for r in self.conn.execute('SELECT path, generation, rows, rules FROM sources')}
+        entries = {}
+        for f in files:
+            if os.path.exists(f):
+                entries[os.path.abspath(f)] = sync_sales_csv(f, cache_dir)[1]
+        state_path = self.path + '.dedup.npz'
+        deduper, starts = resume_deduper(state_path, entries, rules) if dedup else (None, None)
+        reload_all = dedup and (starts is None or set(known) - set(entries) or any(
+            known.get(k, (None, 0))[1] != starts[k] for k in entries))
+        for key, entry in entries.items():
+            generation, rows, old_rules = known.get(key, (None, 0, None))
+            same_source = (not reload_all and generation == entry['generation'] and old_rules == rules
+                           and rows <= entry['rows'])
+            if same_source and rows == entry['rows']:
+                continue
+            with self.conn:
+                if same_source:
+                    delta = read_parts(entry, cache_dir, start=rows)
+                    print(f"{os.path.basename(key)}: storing {len(delta):,} new rows")
+                else:
+                    print(f"{os.path.basename(key)}: reloading store")
+                    touched |= self._months('source = ?', (key,))
+                    self.conn.execute('DELETE FROM ledger WHERE source = ?', (key,))
+                    delta = read_parts(entry, cache_dir)
+                cleaned += len(delta)
+                if deduper:
+                    deduper.start_source(key)
+                    delta = deduper.filter(delta)
+                touched |= self._insert(key, clean_fn(delta))
+                self.conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                                  (key, entry['generation'], entry['rows'], rules))
+        if prune:
+            with self.conn:
+                for key in set(known) - set(entries):
+                    print(f"{os.path.basename(key)}: dropping from store")
+                    touched |= self._months('source = ?', (key,))
+                    self.conn.execute('DELETE FROM ledger WHERE source = ?', (key,))
+                    self.conn.execute('DELETE FROM sources WHERE path = ?', (key,))
+        if deduper:
+            save_deduper(deduper, state_path, entries, rules)
+            deduper.print_report(quiet=True)
+        if touched:
+            self.refresh(touched)
+        return cleaned
+
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def rollup(self, name, where=None, params=()):
+        sql = f'SELECT * FROM rollup_{name}'
+        return self.query(sql + (f' WHERE {where}' if where else ''), params)
+
+    def cube(self, dimensions=None, measures=STORE_MEASURES):
+        # The report cube (as build_cube with count=True) read from the materialized rollup
+        df = self.rollup('cube')
+        if df.empty:
+            raise ValueError("No data loaded")
+        df['IsDummy'] = df['IsDummy'].astype(bool)
+        df['YearMonth'] = year_month(df['Year'], df['Month'])
+        dims = [d for d in (dimensions or LEDGER_COLUMNS) if d in df.columns and d not in STORE_MEASURES]
+        df = compact_frame(df, dims + list(measures) + [ROW_COUNT])
+        return build_cube(df, dims, list(measures) + [ROW_COUNT])
+
+    def top(self, by, measure='금액', n=10, period=None, **filters):
+        # Top `by` values by `measure`, e.g. top(['품목명'], customer filter, period='2025Q3');
+        # answered from the cube rollup through its (key, Year, Month) indexes
+        clauses, params = [], []
+        if period is not None:
+            first, last = parse_period(period)
+            clauses.append('"Year" * 12 + "Month" - 1 BETWEEN ? AND ?')
+            params += [first, last]
+        for col, value in filters.items():
+            if value is not None:
+                clauses.append(f'{_q(col)} = ?')
+                params.append(value)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+        sql = (f'SELECT {_cols(by)}, SUM({_q(measure)}) AS {_q(measure)} FROM rollup_cube{where} '
+               f'GROUP BY {_cols(by)} ORDER BY 2 DESC LIMIT ?')
+        return self.query(sql, params + [n])
+
+
+def _clean(df, date_format=None):
+    return clean_ledger(df, date_format, LEDGER_COLUMNS)
+
+
+def load_store_cube(files, store_path=STORE_PATH, cache_dir=CACHE_DIR, dedup=True):
+    # Sync the store with `files` and return the report cube from it
+    with SalesStore(store_path) as store:
+        store.sync(files, _clean, rules_version(), cache_dir, dedup=dedup)
+        return store.cube()
+
+
+def main():
+    from sales_report import default_files
+
+    parser = argparse.ArgumentParser(description="Persistent store of cleaned sales rows and rollups")
+    parser.add_argument('--store', default=STORE_PATH, help="SQLite file (default: $SALES_STORE)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync = sub.add_parser('sync', help="load new/changed CSV rows and refresh the rollups")
+    sync.add_argument('--files', nargs='+', help="ERP CSV exports (default: FILES of generate_sales_report.py)")
+    sync.add_argument('--rebuild', action='store_true', help="recompute every rollup from the stored rows")
+    top = sub.add_parser('top', help="top entries of one dimension, filtered")
+    top.add_argument('--by', nargs='+', default=['품목명'])
+    top.add_argument('--measure', default='금액', choices=STORE_MEASURES)
+    top.add_argument('--period', help="2025, 2025Q3, 2025-03 or R12:2025-06")
+    top.add_argument('--customer', help="canonical 거래처명")
+    top.add_argument('--brand')
+    top.add_argument('--market', choices=['Export', 'Domestic'])
+    top.add_argument('-n', type=int, default=10)
+    sql = sub.add_parser('sql', help="run a query against the store")
+    sql.add_argument('query')
+    args = parser.parse_args()
+
+    with SalesStore(args.store) as store:
+        t0 = time.perf_counter()
+        if args.command == 'sync':
+            rows = store.sync(args.files or default_files(), _clean, rules_version())
+            if args.rebuild:
+                store.refresh()
+            print(f"Cleaned {rows:,} rows in {time.perf_counter() - t0:.2f}s")
+            for name in ROLLUPS:
+                count = store.conn.execute(f'SELECT COUNT(*) FROM rollup_{name}').fetchone()[0]
+                print(f"  rollup_{name}: {count:,} rows")
+            return
+        if args.command == 'top':
+            result = store.top(args.by, args.measure, args.n, args.period,
+                               거래처명=args.customer, Brand=args.brand, Market=args.market)
+            values = fmt_int(result[args.measure].fillna(0).to_numpy(np.int64))
+            print(markdown_table(args.by + [args.measure], [result[c].tolist() for c in args.by] + [values]))
+        else:
+            print(store.query(args.query).to_string(index=False))
+        print(f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
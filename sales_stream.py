@@ -0,0 +1,199 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sales_cache import byte_lines, fallback_encoding, file_encoding
+from sales_cube import build_cube, merge_cubes
+from sales_dedup import Deduper, fingerprints
+
+# Streaming aggregation for ledgers larger than RAM.
+# Each CSV is read in chunks, every chunk is cleaned with the report's own clean_data
+# and folded into a running cube, so the full row-level frame never exists in memory.
+CHUNK_ROWS = 200_000
+FOLD_EVERY = 16
+# Text columns are forced to str so every chunk infers the same dtypes
+TEXT_COLUMNS = {'일자': str, '거래처명': str, '품목명[규격]': str, '거래처그룹1명': str}
+# Files larger than this are split into row-range shards for the process pool
+SHARD_BYTES = 64 * 1024 * 1024
+
+
+def _fold_chunks(chunks, clean_fn, dims, measures):
+    partials = []
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        partials.append(build_cube(clean_fn(chunk), dims, measures, count=True))
+        if len(partials) >= FOLD_EVERY:
+            partials = [merge_cubes(partials, dims)]
+    return merge_cubes(partials, dims), rows
+
+
+def _fold_file(path, encoding, clean_fn, dims, measures, chunksize, deduper=None):
+    chunks = pd.read_csv(path, encoding=encoding, chunksize=chunksize, dtype=TEXT_COLUMNS)
+    if deduper:
+        deduper.start_source(path)
+        chunks = (deduper.filter(c) for c in chunks)
+    return _fold_chunks(chunks, clean_fn, dims, measures)[0]
+
+
+def _stream_pass(files, clean_fn, dims, measures, chunksize, dedup=True):
+    deduper = Deduper() if dedup else None
+    cubes = []
+    for f in files:
+        if not os.path.exists(f):
+            print(f"Warning: File not found: {f}")
+            continue
+        encoding = file_encoding(f)
+        state = deduper.checkpoint() if deduper else None
+        try:
+            cube = _fold_file(f, encoding, clean_fn, dims, measures, chunksize, deduper)
+        except UnicodeDecodeError:
+            # The sample was misleading; drop the partial cube and start over
+            encoding = fallback_encoding(encoding)
+            print(f"Warning: re-reading {f} as {encoding}")
+            if deduper:
+                deduper.restore(state)
+            cube = _fold_file(f, encoding, clean_fn, dims, measures, chunksize, deduper)
+        cubes.append(cube)
+    if not cubes:
+        raise ValueError("No data loaded")
+    if deduper:
+        deduper.print_report(quiet=True)
+    return merge_cubes(cubes, dims)
+
+
+def _shard_ranges(path, shard_bytes):
+    # Byte ranges that start and end on line boundaries, header line excluded.
+    # Assumes no quoted field spans a line break, which holds for ERP exports.
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        bounds = [start]
+        pos = start + shard_bytes
+        while pos < size:
+            f.seek(pos)
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+            pos = f.tell() + shard_bytes
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _shard_chunks(path, start, end, encoding, columns, chunksize):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    # A shard from byte 0 is a whole file (see _plan_shards) and still has its header line
+    return pd.read_csv(io.StringIO(text), header=None, names=columns, dtype=TEXT_COLUMNS, chunksize=chunksize,
+                       skiprows=1 if start == 0 else None)
+
+
+def _aggregate_shard(task):
+    # Runs in a worker process; clean_fn must be importable (module-level function).
+    # With `dedup` the shard's row fingerprints come back too; `keep` masks out the rows
+    # the parent found to be duplicates (second pass over that shard only).
+    path, start, end, encoding, columns, clean_fn, dims, measures, chunksize, dedup, keep = task
+    t0 = time.perf_counter()
+    chunks = _shard_chunks(path, start, end, encoding, columns, chunksize)
+    parts = []
+    if dedup:
+        chunks = _fingerprinted(chunks, parts)
+    if keep is not None:
+        chunks = _masked(chunks, keep)
+    cube, rows = _fold_chunks(chunks, clean_fn, dims, measures)
+    fp = tuple(None if p[0] is None else np.concatenate(p) for p in zip(*parts)) if parts else None
+    return cube, rows, time.perf_counter() - t0, os.getpid(), fp
+
+
+def _fingerprinted(chunks, parts):
+    for chunk in chunks:
+        parts.append(fingerprints(chunk))
+        yield chunk
+
+
+def _masked(chunks, keep):
+    offset = 0
+    for chunk in chunks:
+        mask = keep[offset:offset + len(chunk)]
+        offset += len(chunk)
+        yield chunk[mask]
+
+
+def _parallel_pass(shards, clean_fn, dims, measures, chunksize, workers, dedup=True):
+    # With dedup the parent runs one Deduper over the shards' fingerprints in file and
+    # shard order, exactly as the sequential pass would see the rows. Only shards that
+    # turn out to hold duplicates are aggregated again without them.
+    tasks = [
+        (path, start, end, enc, cols, clean_fn, dims, measures, chunksize, dedup, None)
+        for path, start, end, enc, cols in shards
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() keeps task order, so partial cubes are merged in file/shard order
+        results = list(pool.map(_aggregate_shard, tasks))
+        redo = {}
+        if dedup:
+            deduper = Deduper()
+            for i, ((path, *_), result) in enumerate(zip(shards, results)):
+                # Repeats for each shard of a file; start_source keeps the file's counts
+                deduper.start_source(path)
+                fp = result[4]
+                dup = deduper.check(*fp) if fp is not None else np.zeros(0, dtype=bool)
+                if dup.any():
+                    redo[i] = tasks[i][:-2] + (False, ~dup)
+            for i, result in zip(redo, pool.map(_aggregate_shard, redo.values())):
+                results[i] = result[:1] + results[i][1:]
+
+    for (path, start, end, _, _), (_, rows, secs, pid, _) in zip(shards, results):
+        print(f"  [pid {pid}] {os.path.basename(path)} bytes {start:,}-{end:,}: {rows:,} rows in {secs:.2f}s")
+    if redo:
+        print(f"  {len(redo)} shard(s) aggregated again without their duplicate lines")
+    if dedup:
+        deduper.print_report(quiet=True)
+    cubes = [r[0] for r in results]
+    if not cubes:
+        raise ValueError("No data loaded")
+    return merge_cubes(cubes, dims)
+
+
+def _plan_shards(files, shard_bytes):
+    shards = []
+    for f in files:
+        if not os.path.exists(f):
+            print(f"Warning: File not found: {f}")
+            continue
+        encoding = file_encoding(f)
+        columns = list(pd.read_csv(f, encoding=encoding, nrows=0).columns)
+        if not byte_lines(encoding):
+            # b'\n' isn't a line boundary in UTF-16; the file is one shard, header included
+            shards.append((f, 0, os.path.getsize(f), encoding, columns))
+            continue
+        for start, end in _shard_ranges(f, shard_bytes):
+            shards.append((f, start, end, encoding, columns))
+    return shards
+
+
+def stream_aggregate(files, clean_fn, dims, measures, chunksize=CHUNK_ROWS, workers=1, shard_bytes=None,
+                     dedup=True):
+    # Returns the cleaned data summed over `dims`, with a Rows column holding the
+    # number of ledger rows behind each group. clean_fn(df) must return the same
+    # columns as the in-memory path; dates are parsed per chunk by parse_dates, which
+    # picks the 일자 format itself, so every file is read once.
+    # With workers > 1 files (and row-range shards of large files) are aggregated
+    # in a process pool. dedup drops lines an earlier file already had (sales_dedup.py),
+    # with the same result on both paths.
+    if workers > 1:
+        t0 = time.perf_counter()
+        shards = _plan_shards(files, shard_bytes or SHARD_BYTES)
+        print(f"Aggregating {len(shards)} shard(s) with {workers} workers")
+        cube = _parallel_pass(shards, clean_fn, dims, measures, chunksize, workers, dedup)
+        print(f"  total {time.perf_counter() - t0:.2f}s")
+        return cube
+
+    return _stream_pass(files, clean_fn, dims, measures, chunksize, dedup)
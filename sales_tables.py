@@ -0,0 +1,42 @@
+import numpy as np
+
+# Column-at-a-time table formatting.
+# Report tables are built from whole aggregated columns: amounts, growth and share are
+# computed as arrays, formatted in one pass per column and joined into the Markdown
+# table in a single step, instead of formatting each row of an iterrows loop.
+
+
+def fmt_int(values):
+    # Thousands separators; floats are truncated like int() does
+    arr = np.asarray(values)
+    if arr.dtype.kind != 'i':
+        arr = arr.astype(np.int64)
+    return [f"{v:,}" for v in arr.tolist()]
+
+
+def fmt_pct(values, decimals=1, signed=False):
+    # e.g. 12.345 -> '12.3%', or '+12.3%' when signed
+    spec = f"{'+' if signed else ''}.{decimals}f"
+    return [f"{v:{spec}}%" for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def growth(current, previous, valid=None):
+    # Percent change; 0 where the previous value is not positive (or not `valid`)
+    cur, prev = np.asarray(current), np.asarray(previous)
+    if valid is None:
+        valid = prev > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, (cur - prev) / prev * 100, 0.0)
+
+
+def share(values, total):
+    return np.asarray(values) / total * 100
+
+
+def markdown_table(header, columns):
+    # One Markdown table as a single string; columns are equal-length sequences,
+    # values that aren't strings yet are passed through str()
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    cells = [list(map(str, col)) for col in columns]
+    lines.extend("| " + " | ".join(row) + " |" for row in zip(*cells))
+    return "\n".join(lines)
@@ -0,0 +1,51 @@
+import codecs
+
+import pandas as pd
+import pytest
+
+from sales_cache import byte_lines, detect_encoding, read_parts, sync_sales_csv
+
+
+@pytest.mark.parametrize('bom,codec', [(codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')])
+def test_utf16_append_rebuilds(tmp_path, capsys, write_export, export_rows, bom, codec):
+    cache_dir = str(tmp_path / 'cache')
+    path = write_export('sales.csv', export_rows(0, 5), codec, bom)
+    assert detect_encoding(path) == 'utf-16'
+    assert not byte_lines('utf-16')
+    status, entry, _ = sync_sales_csv(path, cache_dir)
+    assert status == 'rebuilt' and entry['rows'] == 5
+
+    # Appended bytes can't be parsed on their own, the whole file is read again
+    write_export('sales.csv', export_rows(5, 3), codec, append=True)
+    status, entry, new_rows = sync_sales_csv(path, cache_dir)
+    assert status == 'rebuilt'
+    assert "don't match the cached schema" not in capsys.readouterr().out
+    assert entry['rows'] == 8
+    df = read_parts(entry, cache_dir)
+    assert list(df.columns) == list(pd.read_csv(path, encoding='utf-16', nrows=0).columns)
+    assert df['금액'].tolist() == [1000 * (i + 1) for i in range(8)]
+
+
+def test_utf8_append_reads_only_new_rows(tmp_path, write_export, export_rows):
+    cache_dir = str(tmp_path / 'cache')
+    path = write_export('sales.csv', export_rows(0, 5))
+    sync_sales_csv(path, cache_dir)
+    write_export('sales.csv', export_rows(5, 3), append=True)
+    status, entry, new_rows = sync_sales_csv(path, cache_dir)
+    assert status == 'appended'
+    assert len(new_rows) == 3
+    pd.testing.assert_series_equal(read_parts(entry, cache_dir, start=5)['금액'], new_rows['금액'])
+
+
+def test_rebuild_detects_new_encoding(tmp_path, capsys, write_export, export_rows):
+    cache_dir = str(tmp_path / 'cache')
+    path = write_export('sales.csv', export_rows(0, 5), 'cp949')
+    assert sync_sales_csv(path, cache_dir)[1]['encoding'] == 'cp949'
+
+    # Re-exported as UTF-8: a rewrite, not an append
+    write_export('sales.csv', export_rows(1, 5))
+    status, entry, new_rows = sync_sales_csv(path, cache_dir)
+    assert status == 'rebuilt'
+    assert entry['encoding'] == 'utf-8'
+    assert 'Warning' not in capsys.readouterr().out
+    assert new_rows['거래처명'].tolist() == [f'고객{i % 3}' for i in range(1, 6)]
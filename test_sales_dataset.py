@@ -0,0 +1,23 @@
+import pytest
+
+from sales_cache import HAS_PARQUET
+
+pytestmark = pytest.mark.skipif(not HAS_PARQUET, reason="needs pyarrow")
+
+
+def test_unparseable_date_without_period(tmp_path, write_export, export_rows, export_row, cube_totals):
+    from sales_dataset import load_dataset_cube, read_dataset
+    from sales_report import ENGINE_DIMENSIONS, ENGINE_MEASURES
+
+    rows = export_rows(0, 5) + [export_row(0, '고객9', '품목9', 700, date='날짜없음')]
+    files = [write_export('sales.csv', rows)]
+    dataset_dir = str(tmp_path / 'dataset')
+    cube = load_dataset_cube(files, ENGINE_DIMENSIONS, ENGINE_MEASURES, dataset_dir=dataset_dir,
+                             cache_dir=str(tmp_path / 'cache'))
+    # The bad row stays in the totals, with no YearMonth
+    assert cube_totals(cube) == (sum(1000 * (i + 1) for i in range(5)) + 700, 6)
+
+    df = read_dataset(['YearMonth', '금액'], dataset_dir=dataset_dir)
+    assert df['YearMonth'].isna().sum() == 1
+    assert df.loc[df['YearMonth'].isna(), '금액'].tolist() == [700]
+    assert sorted(df['YearMonth'].dropna().astype(str).unique()) == ['2024-01']
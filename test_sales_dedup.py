@@ -0,0 +1,149 @@
+import pandas as pd
+import pytest
+
+import sales_stream
+from sales_cache import HAS_PARQUET, load_sales_files
+from sales_dedup import Deduper, dedup_frame
+from sales_report import ENGINE_DIMENSIONS, ENGINE_MEASURES, _clean, load_cube
+
+
+@pytest.fixture
+def jan(export_row):
+    return [export_row(d, 'C1', 'A', 1000 * d) for d in range(1, 6)]
+
+
+@pytest.fixture
+def late_jan(jan, export_row):
+    # Re-export from the 4th on: two lines repeat `jan`, two are new
+    return jan[3:] + [export_row(d, 'C2', 'B', 500 * d) for d in (6, 7)]
+
+
+@pytest.fixture
+def feed(export_frame):
+    # feed(deduper, name, rows): the rows of source `name` the deduper keeps
+    def filter_rows(deduper, name, rows):
+        deduper.start_source(name)
+        return deduper.filter(export_frame(rows))
+    return filter_rows
+
+
+def test_overlapping_exports(jan, late_jan, feed):
+    deduper = Deduper()
+    first = feed(deduper, 'jan.csv', jan)
+    second = feed(deduper, 'late-jan.csv', late_jan)
+    assert len(first) == 5
+    assert second['일자'].tolist() == ['2024-01-06', '2024-01-07']
+    s = deduper.summary()
+    assert (s['rows'], s['duplicates'], s['duplicate_amount']) == (9, 2, 9000)
+    assert s['sources']['late-jan.csv']['duplicates'] == 2
+
+
+def test_line_repeated_within_one_file(jan, feed, export_frame):
+    # Two identical lines in one export are two sales
+    rows = jan + [jan[0]]
+    kept, deduper = dedup_frame(export_frame(rows))
+    assert len(kept) == 6
+    # An overlapping export with the line once repeats only one of them
+    assert len(feed(deduper, 'again.csv', [jan[0]])) == 0
+    assert len(feed(deduper, 'more.csv', [jan[0]] * 3)) == 1
+    # mode='exact' drops every repeat
+    assert len(dedup_frame(export_frame(rows), mode='exact')[0]) == 5
+
+
+@pytest.mark.parametrize('order', ['original first', 'reversal first'])
+def test_reversal_with_original(order, jan, export_row, export_frame):
+    reversal = export_row(9, 'C1', 'A', -3000, -1)
+    rows = [jan[2], reversal] if order == 'original first' else [reversal, jan[2]]
+    kept, deduper = dedup_frame(export_frame(rows))
+    s = deduper.summary()
+    # Reported, not removed: the pair sums to zero
+    assert len(kept) == 2
+    assert (s['reversals'], s['paired'], s['unmatched_reversals']) == (1, 1, 0)
+    assert s['paired_amount'] == 3000
+
+
+def test_reversal_without_original(jan, export_row, export_frame):
+    kept, deduper = dedup_frame(export_frame(jan + [export_row(9, 'C3', 'A', -3000, -1)]))
+    s = deduper.summary()
+    assert len(kept) == 6
+    assert (s['reversals'], s['paired'], s['unmatched_reversals']) == (1, 0, 1)
+
+
+def test_restore_after_decode_error(monkeypatch, jan, late_jan, write_export, cube_totals):
+    # The second file fails to decode after its first chunk went through the deduper,
+    # as when the sampled encoding was wrong; the re-read must start from the saved state
+    first = write_export('first.csv', jan)
+    second = write_export('second.csv', late_jan)
+    read_csv = pd.read_csv
+    failed = []
+
+    def flaky_read_csv(path, *args, **kwargs):
+        chunks = read_csv(path, *args, **kwargs)
+        if path != second or failed:
+            return chunks
+
+        def fail_after_first():
+            yield next(iter(chunks))
+            failed.append(path)
+            raise UnicodeDecodeError('utf-8', b'\xc0', 0, 1, 'invalid start byte')
+        return fail_after_first()
+
+    monkeypatch.setattr(sales_stream.pd, 'read_csv', flaky_read_csv)
+    # The file itself is fine, re-read it as it is
+    monkeypatch.setattr(sales_stream, 'fallback_encoding', lambda encoding: encoding)
+    cube = sales_stream.stream_aggregate([first, second], _clean, ENGINE_DIMENSIONS, ENGINE_MEASURES, chunksize=2)
+    assert failed
+    assert cube_totals(cube) == (sum(1000 * d for d in range(1, 6)) + 3000 + 3500, 7)
+
+
+@pytest.fixture
+def exports(jan, late_jan, export_row, write_export):
+    # Two overlapping exports, a line repeated inside the second, a reversal
+    first = write_export('first.csv', jan)
+    second = write_export('second.csv', late_jan + [late_jan[-1], export_row(8, 'C1', 'A', -5000, -1)])
+    return [first, second]
+
+
+EXPECTED = (sum(1000 * d for d in range(1, 6)) + 3000 + 2 * 3500 - 5000, 9)
+
+
+def test_same_totals_in_memory_and_stream(exports, cube_totals):
+    assert cube_totals(load_cube(exports)) == EXPECTED
+    assert cube_totals(load_cube(exports, stream=True, chunksize=2)) == EXPECTED
+    assert cube_totals(load_cube(exports, workers=2)) == EXPECTED
+    assert len(load_sales_files(exports, dedup=False)) == 11
+
+
+@pytest.mark.skipif(not HAS_PARQUET, reason="needs pyarrow")
+def test_same_totals_on_incremental_paths(exports, tmp_path, export_row, write_export, cube_totals):
+    from sales_cube import load_incremental_cube
+    from sales_dataset import load_dataset_cube
+    from sales_store import load_store_cube
+
+    cache_dir = str(tmp_path / 'cache')
+
+    def load_all():
+        return [
+            load_incremental_cube(exports, _clean, cache_dir=cache_dir, dimensions=ENGINE_DIMENSIONS,
+                                  measures=ENGINE_MEASURES, count=True),
+            load_store_cube(exports, str(tmp_path / 'store.sqlite'), cache_dir),
+            load_dataset_cube(exports, ENGINE_DIMENSIONS, ENGINE_MEASURES, dataset_dir=str(tmp_path / 'dataset'),
+                              cache_dir=cache_dir),
+        ]
+
+    assert [cube_totals(c) for c in load_all()] == [EXPECTED] * 3
+
+    # Appended to the first export: one line the second already has, one new
+    write_export('first.csv', [export_row(6, 'C2', 'B', 3000), export_row(9, 'C4', 'D', 400)], append=True)
+    expected = (EXPECTED[0] + 400, EXPECTED[1] + 1)
+    assert [cube_totals(c) for c in load_all()] == [expected] * 3
+    assert cube_totals(load_cube(exports)) == expected
+
+
+def test_pool_matches_sequential(exports):
+    # Small shards split each file, so occurrence counts carry across shards of one file
+    sequential = sales_stream.stream_aggregate(exports, _clean, ENGINE_DIMENSIONS, ENGINE_MEASURES, chunksize=2)
+    parallel = sales_stream.stream_aggregate(exports, _clean, ENGINE_DIMENSIONS, ENGINE_MEASURES, chunksize=2,
+                                             workers=2, shard_bytes=64)
+    assert len(sales_stream._plan_shards(exports, shard_bytes=64)) > 2
+    pd.testing.assert_frame_equal(parallel, sequential)
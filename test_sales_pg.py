@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+
+from sales_pg import (HAS_POSTGRES, PG_DSN, PG_TABLE, aggregate_query, column_overrides, connection, load_pg_cube,
+                      rows_query)
+from sales_report import ENGINE_DIMENSIONS, ENGINE_MEASURES
+
+AMOUNT = ['금액=price * qty']
+
+
+def test_amount_column_is_required():
+    with pytest.raises(ValueError, match='--pg-column 금액='):
+        aggregate_query(column_overrides([]))
+    with pytest.raises(ValueError, match='--pg-column 금액='):
+        rows_query()
+    # 금액=0 is an explicit choice
+    assert '0 AS "금액"' in rows_query(column_overrides(['금액=0']))[0]
+
+
+def test_column_overrides():
+    columns = column_overrides(AMOUNT + ['거래처그룹1명=market'])
+    assert columns['금액'] == 'price * qty'
+    assert columns['거래처그룹1명'] == 'market'
+    assert columns['거래처명'] == 'platform_name'
+    for bad in ['매출=price', '금액']:
+        with pytest.raises(ValueError, match='--pg-column expects'):
+            column_overrides([bad])
+
+
+def test_aggregate_query():
+    sql, params = aggregate_query(column_overrides(AMOUNT), period='2025Q3', platforms=['쿠팡'])
+    assert sql.startswith("SELECT left(left(collected_at, 10), 7) || '-01' AS \"일자\", platform_name AS \"거래처명\"")
+    assert 'SUM(price * qty)::bigint AS "금액", SUM(qty)::bigint AS "수량"' in sql
+    assert 'COUNT(*) AS "Rows"' in sql
+    assert f"FROM {PG_TABLE} WHERE (site_order_no NOT ILIKE 'GIFT-%%')" in sql
+    assert '(collected_at >= %s AND collected_at < %s) AND (platform_name = ANY(%s))' in sql
+    # Grouped by every column but the measures
+    assert sql.endswith('GROUP BY 1, 2, 3, 6')
+    assert params == ['2025-07-01', '2025-10-01', ['쿠팡']]
+
+
+def test_rows_query():
+    sql, params = rows_query(column_overrides(AMOUNT), period='2025-12')
+    assert 'left(collected_at, 10) AS "일자"' in sql
+    assert 'price * qty AS "금액"' in sql
+    assert 'GROUP BY' not in sql and 'SUM(' not in sql
+    assert params == ['2025-12-01', '2026-01-01']
+
+
+def _server():
+    if not HAS_POSTGRES:
+        return False
+    try:
+        with connection(PG_DSN) as conn:
+            conn.cursor().execute('SELECT 1')
+    except Exception:
+        return False
+    return True
+
+
+@pytest.fixture(scope='module')
+def order_lines():
+    # A scratch copy of the order line columns the source reads, at $SALES_PG_DSN
+    if not _server():
+        pytest.skip("needs psycopg and a Postgres server at $SALES_PG_DSN")
+    table = f"sales_pg_test_{uuid.uuid4().hex[:8]}"
+    lines = [
+        ('2025-07-03 10:00:00', '쿠팡', 'A', 2, 1500, 'O-1'),
+        ('2025-07-20 09:30:00', '쿠팡', 'A', 1, 1500, 'O-2'),
+        ('2025-08-01 00:00:00', '스마트스토어', 'B', 3, 700, 'O-3'),
+        ('2025-08-02 12:00:00', '스마트스토어', 'B', 1, 0, 'GIFT-4'),
+        ('2025-10-01 00:00:00', '쿠팡', 'A', 5, 1500, 'O-5'),
+    ]
+    with connection(PG_DSN) as conn:
+        cur = conn.cursor()
+        cur.execute(f"CREATE TABLE {table} (collected_at text, platform_name text, product_name text, "
+                    f"qty integer, price integer, site_order_no text)")
+        for line in lines:
+            cur.execute(f"INSERT INTO {table} VALUES (%s, %s, %s, %s, %s, %s)", line)
+        conn.commit()
+    yield table
+    with connection(PG_DSN) as conn:
+        conn.cursor().execute(f"DROP TABLE {table}")
+        conn.commit()
+
+
+@pytest.mark.parametrize('pushdown', [True, False])
+def test_load_pg_cube(order_lines, pushdown):
+    cube = load_pg_cube(ENGINE_DIMENSIONS, ENGINE_MEASURES, columns=column_overrides(AMOUNT), pushdown=pushdown,
+                        table=order_lines, period='2025Q3')
+    # The gift line and the October line are filtered out in Postgres
+    assert int(cube['Rows'].sum()) == 3
+    assert int(cube['금액'].sum()) == 2 * 1500 + 1500 + 3 * 700
+    assert int(cube['수량'].sum()) == 6
+    assert sorted(cube['Month'].unique().tolist()) == [7, 8]
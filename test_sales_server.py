@@ -0,0 +1,14 @@
+from sales_profile import PROFILER
+from sales_report import load_cube
+from sales_server import ReportServer
+
+
+def test_renders_leave_no_stages(monkeypatch, write_export, export_rows):
+    monkeypatch.setattr(PROFILER, 'enabled', True)
+    PROFILER.reset()
+    cube = load_cube([write_export('sales.csv', export_rows(0, 50))])
+    server = ReportServer(None, [])
+    for _ in range(3):
+        text, sections = server._render(cube, 'en')
+        assert sections
+    assert PROFILER.stages == []
@@ -0,0 +1,34 @@
+import codecs
+
+import pandas as pd
+import pytest
+
+from sales_stream import _plan_shards, stream_aggregate
+
+DIMS = ['거래처명', '품목명[규격]']
+
+
+def _clean(df):
+    # Module level so the process pool can pickle it
+    return df.assign(금액=pd.to_numeric(df['금액']), 수량=pd.to_numeric(df['수량']))
+
+
+@pytest.mark.parametrize('bom,codec', [(codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be')])
+def test_utf16_file_is_one_shard(write_export, export_rows, bom, codec):
+    path = write_export('sales.csv', export_rows(0, 500), codec, bom)
+    shards = _plan_shards([path], shard_bytes=1024)
+    assert [(s[1], s[2]) for s in shards] == [(0, len(open(path, 'rb').read()))]
+
+    sequential = stream_aggregate([path], _clean, DIMS, ['금액', '수량'], chunksize=64)
+    parallel = stream_aggregate([path], _clean, DIMS, ['금액', '수량'], chunksize=64, workers=2, shard_bytes=1024)
+    pd.testing.assert_frame_equal(parallel, sequential)
+    assert parallel['Rows'].sum() == 500
+    assert parallel['금액'].sum() == sum(1000 * (i + 1) for i in range(500))
+
+
+def test_utf8_file_is_sharded(write_export, export_rows):
+    path = write_export('sales.csv', export_rows(0, 500))
+    assert len(_plan_shards([path], shard_bytes=1024)) > 1
+    sequential = stream_aggregate([path], _clean, DIMS, ['금액', '수량'], chunksize=64)
+    parallel = stream_aggregate([path], _clean, DIMS, ['금액', '수량'], chunksize=64, workers=2, shard_bytes=1024)
+    pd.testing.assert_frame_equal(parallel, sequential)